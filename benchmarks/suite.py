@@ -0,0 +1,206 @@
+""" Benchmark suite of the workflow's parsing, writing and sweep generation.
+
+Micro-benchmarks run per structure of data/benchmark_structures. Scaling
+benchmarks use synthetic silicon supercells and synthetic sweeps; the largest
+sizes are opt-in, via --max-atoms and --max-jobs.
+
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --output current.json
+    python -m octopus_workflows.benchmark baseline.json current.json
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import sys
+from pathlib import Path
+
+from ase.build import bulk
+
+from octopus_workflows.benchmark import BenchmarkSuite
+from octopus_workflows.metadata import create_hash
+from octopus_workflows.oct_ase import ase_atoms_to_oct_structure
+from octopus_workflows.oct_parse import (
+    evaluate_expressions,
+    parse_oct_dict_to_values,
+    parse_oct_input,
+    parse_oct_input_string,
+)
+from octopus_workflows.oct_write import write_octopus_input
+from octopus_workflows.simple_oct_workflow import ground_state_calculation
+from octopus_workflows.utils import expand_matrix
+
+structure_root = Path(__file__).parents[1] / "data" / "benchmark_structures"
+
+# Files of structure_root that are not structures
+_not_structures = {"inp"}
+
+static_options = {
+    "CalculationMode": "gs",
+    "ExperimentalFeatures": "yes",
+    "ProfilingMode": "prof_time",
+    "MaximumIter": 200,
+    "Eigensolver": "chebyshev_filter",
+    "MixingScheme": "broyden",
+}
+
+
+def file_to_oct_dict(file) -> dict:
+    """Structure file to Octopus options, as in workflows/kerker_comparison."""
+    with open(file) as fid:
+        return parse_oct_input(fid.read(), do_substitutions=False)
+
+
+def structure_files() -> list:
+    return sorted(
+        f
+        for f in structure_root.iterdir()
+        if f.is_file() and f.suffix == "" and f.name not in _not_structures
+    )
+
+
+def silicon_supercell(n_atoms: int):
+    """Cubic silicon supercell with approximately n_atoms atoms."""
+    n = max(round((n_atoms / 8) ** (1 / 3)), 1)
+    return bulk("Si", "diamond", a=5.43, cubic=True).repeat((n, n, n))
+
+
+def synthetic_matrix(n_jobs: int) -> dict:
+    """Sweep matrix of n_jobs permutations, over three axes."""
+    n_mixing = 10
+    n_iter = max(n_jobs // (n_mixing * 10), 1)
+    n_extra = max(n_jobs // (n_mixing * n_iter), 1)
+    return {
+        "Mixing": [round(0.05 * (i + 1), 2) for i in range(n_mixing)],
+        "MixNumberSteps": list(range(1, n_iter + 1)),
+        "ExtraStates": list(range(n_extra)),
+    }
+
+
+def _scale(n: int) -> str:
+    return f"1e{len(str(n)) - 1}"
+
+
+def structure_benchmarks(suite: BenchmarkSuite):
+    for file in structure_files():
+        name = file.name
+        text = file.read_text()
+        key_values, blocks = parse_oct_input_string(text)
+        raw = parse_oct_input(text, do_substitutions=False)
+        options = parse_oct_input(text)
+        keys = [k for k, v in raw.items() if isinstance(v, list)]
+        expressions = {
+            k: v
+            for k, v in options.items()
+            if isinstance(v, (int, float)) and k.isidentifier()
+        }
+        input_string = write_octopus_input(options)
+
+        suite.run(f"parse_oct_input[{name}]", parse_oct_input, lambda: (text,))
+        suite.run(
+            f"parse_oct_dict_to_values[{name}]",
+            parse_oct_dict_to_values,
+            lambda: copy.deepcopy((key_values, blocks)),
+        )
+        if keys:
+            suite.run(
+                f"evaluate_expressions[{name}]",
+                evaluate_expressions,
+                lambda: (copy.deepcopy(raw), keys, expressions),
+            )
+        suite.run(
+            f"write_octopus_input[{name}]",
+            write_octopus_input,
+            lambda: (options,),
+        )
+        suite.run(f"create_hash[{name}]", create_hash, lambda: (input_string,))
+
+    matrix = {"^system_files": [str(f) for f in structure_files()]}
+    ops = {"^system_files": file_to_oct_dict}
+    suite.run(
+        "ground_state_calculation[benchmark_structures]",
+        lambda m, s: ground_state_calculation(m, s, meta_value_ops=ops),
+        lambda: (matrix, static_options),
+    )
+
+
+def supercell_benchmarks(suite: BenchmarkSuite, max_atoms: int):
+    n_atoms = 100
+    while n_atoms <= max_atoms:
+        atoms = silicon_supercell(n_atoms)
+        structure = ase_atoms_to_oct_structure(atoms)
+        repeat = 1 if n_atoms >= 10**5 else None
+        kwargs = {"repeat": repeat} if repeat else {}
+
+        suite.run(
+            f"ase_atoms_to_oct_structure[atoms={_scale(n_atoms)}]",
+            ase_atoms_to_oct_structure,
+            lambda: (atoms,),
+            **kwargs,
+        )
+        suite.run(
+            f"parse_oct_input[atoms={_scale(n_atoms)}]",
+            parse_oct_input,
+            lambda: (structure,),
+            **kwargs,
+        )
+        suite.run(
+            f"create_hash[atoms={_scale(n_atoms)}]",
+            create_hash,
+            lambda: (structure,),
+            **kwargs,
+        )
+        n_atoms *= 10
+
+
+def sweep_benchmarks(suite: BenchmarkSuite, max_jobs: int):
+    n_jobs = 10
+    while n_jobs <= max_jobs:
+        matrix = synthetic_matrix(n_jobs)
+        repeat = 1 if n_jobs >= 10**4 else None
+        kwargs = {"repeat": repeat} if repeat else {}
+        suite.run(
+            f"expand_matrix[jobs={_scale(n_jobs)}]",
+            expand_matrix,
+            lambda: (matrix,),
+            **kwargs,
+        )
+        suite.run(
+            f"ground_state_calculation[jobs={_scale(n_jobs)}]",
+            ground_state_calculation,
+            lambda: (matrix, static_options),
+            **kwargs,
+        )
+        n_jobs *= 10
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-atoms", type=int, default=10**4)
+    parser.add_argument("--max-jobs", type=int, default=10**3)
+    parser.add_argument(
+        "--no-memory", action="store_true", help="Skip memory measurement"
+    )
+    parser.add_argument(
+        "--select", help="Only run benchmarks whose name contains this"
+    )
+    args = parser.parse_args(argv)
+
+    suite = BenchmarkSuite(args.repeat, not args.no_memory, args.select)
+    structure_benchmarks(suite)
+    supercell_benchmarks(suite, args.max_atoms)
+    sweep_benchmarks(suite, args.max_jobs)
+    suite.save(args.output)
+
+    for name, result in suite.results.items():
+        if "error" in result:
+            print(f"{name:<60} {result['error']}")
+        else:
+            print(f"{name:<60} {result['min']:.3e} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
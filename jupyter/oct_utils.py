@@ -7,17 +7,15 @@ import numpy as np
 from typing import Dict, List
 import matplotlib.pyplot as plt
 
+from octopus_workflows.oct_convergence import ConvergenceStore, convergence_fields, load_convergence, load_convergence_files
+from octopus_workflows.oct_profiling import parse_profiling_string, profiling_to_timings
+# Re-exported for notebooks: volumetric outputs (density.cube, density.xsf)
+from octopus_workflows.oct_volumetric import VolumetricData, density_difference  # noqa: F401
+
 
 class ConvergenceData:
     # Map column names to column indices
-    mapping = {'iter': 0,
-               'energy': 1,
-               'energy_diff': 2,
-               'abs_dens': 3,
-               'rel_dens': 4,
-               'abs_ev': 5,
-               'rel_ev': 6
-               }
+    mapping = convergence_fields
 
     def __init__(self, root, load_on_init=True):
         self.root = root
@@ -28,7 +26,7 @@ class ConvergenceData:
             self.data: np.ndarray | None = None
 
     def load(self):
-        self.data = np.loadtxt(Path(self.root, 'static/convergence'), skiprows=1)
+        self.data = load_convergence(self.root)
 
     def get(self, key: str):
         try:
@@ -81,7 +79,8 @@ class ConvergenceData:
 #     return system_calcs
 
 
-def parse_convergence_calculations(dirs: List[str], columns=None, get_system_name=lambda d: d.name) -> dict:
+def parse_convergence_calculations(dirs: List[str], columns=None, get_system_name=lambda d: d.name,
+                                   max_workers=None) -> dict:
     """ Parse data from convergence files into a dictionary.
 
     :param subdirs: List of calculation directories. Expect the full path
@@ -89,62 +88,59 @@ def parse_convergence_calculations(dirs: List[str], columns=None, get_system_nam
     change in density.
     :param get_system_name: Callable function that gets the system name from the subdirectory.
     Default assumes subdirectory name is the system name.
+    :param max_workers: Maximum number of threads used to read the convergence files.
 
     :return: system_calcs: Dict with keys of system names, and values: {'directory', 'data'}
     """
     if columns is None:
         columns = [0, 4]
 
-    system_calcs = {}
-    for dir in map(Path, dirs):
+    dirs = [Path(dir) for dir in dirs]
+    for dir in dirs:
         if not dir.is_dir():
             raise NotADirectoryError(f'Cannot find {dir.as_posix()}')
+
+    all_data = load_convergence_files(dirs, max_workers=max_workers)
+
+    system_calcs = {}
+    for dir, data in zip(dirs, all_data):
         system_name = get_system_name(dir)
-        data = np.loadtxt(Path(dir, 'static/convergence'), skiprows=1)
         system_calcs[system_name] = {'directory': dir.as_posix(), 'data': data[:, columns]}
 
     return system_calcs
 
 
-def parse_profiling(root) -> dict:
+def parse_convergence_store(file, columns=None, names: List[str] = None) -> dict:
+    """ Parse data from a ConvergenceStore file into a dictionary.
+
+    Returns the same structure as `parse_convergence_calculations`, such that
+    the result can be passed straight to `plot_convergence`. Data are views of
+    the memory-mapped store, so nothing is read until it is plotted.
+
+    :param file: Store written with ConvergenceStore.save
+    :param columns: Optional list of columns to return. Defaults to relative
+    change in density.
+    :param names: Optional subset of calculation names to return.
+    :return: system_calcs: Dict with keys of calculation names, and values: {'data'}
     """
+    store = ConvergenceStore.load(file)
+    system_calcs = store.to_system_calcs(columns)
+    if names is not None:
+        system_calcs = {name: system_calcs[name] for name in names}
+    return system_calcs
+
+
+def parse_profiling(root) -> dict:
+    """ Parse the profiling of the first MPI rank, profiling/time.000000
+
+    See `octopus_workflows.oct_profiling.load_profiling` for all ranks.
+
     :param root:
     :return:
     """
     with open(Path(root, "profiling/time.000000")) as fid:
-        lines = fid.readlines()
-
-    n_header = 4
-    timings = {'cumulative': {}, 'self': {}}
-
-    for line in lines[n_header:]:
-        split_data = line.split()
-        key = split_data[0]
-        n_calls = int(split_data[1])
-
-        float_data = [float(x) for x in split_data[2:8]]
-        timings['cumulative'].update({key:
-                                       {'NUM_CALLS': n_calls,
-                                        'TOTAL_TIME': float_data[0],
-                                        'TIME_PER_CALL': float_data[1],
-                                        'MIN_TIME': float_data[2],
-                                        'MFLOPS': float_data[3],
-                                        'MBYTES/S': float_data[4],
-                                        '%TIME': float_data[5]
-                                        }
-                                   })
-
-        float_data = [float(x) for x in split_data[9:]]
-        timings['self'].update({key:
-                                       {'NUM_CALLS': n_calls,
-                                        'TOTAL_TIME': float_data[0],
-                                        'TIME_PER_CALL': float_data[1],
-                                        'MFLOPS': float_data[2],
-                                        'MBYTES/S': float_data[3],
-                                        '%TIME': float_data[4]
-                                        }
-                                   })
-    return timings
+        regions, values = parse_profiling_string(fid.read())
+    return profiling_to_timings(regions, values)
 
 
 # TODO(Alex) This is generic, and could be moved to plotting
@@ -291,3 +287,33 @@ def bar_plot(systems: List[str], fields: List[dict], width=0.27, bar_labels=None
         for i, bar in enumerate(plots[ifield]):
             yval = bar.get_height()
             plt.text(bar.get_x() + bar.get_width() / 2, yval + 0.1, labels[i], ha='center', va='bottom')
+
+
+def plot_scaling(tables: Dict[str, dict], title=''):
+    """ Plot speedup and parallel efficiency of one or more scaling series
+
+    :param tables: Series label: table returned by `octopus_workflows.scaling.scaling_table`
+    :param title:
+    :return: fig, axs
+    """
+    fig, axs = plt.subplots(1, 2, figsize=(10, 4))
+    fig.suptitle(title)
+
+    for label, table in tables.items():
+        axs[0].plot(table['nodes'], table['speedup'], marker='o', label=label)
+        axs[1].plot(table['nodes'], table['efficiency'], marker='o', label=label)
+
+    # Ideal scaling of the first series
+    table = next(iter(tables.values()))
+    axs[0].plot(table['nodes'], table['ideal_speedup'], linestyle='--', color='grey', label='Ideal')
+    axs[1].axhline(1.0, linestyle='--', color='grey')
+
+    axs[0].set_ylabel('Speedup')
+    axs[1].set_ylabel('Parallel efficiency')
+    axs[1].set_ylim(0.0, 1.1)
+    for ax in axs:
+        ax.set_xlabel('Nodes')
+        ax.set_xticks(table['nodes'])
+    axs[0].legend()
+
+    return fig, axs
@@ -0,0 +1,272 @@
+""" Adaptive parameter search, as an alternative to a full cartesian sweep.
+
+Successive halving: every candidate setting is first run on a small subset
+of the systems (the budget). Only the best 1/eta of the candidates are
+promoted to the next rung, where they are run on eta times as many systems.
+Results from earlier rungs are reused, so each (candidate, system) pair is
+run at most once.
+
+The search is driven in batches, as jobs are submitted to a queue:
+
+    search = SuccessiveHalving(matrix, static_options, "^system_files")
+    while not search.done:
+        jobs = search.next_batch()
+        # write, submit and wait for the jobs
+        search.update(root)
+    settings, score = search.best()
+"""
+from __future__ import annotations
+
+import json
+import math
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from octopus_workflows.oct_profiling import load_profiling, region_metric
+from octopus_workflows.oct_static import load_info
+from octopus_workflows.simple_oct_workflow import (
+    OctopusJob,
+    ground_state_calculation,
+)
+from octopus_workflows.utils import cartesian_product
+
+
+def iterations_score(root) -> float | None:
+    """Number of SCF iterations of a calculation.
+
+    :return: Number of iterations, inf if the SCF did not converge, or None
+    if static/info has not been written yet.
+    """
+    try:
+        info = load_info(root)
+    except FileNotFoundError:
+        return None
+    if not info["converged"]:
+        return math.inf
+    return float(info["n_iterations"])
+
+
+def runtime_score(root, region: str = "COMPLETE_RUN") -> float | None:
+    """Wall time of a calculation, from the slowest rank's profiling.
+
+    Requires ProfilingMode = prof_time.
+
+    :return: Time in seconds, inf if the SCF did not converge or the
+    finished calculation has no profiling of the region, for example if it
+    crashed or ran without profiling, or None if static/info has not been
+    written yet.
+    """
+    n_iterations = iterations_score(root)
+    if n_iterations is None or math.isinf(n_iterations):
+        return n_iterations
+    try:
+        times = region_metric(load_profiling(root))
+    except FileNotFoundError:
+        return math.inf
+    return times.get(region, math.inf)
+
+
+class SuccessiveHalving:
+    """Successive halving over the candidates of a `matrix` dict.
+
+    :param matrix: Options to search, in the format of
+    `ground_state_calculation`. Must include budget_key.
+    :param static_options: Options fixed for all calculations.
+    :param budget_key: Key of matrix whose values are revealed rung by rung,
+    typically the systems. Order the values such that the most
+    representative come first.
+    :param eta: Fraction of candidates promoted is 1 / eta, and the budget
+    grows by a factor of eta per rung.
+    :param min_budget: Number of budget values in the first rung.
+    :param score: Callable taking a calculation directory, returning a
+    score to minimise, inf for a failed calculation, or None if the
+    calculation has not finished. Defaults to `iterations_score`.
+    :param aggregate: Reduces a candidate's scores over budget values.
+    :param workflow_options: Passed to `ground_state_calculation`, for
+    example meta_value_ops, file_rules, slurm_settings and binary_path.
+    """
+
+    def __init__(
+        self,
+        matrix: dict,
+        static_options: dict,
+        budget_key: str,
+        eta: int = 3,
+        min_budget: int = 1,
+        score: Callable = iterations_score,
+        aggregate: Callable = np.mean,
+        **workflow_options,
+    ):
+        if budget_key not in matrix:
+            raise KeyError(f"budget_key {budget_key} is not a matrix key")
+        if eta < 2:
+            raise ValueError("eta must be at least 2")
+        self.matrix = matrix
+        self.static_options = static_options
+        self.budget_key = budget_key
+        self.eta = eta
+        self.min_budget = min_budget
+        self.score = score
+        self.aggregate = aggregate
+        self.workflow_options = workflow_options
+
+        self.budget_values = list(matrix[budget_key])
+        self.candidates: List[dict] = cartesian_product(
+            {k: v for k, v in matrix.items() if k != budget_key}
+        )
+        self.rung = 0
+        self.alive: List[int] = list(range(len(self.candidates)))
+        # (candidate index, budget index) -> score
+        self.scores: Dict[Tuple[int, int], float] = {}
+        # job id -> (candidate index, budget index), for submitted jobs
+        self.pending: Dict[str, Tuple[int, int]] = {}
+        self.done = False
+
+    @property
+    def n_budget(self) -> int:
+        """Number of budget values evaluated in the current rung."""
+        return min(
+            self.min_budget * self.eta**self.rung, len(self.budget_values)
+        )
+
+    def _value(self, i: int, key):
+        """Value of candidate i for a matrix key, re-zipping zipped keys."""
+        if isinstance(key, tuple):
+            return tuple(self.candidates[i][k] for k in key)
+        return self.candidates[i][key]
+
+    def _candidate_jobs(self, i: int, budget: List[int]) -> Tuple[dict, dict]:
+        """Jobs of candidate i, and a map of job id to (i, budget index)."""
+        # Preserve the key order of matrix, for consistent job ids
+        matrix = {
+            key: (
+                [self.budget_values[j] for j in budget]
+                if key == self.budget_key
+                else [self._value(i, key)]
+            )
+            for key in self.matrix
+        }
+        jobs = ground_state_calculation(
+            matrix, self.static_options, **self.workflow_options
+        )
+        return dict(zip(jobs, ((i, j) for j in budget))), jobs
+
+    def next_batch(self) -> Dict[str, OctopusJob]:
+        """Jobs of the current rung that have not already been run.
+
+        :return: Jobs, in the format of `ground_state_calculation`.
+        """
+        if self.done:
+            return {}
+        batch = {}
+        submitted = set(self.pending.values())
+        for i in self.alive:
+            budget = [
+                j
+                for j in range(self.n_budget)
+                if (i, j) not in self.scores and (i, j) not in submitted
+            ]
+            if not budget:
+                continue
+            keys, jobs = self._candidate_jobs(i, budget)
+            duplicates = set(jobs) & (set(batch) | set(self.pending))
+            if duplicates or len(jobs) != len(budget):
+                raise ValueError(
+                    f"Job ids of {self.candidates[i]} are not unique. "
+                    "Matrix values must give distinct directory names."
+                )
+            self.pending.update(keys)
+            batch.update(jobs)
+        return batch
+
+    def update(self, root, missing_as_failed: bool = False) -> int:
+        """Score finished jobs, and promote candidates once the current
+        rung is complete.
+
+        :param root: Directory the jobs were written to.
+        :param missing_as_failed: Score jobs without results as failed,
+        for example once the queue has drained after a crash.
+        :return: Number of jobs scored.
+        """
+        n_scored = 0
+        for job_id, key in list(self.pending.items()):
+            score = self.score(Path(root, job_id))
+            if score is None:
+                if not missing_as_failed:
+                    continue
+                score = math.inf
+            self.scores[key] = float(score)
+            del self.pending[job_id]
+            n_scored += 1
+
+        if not self.pending and self._rung_complete():
+            self._promote()
+        return n_scored
+
+    def _rung_complete(self) -> bool:
+        return all(
+            (i, j) in self.scores
+            for i in self.alive
+            for j in range(self.n_budget)
+        )
+
+    def candidate_score(self, i: int) -> float:
+        """Aggregate score of candidate i, over its evaluated budget."""
+        values = [s for (c, _), s in self.scores.items() if c == i]
+        if not values or any(math.isinf(s) for s in values):
+            return math.inf
+        return float(self.aggregate(values))
+
+    def _promote(self):
+        ranked = sorted(self.alive, key=self.candidate_score)
+        if self.n_budget == len(self.budget_values) or len(ranked) == 1:
+            self.alive = ranked[:1]
+            self.done = True
+            return
+        n_keep = max(len(ranked) // self.eta, 1)
+        self.alive = sorted(ranked[:n_keep])
+        self.rung += 1
+
+    def best(self) -> Tuple[dict, float]:
+        """Best candidate found so far, and its aggregate score."""
+        i = min(self.alive, key=self.candidate_score)
+        return self.candidates[i], self.candidate_score(i)
+
+    def report(self) -> dict:
+        """Summary of the compute used, relative to the full sweep."""
+        n_full = len(self.candidates) * len(self.budget_values)
+        n_run = len(self.scores) + len(self.pending)
+        return {
+            "rung": self.rung,
+            "n_candidates": len(self.candidates),
+            "n_alive": len(self.alive),
+            "n_jobs": n_run,
+            "n_jobs_full_sweep": n_full,
+            "fraction": n_run / n_full if n_full else 0.0,
+        }
+
+    def save(self, file):
+        """Save the search state as JSON, such that the search can be
+        resumed with `restore`."""
+        state = {
+            "rung": self.rung,
+            "alive": self.alive,
+            "done": self.done,
+            "scores": [[i, j, s] for (i, j), s in self.scores.items()],
+            "pending": {k: list(v) for k, v in self.pending.items()},
+        }
+        with open(file, "w") as fid:
+            json.dump(state, fid)
+
+    def restore(self, file):
+        """Restore a state written by `save`. The search must be constructed
+        with the same matrix and budget_key."""
+        with open(file, "r") as fid:
+            state = json.load(fid)
+        self.rung = state["rung"]
+        self.alive = state["alive"]
+        self.done = state["done"]
+        self.scores = {(i, j): s for i, j, s in state["scores"]}
+        self.pending = {k: tuple(v) for k, v in state["pending"].items()}
@@ -0,0 +1,207 @@
+""" Benchmark harness: time and memory measurements, stored as JSON, and
+comparison of results against a saved baseline.
+
+Run the suite in benchmarks/, then compare:
+
+    python benchmarks/suite.py --output current.json
+    python -m octopus_workflows.benchmark baseline.json current.json
+
+Only the standard library is used, so benchmarks run offline.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime
+import gc
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+
+def measure(
+    func: Callable,
+    setup: Callable = None,
+    repeat: int = 5,
+    memory: bool = True,
+) -> dict:
+    """Time a function, and measure its peak memory allocation.
+
+    Memory is measured in a separate call, as tracing allocations slows
+    execution.
+
+    :param func: Function to benchmark, called as func(*setup()).
+    :param setup: Returns the arguments of func, excluded from the timing.
+    Called before every call of func, such that func may mutate them.
+    :param repeat: Number of timed calls.
+    :param memory: Measure the peak memory allocated by one call.
+    :return: Dict of 'min', 'median' and 'mean' time in seconds, 'repeat',
+    and 'peak_memory' in bytes (None if not measured).
+    """
+    if setup is None:
+        setup = tuple
+
+    times = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            args = setup()
+            start = time.perf_counter()
+            func(*args)
+            times.append(time.perf_counter() - start)
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    peak = None
+    if memory:
+        args = setup()
+        tracemalloc.start()
+        try:
+            func(*args)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "repeat": repeat,
+        "peak_memory": peak,
+    }
+
+
+def metadata() -> dict:
+    """Description of the machine and environment of a benchmark run."""
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+class BenchmarkSuite:
+    """Collection of named benchmarks.
+
+    :param repeat: Default number of timed calls per benchmark.
+    :param memory: Measure peak memory.
+    :param select: Only run benchmarks whose name contains this string.
+    """
+
+    def __init__(self, repeat: int = 5, memory: bool = True, select=None):
+        self.repeat = repeat
+        self.memory = memory
+        self.select = select
+        self.results: Dict[str, dict] = {}
+
+    def run(self, name: str, func: Callable, setup: Callable = None, **kwargs):
+        """Measure a benchmark, recording any exception as its result.
+
+        :param kwargs: Override the arguments of `measure`.
+        """
+        if self.select is not None and self.select not in name:
+            return
+        options = {"repeat": self.repeat, "memory": self.memory, **kwargs}
+        try:
+            self.results[name] = measure(func, setup, **options)
+        except Exception as error:
+            self.results[name] = {"error": f"{type(error).__name__}: {error}"}
+
+    def to_json(self) -> dict:
+        return {"metadata": metadata(), "benchmarks": self.results}
+
+    def save(self, file):
+        with open(file, "w") as fid:
+            json.dump(self.to_json(), fid, indent=1)
+
+
+def compare_results(
+    baseline: dict,
+    current: dict,
+    threshold: float = 0.2,
+    metric: str = "min",
+    min_time: float = 1.0e-4,
+) -> List[dict]:
+    """Compare two benchmark results, as written by `BenchmarkSuite.save`.
+
+    :param threshold: Relative increase above which a benchmark regressed.
+    :param metric: Time statistic to compare.
+    :param min_time: Timings below this, in seconds, are too noisy to flag.
+    :return: One record per benchmark present in both, sorted by descending
+    ratio, with 'name', 'baseline', 'current', 'ratio', 'regression' and
+    the same for peak memory.
+    """
+    records = []
+    for name, result in current["benchmarks"].items():
+        reference = baseline["benchmarks"].get(name)
+        if reference is None or "error" in reference or "error" in result:
+            continue
+        ratio = result[metric] / max(reference[metric], 1.0e-12)
+        memory_ratio = None
+        if reference.get("peak_memory") and result.get("peak_memory"):
+            memory_ratio = result["peak_memory"] / reference["peak_memory"]
+        records.append(
+            {
+                "name": name,
+                "baseline": reference[metric],
+                "current": result[metric],
+                "ratio": ratio,
+                "regression": ratio > 1.0 + threshold
+                and result[metric] > min_time,
+                "memory_ratio": memory_ratio,
+                "memory_regression": memory_ratio is not None
+                and memory_ratio > 1.0 + threshold,
+            }
+        )
+    return sorted(records, key=lambda r: -r["ratio"])
+
+
+def main(argv: List[str] = None) -> int:
+    """Compare a benchmark run against a baseline.
+
+    :return: Exit code, 1 if any benchmark regressed.
+    """
+    parser = argparse.ArgumentParser(
+        description="Flag benchmark regressions against a baseline."
+    )
+    parser.add_argument("baseline", help="Baseline results JSON")
+    parser.add_argument("current", help="Current results JSON")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--metric", default="min")
+    parser.add_argument(
+        "--memory", action="store_true", help="Also fail on memory regressions"
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as fid:
+        baseline = json.load(fid)
+    with open(args.current) as fid:
+        current = json.load(fid)
+
+    records = compare_results(baseline, current, args.threshold, args.metric)
+    failed = False
+    for r in records:
+        flag = ""
+        if r["regression"]:
+            flag, failed = "REGRESSION", True
+        if r["memory_regression"]:
+            flag += " MEMORY"
+            failed = failed or args.memory
+        print(
+            f"{r['name']:<60} {r['baseline']:.3e} -> {r['current']:.3e} s "
+            f"x{r['ratio']:.2f} {flag}"
+        )
+    missing = sorted(set(baseline["benchmarks"]) - set(current["benchmarks"]))
+    for name in missing:
+        print(f"{name:<60} missing from current results")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,310 @@
+""" Sweep bundles: all job files of a sweep in one indexed archive.
+
+Writing a sweep as a directory tree costs several small files per job, which
+counts against inode quotas and loads the metadata server of a parallel file
+system. A bundle is a single zip archive, holding each job's inp, slurm.sh and
+hash.txt, and one copy of each file dependency shared by any number of jobs.
+The zip central directory gives random access to any member, and index.json
+maps each job to its members.
+
+Jobs are submitted from the bundle. Only an empty directory is created per
+job, for its results. Each job's launch script unpacks its files onto
+node-local scratch at job start, runs there, and copies its results back to
+its directory on exit. Slurm signals the job ahead of its walltime, such
+that the results of a timed-out job, including its restart data, are also
+copied back. The launch step requires unzip on compute nodes.
+"""
+from __future__ import annotations
+
+import json
+import os
+import posixpath
+import re
+import shlex
+import time
+import zipfile
+from pathlib import Path
+from typing import Dict, List
+
+from octopus_workflows.instrument import stage
+from octopus_workflows.simple_oct_workflow import OctopusJob
+from octopus_workflows.warm_start import submission_order
+
+index_name = "index.json"
+
+# Node-local scratch of a running job, overridden by $OCT_SCRATCH
+default_scratch = "${TMPDIR:-/tmp}"
+
+# Files written per job: file name, OctopusJob attribute
+_job_files = [("inp", "inp"), ("slurm.sh", "slurm"), ("hash.txt", "hash")]
+_files_dir = ".files"
+_launch_dir = ".launch"
+
+# Signal sent to the batch shell ahead of the walltime, to copy results back
+walltime_signal = "B:TERM@120"
+
+# Line of a Slurm script that runs Octopus
+_run_command = re.compile(r"^\s*(srun|mpirun|mpiexec|octopus)\b", re.MULTILINE)
+
+
+def _unpack_step(entry: dict, depends_on: dict, bundle: str, scratch: str):
+    """Commands that unpack a job onto scratch, and run from there."""
+    lines = [
+        "# Unpack the job from its sweep bundle onto node-local scratch",
+        f"bundle=${{OCT_BUNDLE:-{bundle}}}",
+        f"scratch=${{OCT_SCRATCH:-{scratch}}}/oct_${{SLURM_JOB_ID}}",
+        "mkdir -p ${scratch}",
+    ]
+    subdirs = sorted(
+        {posixpath.dirname(name) for name in entry["files"]} - {""}
+    )
+    for subdir in subdirs:
+        lines.append(f"mkdir -p ${{scratch}}/{shlex.quote(subdir)}")
+    for name, member in entry["files"].items():
+        if name == "slurm.sh":
+            continue
+        lines.append(
+            f"unzip -p ${{bundle}} {shlex.quote(member)} "
+            f"> ${{scratch}}/{shlex.quote(name)}"
+        )
+    # Produced by other jobs, and already copied to the submit directory
+    for name, file in depends_on.items():
+        if "after" in file:
+            name = shlex.quote(name)
+            lines.append(
+                f"mkdir -p $(dirname ${{scratch}}/{name}) && "
+                f"cp -r {name} ${{scratch}}/{name}"
+            )
+    lines += [
+        "trap 'cp -r ${scratch}/. ${SLURM_SUBMIT_DIR}/' EXIT",
+        "trap 'kill -TERM ${run_pid} 2>/dev/null; wait ${run_pid}; exit 143' "
+        "TERM",
+        "cd ${scratch}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def _add_directive(script: str, name: str, value: str) -> str:
+    """Add an #SBATCH line after the script's last #SBATCH line, or its
+    shebang, formatted as `slurm_templates.sbatch_header` formats them."""
+    lines = script.split("\n")
+    position = 1 if lines[0].startswith("#!") else 0
+    for i, line in enumerate(lines):
+        if line.startswith("#SBATCH"):
+            position = i + 1
+    lines.insert(position, f"#SBATCH --{name:<19} {value}")
+    return "\n".join(lines)
+
+
+def launch_script(
+    slurm: str,
+    entry: dict,
+    depends_on: dict,
+    bundle: str,
+    scratch: str = default_scratch,
+) -> str:
+    """Slurm script of a job submitted from a bundle.
+
+    The unpack step is inserted before the last run command of the job's
+    script: a line starting with srun, mpirun, mpiexec or octopus. The run
+    command is run in the background and waited on, such that the shell
+    traps the walltime signal while it runs, and sbatch is asked to send
+    the signal, unless the script already sets --signal.
+
+    :param slurm: Slurm script of the job.
+    :param entry: Index entry of the job.
+    :param depends_on: File dependencies of the job.
+    :param bundle: Path to the bundle, relative to the job directory.
+    :param scratch: Node-local scratch directory.
+    """
+    runs = list(_run_command.finditer(slurm))
+    if not runs:
+        raise ValueError(
+            f"No run command in the Slurm script of {entry['directory']}"
+        )
+    start = runs[-1].start()
+    end = slurm.find("\n", start)
+    end = len(slurm) if end < 0 else end
+    run = f"{slurm[start:end]} &\nrun_pid=$!\nwait ${{run_pid}}"
+    unpack = _unpack_step(entry, depends_on, bundle, scratch)
+    head = slurm[:start]
+    if "--signal" not in head:
+        head = _add_directive(head, "signal", walltime_signal)
+    return head + unpack + run + slurm[end:]
+
+
+def write_bundle(
+    jobs: Dict[str, OctopusJob],
+    file,
+    scratch: str = default_scratch,
+    compression: int = zipfile.ZIP_DEFLATED,
+) -> dict:
+    """Write the jobs of a sweep to a bundle.
+
+    Dependencies produced by another job are not bundled, as with
+    `OctopusJob.write`. Other dependencies are stored once per source file.
+
+    :param jobs: Jobs, in the format of `ground_state_calculation`.
+    :param file: Bundle file. Jobs submitted from it expect it at the root
+    of the sweep, unless $OCT_BUNDLE is set.
+    :param scratch: Node-local scratch directory of running jobs.
+    :param compression: zipfile compression method.
+    :return: Report, with 'jobs', 'files', 'dependencies', 'bytes' and
+    'seconds'.
+    """
+    start = time.perf_counter()
+    bundle_name = Path(file).name
+    # Source: member
+    dependencies: Dict[str, str] = {}
+    index = {}
+    n_files = 0
+
+    with zipfile.ZipFile(file, "w", compression=compression) as archive:
+        with stage("bundle", len(jobs)):
+            for job_id, job in jobs.items():
+                files = {}
+                for fname, attr in _job_files:
+                    member = posixpath.join(job.directory, fname)
+                    archive.writestr(member, getattr(job, attr))
+                    files[fname] = member
+                    n_files += 1
+
+                for name, dep in job.depends_on.items():
+                    if "after" in dep:
+                        continue
+                    source = os.path.normpath(dep["source"])
+                    if source not in dependencies:
+                        member = posixpath.join(
+                            _files_dir,
+                            str(len(dependencies)),
+                            Path(source).name,
+                        )
+                        archive.write(source, member)
+                        dependencies[source] = member
+                        n_files += 1
+                    files[name] = dependencies[source]
+
+                entry = {
+                    "directory": job.directory,
+                    "hash": job.hash,
+                    "after": list(job.after),
+                    "depends_on": job.depends_on,
+                    "files": files,
+                }
+                depth = len(Path(job.directory).parts)
+                archive.writestr(
+                    posixpath.join(_launch_dir, f"{job_id}.sh"),
+                    launch_script(
+                        job.slurm,
+                        entry,
+                        job.depends_on,
+                        posixpath.join(*[".."] * depth, bundle_name),
+                        scratch,
+                    ),
+                )
+                index[job_id] = entry
+
+        archive.writestr(index_name, json.dumps({"jobs": index}))
+
+    return {
+        "jobs": len(index),
+        "files": n_files,
+        "dependencies": len(dependencies),
+        "bytes": os.path.getsize(file),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+class Bundle:
+    """Read a sweep bundle.
+
+    :param file: Bundle file, as written by `write_bundle`.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self._archive = zipfile.ZipFile(file, "r")
+        self.index: Dict[str, dict] = json.loads(
+            self._archive.read(index_name)
+        )["jobs"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._archive.close()
+
+    @property
+    def job_ids(self) -> List[str]:
+        return list(self.index)
+
+    def read(self, job_id: str, name: str) -> bytes:
+        """File of a job, such as inp or a dependency.
+
+        :param name: Path relative to the job directory.
+        """
+        return self._archive.read(self.index[job_id]["files"][name])
+
+    def extract_job(self, job_id: str, destination):
+        """Write the files of one job to a directory, as
+        `OctopusJob.write` writes them to the job directory."""
+        for name, member in self.index[job_id]["files"].items():
+            path = Path(destination, name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with open(path, "wb") as fid:
+                fid.write(self._archive.read(member))
+
+    def extract(self, root="", exist_ok=False):
+        """Write the sweep as a directory tree, as `OctopusJob.write` for
+        each job."""
+        for job_id, entry in self.index.items():
+            subdir = Path(root, entry["directory"])
+            subdir.mkdir(parents=True, exist_ok=exist_ok)
+            self.extract_job(job_id, subdir)
+
+    def jobs(self) -> Dict[str, OctopusJob]:
+        """Jobs of the bundle, in the format of `ground_state_calculation`.
+
+        Dependency sources are the paths the bundle was written from.
+        """
+        return {
+            job_id: OctopusJob(
+                entry["directory"],
+                self.read(job_id, "inp").decode("utf-8"),
+                self.read(job_id, "slurm.sh").decode("utf-8"),
+                entry["hash"],
+                entry["depends_on"],
+                after=entry["after"],
+            )
+            for job_id, entry in self.index.items()
+        }
+
+    def submission_script(self) -> str:
+        """Shell script that submits all jobs from the sweep root, in which
+        the bundle is, such that each job waits on the jobs in its `after`
+        list.
+
+        :return: Script string.
+        """
+        ids = {job_id: f"job_{i}" for i, job_id in enumerate(self.index)}
+        bundle = shlex.quote(Path(self.file).name)
+        lines = ["#!/bin/bash", "set -e", f"export OCT_BUNDLE=$(pwd)/{bundle}"]
+
+        after = {k: entry["after"] for k, entry in self.index.items()}
+        for job_id in submission_order(after):
+            directory = shlex.quote(self.index[job_id]["directory"])
+            launch = shlex.quote(posixpath.join(_launch_dir, f"{job_id}.sh"))
+            dependency = ""
+            if after[job_id]:
+                deps = ":".join(f"${{{ids[dep]}}}" for dep in after[job_id])
+                dependency = f" --dependency=afterok:{deps}"
+            lines.append(
+                f"{ids[job_id]}=$(mkdir -p {directory} && cd {directory} && "
+                f"unzip -p ${{OCT_BUNDLE}} {launch} | "
+                f"sbatch --parsable{dependency})"
+            )
+
+        return "\n".join(lines) + "\n"
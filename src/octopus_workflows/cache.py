@@ -0,0 +1,144 @@
+""" Sidecar caching of parsed output files.
+
+Parsed data is written next to the source file, with a name that encodes
+the source's size and modification time. A sidecar is only valid whilst
+the source file is unchanged, so stale sidecars are never read.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+
+def file_signature(paths: str | Path | List[str | Path]) -> str:
+    """Signature of one or more files, from their size and mtime.
+
+    :param paths: File path, or list of file paths.
+    :return: Signature string. For a single file this is "size_mtime",
+    for several files it is a hash over all names, sizes and mtimes.
+    """
+    if isinstance(paths, (str, Path)):
+        stat = os.stat(paths)
+        return f"{stat.st_size}_{stat.st_mtime_ns}"
+
+    sha1_hash = hashlib.sha1()
+    for path in sorted(Path(p) for p in paths):
+        stat = os.stat(path)
+        sha1_hash.update(
+            f"{path.name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8")
+        )
+    return sha1_hash.hexdigest()[:16]
+
+
+def sidecar_path(path: str | Path, tag: str, suffix: str = ".npy") -> Path:
+    """Location of the sidecar for a source file, minus its signature.
+
+    For example, static/convergence -> static/.convergence.<tag>
+
+    :param path: Source file (or directory) path.
+    :param tag: Tag to distinguish several sidecars of the same source.
+    :param suffix: Sidecar file extension.
+    :return: Sidecar path stub.
+    """
+    path = Path(path)
+    return Path(path.parent, f".{path.name}.{tag}{suffix}")
+
+
+def signed_path(path, tag: str, signature: str, suffix: str) -> Path:
+    """Location of the sidecar for a source file with a given signature."""
+    stub = sidecar_path(path, tag, suffix)
+    return Path(stub.parent, f"{stub.stem}.{signature}{suffix}")
+
+
+def remove_stale(path, tag: str, signature: str, suffix: str):
+    """Remove any sidecars with the same tag and a different signature."""
+    stub = sidecar_path(path, tag, suffix)
+    current = signed_path(path, tag, signature, suffix)
+    for old in stub.parent.glob(f"{stub.stem}.*{suffix}"):
+        if old != current:
+            try:
+                old.unlink()
+            except OSError:
+                pass
+
+
+def load_array(
+    path: str | Path, tag: str, signature: str, mmap_mode: str | None = "r"
+) -> np.ndarray | None:
+    """Load a cached array, if a valid sidecar exists.
+
+    :param path: Source file path.
+    :param tag: Sidecar tag.
+    :param signature: Current signature of the source, see `file_signature`.
+    :param mmap_mode: Memory-map mode passed to np.load.
+    :return: Cached array, or None if there is no valid sidecar.
+    """
+    cached = signed_path(path, tag, signature, ".npy")
+    try:
+        return np.load(cached, mmap_mode=mmap_mode)
+    except (OSError, ValueError):
+        return None
+
+
+def save_array(path: str | Path, tag: str, signature: str, data: np.ndarray):
+    """Write an array sidecar, removing any stale ones.
+
+    Failure to write (for example, a read-only directory) is not an error,
+    the data just won't be cached.
+
+    :param path: Source file path.
+    :param tag: Sidecar tag.
+    :param signature: Signature of the source the data was parsed from.
+    :param data: Array to cache.
+    """
+    cached = signed_path(path, tag, signature, ".npy")
+    tmp = Path(cached.parent, f"{cached.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "wb") as fid:
+            np.save(fid, np.ascontiguousarray(data), allow_pickle=False)
+        os.replace(tmp, cached)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        return
+    remove_stale(path, tag, signature, ".npy")
+
+
+def load_json(path: str | Path, tag: str, signature: str):
+    """Load cached JSON data, if a valid sidecar exists.
+
+    :param path: Source file path.
+    :param tag: Sidecar tag.
+    :param signature: Current signature of the source.
+    :return: Cached data, or None if there is no valid sidecar.
+    """
+    cached = signed_path(path, tag, signature, ".json")
+    try:
+        with open(cached, "r") as fid:
+            return json.load(fid)
+    except (OSError, ValueError):
+        return None
+
+
+def save_json(path: str | Path, tag: str, signature: str, data):
+    """Write a JSON sidecar, removing any stale ones.
+
+    :param path: Source file path.
+    :param tag: Sidecar tag.
+    :param signature: Signature of the source the data was parsed from.
+    :param data: JSON-serialisable data.
+    """
+    cached = signed_path(path, tag, signature, ".json")
+    tmp = Path(cached.parent, f"{cached.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp, "w") as fid:
+            json.dump(data, fid)
+        os.replace(tmp, cached)
+    except OSError:
+        tmp.unlink(missing_ok=True)
+        return
+    remove_stale(path, tag, signature, ".json")
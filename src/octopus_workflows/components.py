@@ -1,18 +1,26 @@
 """ Units or components of work that are composed to form a workflow
 """
+from __future__ import annotations
+
 import copy
 import os
 from typing import Callable, List
 
-import ase
-import simple_slurm
-
 from octopus_workflows.oct_ase import ase_atoms_to_oct_structure
 from octopus_workflows.oct_write import write_octopus_input
-from octopus_workflows.utils import cartesian_product
+from octopus_workflows.slurm_templates import (
+    default_profile,
+    render_script,
+    render_scripts,
+)
+from octopus_workflows.utils import cartesian_product, lazy_import
 
+ase = lazy_import("ase")
 
-def expand_input_dictionary(matrix: dict, fixed_settings: dict) -> List[dict]:
+
+def expand_input_dictionary(
+    matrix: dict, fixed_settings: dict, constraints: List[Callable] = None
+) -> List[dict]:
     """Generate an input dict of all option permutations.
 
     Given a
@@ -27,9 +35,15 @@ def expand_input_dictionary(matrix: dict, fixed_settings: dict) -> List[dict]:
      {'material': 'Fe_cubic', 'Spacing': 0.2},
      {'material': 'Cu_cubic', 'Spacing': 0.2}]
 
+    Permutations that fail any constraint are never generated. Constraints
+    may also index fixed settings. See `utils.expand_matrix` for zipped
+    options and constraints.
+
     :return:
     """
-    permutation_options = cartesian_product(matrix)
+    permutation_options = cartesian_product(
+        matrix, constraints, fixed_settings
+    )
     all_options = [{**opt, **fixed_settings} for opt in permutation_options]
     return all_options
 
@@ -135,11 +149,15 @@ def inp_string(
     return list(input_strings)
 
 
-def directory_generation(matrix: dict, prefix="", suffix="") -> List[str]:
-    """Generate a directory name for each input, based on the variables that
-    are varied.
+def directory_names(options: List[dict], prefix="", suffix="") -> List[str]:
+    """Generate a directory name for each combination of varied options.
 
-    :param matrix:
+    Every value is named by its string, such that int options like
+    ChebyshevFilterDegree give distinct directories, and a path by its
+    basename.
+
+    :param options: Combinations of the options that are varied, as
+    returned by `utils.cartesian_product`.
     :param prefix:
     :param suffix:
     :return:
@@ -149,56 +167,53 @@ def directory_generation(matrix: dict, prefix="", suffix="") -> List[str]:
     if suffix != "":
         suffix = f"_{suffix}"
 
-    # Bit of a hack. If a directory defines a matrix value, then just take the basename
-    mat = {}
-    for key, value in matrix.items():
-        mat[key] = [os.path.basename(str(x)) for x in value]
-    options = cartesian_product(mat)
-
     ids = []
     for opt in options:
-        id = ""
-        for key, value in opt.items():
-            if isinstance(value, str):
-                id += value + "_"
-            if isinstance(value, float):
-                id += str(value) + "_"
-            if isinstance(value, list):
-                id += "".join(str(s) for s in value) + "_"
-
-        if id[-1] == "_":
-            id = id[:-1]
+        # Bit of a hack. If a directory defines a value, then just take the basename
+        id = "_".join(os.path.basename(str(value)) for value in opt.values())
         id = f"{prefix}{id}{suffix}"
         ids.append(id)
     return ids
 
 
-def slurm_submission_script(oct_root: str, options: dict) -> str:
+def directory_generation(
+    matrix: dict, prefix="", suffix="", constraints: List[Callable] = None
+) -> List[str]:
+    """Generate a directory name for each input, based on the variables that
+    are varied.
+
+    :param matrix:
+    :param prefix:
+    :param suffix:
+    :param constraints: Predicates that combinations must satisfy, such
+    that names match the inputs of `expand_input_dictionary`.
+    :return:
+    """
+    return directory_names(
+        cartesian_product(matrix, constraints), prefix, suffix
+    )
+
+
+def slurm_submission_script(
+    oct_root: str, options: dict, profile: str = default_profile
+) -> str:
     """Default Slurm settings for running converged ground states on ADA
 
     Note, need double-quotes to allow variable expansion.
 
+    :param profile: Site profile, see `slurm_templates`.
     :return: Slurm input file string.
     """
-    slurm = simple_slurm.Slurm(**options)
-
-    slurm_str = slurm.__str__()
-    modules = "module load gcc/11 openmpi/4 cuda/11.4 openmpi_gpu/4"
+    return render_script(oct_root, options, profile)
 
-    vars = f'export PATH="{oct_root}/bin:${{PATH}}" \n'
-    vars += "export OMP_NUM_THREADS=${SLURM_CPUS_PER_TASK}\n"
-    vars += "export OMP_PLACES=cores"
 
-    srun = "cd ${SLURM_SUBMIT_DIR}\n"
-    srun += "srun octopus > std.out"
-    return "\n".join(cmd for cmd in [slurm_str, modules, vars, srun])
-
-
-def slurm_submission_scripts(oct_root: str, options: dict, job_ids: List[str]):
-    return [
-        slurm_submission_script(oct_root, {**options, "job_name": f"oct_{id}"})
-        for id in job_ids
-    ]
+def slurm_submission_scripts(
+    oct_root: str,
+    options: dict,
+    job_ids: List[str],
+    profile: str = default_profile,
+):
+    return render_scripts(oct_root, options, job_ids, profile)
 
 
 # TODO(Alex) Delete
@@ -0,0 +1,113 @@
+""" Indexed evaluation of file dependency rules over a sweep.
+
+Plain file rules are callables that take a job's full input string. A
+`FileRule` also declares the option keys or blocks it inspects, such as
+Species for pseudopotentials. It is then only evaluated once per distinct
+value of those keys across a sweep, on the input substring they render to.
+
+Every source file found is recorded, such that missing files are reported
+once per sweep, before any job is written.
+"""
+from __future__ import annotations
+
+import os
+from typing import Callable, Dict, List
+
+from octopus_workflows.oct_write import write_octopus_input
+
+
+class FileRule:
+    """File dependency rule that only inspects some input keys.
+
+    :param func: Rule, taking an input string and returning a dict of
+    file_name: source/file_name, as plain file rules.
+    :param keys: Keys or block names inspected. Octopus keys are
+    case-insensitive.
+    """
+
+    def __init__(self, func: Callable, keys: List[str]):
+        self.func = func
+        self.keys = [key.lower() for key in keys]
+
+    def __call__(self, input_string: str) -> dict:
+        return self.func(input_string)
+
+    def fragment(self, options: dict) -> str:
+        """Input substring of the inspected keys."""
+        names = {key.lower(): key for key in options}
+        selected = {
+            names[key]: options[names[key]]
+            for key in self.keys
+            if key in names
+        }
+        return write_octopus_input(selected)
+
+
+class DependencyIndex:
+    """Evaluate file rules for the jobs of a sweep.
+
+    :param file_rules: Plain rules or `FileRule`s.
+    """
+
+    def __init__(self, file_rules: List[Callable]):
+        self.file_rules = file_rules
+        self.n_evaluations = 0
+        # Rule index and input substring: matched files
+        self._matches: Dict[tuple, dict] = {}
+        # Source: first job that depends on it
+        self._sources: Dict[str, str] = {}
+
+    def _match(self, i: int, rule: Callable, options: dict, inp: str):
+        # Any rule with a fragment method declares its keys, as FileRule
+        if not hasattr(rule, "fragment"):
+            self.n_evaluations += 1
+            return rule(inp)
+        key = (i, rule.fragment(options))
+        matched = self._matches.get(key)
+        if matched is None:
+            self.n_evaluations += 1
+            matched = self._matches[key] = rule(key[1])
+        return matched
+
+    def job_dependencies(
+        self, options: dict, inp: str, destination: str
+    ) -> dict:
+        """File dependencies of one job, in the format of
+        `set_job_file_dependencies`.
+
+        :param options: Options the job's input is rendered from.
+        :param inp: Input string, passed to plain rules.
+        :param destination: Job directory.
+        """
+        files = {}
+        for i, rule in enumerate(self.file_rules):
+            for name, source in self._match(i, rule, options, inp).items():
+                files[name] = {
+                    "source": source,
+                    "dest": f"{destination}/{name}",
+                }
+                self._sources.setdefault(source, destination)
+        return files
+
+    def missing_files(self) -> Dict[str, str]:
+        """Sources that do not exist, each checked once.
+
+        :return: Source: first job that depends on it.
+        """
+        return {
+            source: job
+            for source, job in self._sources.items()
+            if not os.path.isfile(source)
+        }
+
+    def validate(self):
+        """Raise if any source file of the sweep is missing."""
+        missing = self.missing_files()
+        if missing:
+            listing = "\n".join(
+                f"  {source} (required by {job})"
+                for source, job in missing.items()
+            )
+            raise FileNotFoundError(
+                f"{len(missing)} file dependencies do not exist:\n{listing}"
+            )
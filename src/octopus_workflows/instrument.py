@@ -0,0 +1,254 @@
+""" Lightweight per-stage instrumentation of workflow steps.
+
+Stages are marked with the `stage` context manager or the `instrumented`
+decorator. Nothing is recorded unless a `Recorder` is active, and marking a
+stage then costs a single global lookup:
+
+    with recording(memory=True) as recorder:
+        jobs = ground_state_calculation(matrix, static_options)
+    recorder.save_json("stages.json")
+    recorder.save_chrome_trace("stages.trace.json")
+
+Chrome traces can be opened in chrome://tracing or https://ui.perfetto.dev.
+"""
+from __future__ import annotations
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+# Active recorder. None when instrumentation is disabled
+_recorder: Recorder | None = None
+
+
+class _NullStage:
+    """Stage returned whilst instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_null_stage = _NullStage()
+
+
+class StageStats:
+    """Accumulated statistics of one stage."""
+
+    __slots__ = ("calls", "time", "items", "peak_memory")
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.items = 0
+        self.peak_memory = None
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "time": self.time,
+            "items": self.items,
+            "throughput": self.items / self.time if self.time > 0 else None,
+            "peak_memory": self.peak_memory,
+        }
+
+
+class _Stage:
+    """Timed stage of an active recorder.
+
+    Set `items` within the stage, if not known on entry.
+    """
+
+    def __init__(self, recorder: Recorder, name: str, items: int | None):
+        self.recorder = recorder
+        self.name = name
+        self.items = items
+
+    def __enter__(self):
+        self.recorder._enter(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.recorder._exit(self, end)
+        return False
+
+
+class Recorder:
+    """Records wall time, call counts, items and peak memory per stage.
+
+    :param memory: Trace peak memory per stage with tracemalloc. Slows down
+    every allocation, so only enable it when memory is of interest. Peaks
+    are the maximum allocated above the memory in use on entry, and are
+    approximate when stages run concurrently in threads.
+    """
+
+    def __init__(self, memory: bool = False):
+        self.memory = memory
+        self.stats: Dict[str, StageStats] = {}
+        self.events: List[dict] = []
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._started_tracing = False
+
+    def start(self):
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def _stack(self) -> list:
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _enter(self, stage: _Stage):
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            stack = self._stack()
+            # Keep the enclosing stage's peak, before resetting it
+            if stack:
+                stack[-1].max_memory = max(stack[-1].max_memory, peak)
+            tracemalloc.reset_peak()
+            stage.start_memory = current
+            stage.max_memory = current
+            stack.append(stage)
+
+    def _exit(self, stage: _Stage, end: float):
+        duration = end - stage.start
+        peak = None
+        if self.memory:
+            absolute = max(
+                stage.max_memory, tracemalloc.get_traced_memory()[1]
+            )
+            peak = absolute - stage.start_memory
+            stack = self._stack()
+            stack.pop()
+            if stack:
+                stack[-1].max_memory = max(stack[-1].max_memory, absolute)
+
+        with self._lock:
+            stats = self.stats.get(stage.name)
+            if stats is None:
+                stats = self.stats[stage.name] = StageStats()
+            stats.calls += 1
+            stats.time += duration
+            stats.items += stage.items or 0
+            if peak is not None:
+                stats.peak_memory = max(stats.peak_memory or 0, peak)
+            event = {
+                "name": stage.name,
+                "ph": "X",
+                "ts": (stage.start - self._origin) * 1.0e6,
+                "dur": duration * 1.0e6,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if stage.items is not None:
+                event["args"] = {"items": stage.items}
+            self.events.append(event)
+
+    def to_dict(self) -> Dict[str, dict]:
+        """Statistics per stage, in order of first completion."""
+        return {name: stats.to_dict() for name, stats in self.stats.items()}
+
+    def save_json(self, file):
+        with open(file, "w") as fid:
+            json.dump(self.to_dict(), fid, indent=1)
+
+    def save_chrome_trace(self, file):
+        """Write complete events in the Chrome trace event format."""
+        with open(file, "w") as fid:
+            json.dump({"traceEvents": self.events}, fid)
+
+
+def stage(name: str, items: int = None):
+    """Context manager marking a stage of work.
+
+    :param name: Stage name. Repeated stages accumulate.
+    :param items: Number of items processed, for the throughput.
+    """
+    recorder = _recorder
+    if recorder is None:
+        return _null_stage
+    return _Stage(recorder, name, items)
+
+
+def instrumented(name: str = None, items: int | Callable = None):
+    """Decorator marking every call of a function as a stage.
+
+    :param name: Stage name. Defaults to the function's qualified name.
+    :param items: Number of items processed per call, or a callable
+    returning it, given the function's arguments.
+    """
+
+    def decorator(func):
+        label = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            recorder = _recorder
+            if recorder is None:
+                return func(*args, **kwargs)
+            n_items = items(*args, **kwargs) if callable(items) else items
+            with _Stage(recorder, label, n_items):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def enable(memory: bool = False) -> Recorder:
+    """Start recording stages, replacing any active recorder."""
+    global _recorder
+    disable()
+    recorder = Recorder(memory)
+    recorder.start()
+    _recorder = recorder
+    return recorder
+
+
+def disable() -> Recorder | None:
+    """Stop recording stages.
+
+    :return: The recorder that was active, if any.
+    """
+    global _recorder
+    recorder, _recorder = _recorder, None
+    if recorder is not None:
+        recorder.stop()
+    return recorder
+
+
+@contextlib.contextmanager
+def recording(memory: bool = False):
+    """Record stages for the duration of the context.
+
+    :return: The active `Recorder`.
+    """
+    recorder = enable(memory)
+    try:
+        yield recorder
+    finally:
+        if _recorder is recorder:
+            disable()
@@ -0,0 +1,220 @@
+""" Write the job directories of a sweep in parallel.
+
+Writing a sweep with `OctopusJob.write` in a loop is latency-bound on
+parallel file systems: every job waits on a mkdir, and on three file opens
+and closes. `write_jobs` creates all directories first, then writes files
+through a thread pool of bounded size.
+
+Each file is written to a temporary name in its job directory, then renamed,
+such that an interrupted write never leaves a partial inp or slurm.sh.
+Temporary files are removed if a write fails. Durability is optional: fsync
+each file as it is written, or all files of a batch of jobs at once. Either
+way, only the files written and their directories are synced.
+"""
+from __future__ import annotations
+
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from octopus_workflows.instrument import stage
+from octopus_workflows.simple_oct_workflow import OctopusJob
+
+# Files written per job: file name, OctopusJob attribute
+job_files = [("inp", "inp"), ("slurm.sh", "slurm"), ("hash.txt", "hash")]
+
+fsync_modes = (None, "file", "batch")
+
+
+def _temporary(path: Path) -> Path:
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+
+def _write_file(path: Path, text: str, fsync: bool) -> Tuple[Path, int]:
+    """Write to a temporary file next to path.
+
+    :return: Temporary path and number of bytes written.
+    """
+    data = text.encode("utf-8")
+    tmp = _temporary(path)
+    try:
+        with open(tmp, "wb") as fid:
+            fid.write(data)
+            if fsync:
+                fid.flush()
+                os.fsync(fid.fileno())
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return tmp, len(data)
+
+
+def _copy_file(source, path: Path, fsync: bool) -> Tuple[Path, int]:
+    tmp = _temporary(path)
+    try:
+        shutil.copyfile(source, tmp)
+        if fsync:
+            _fsync(tmp)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return tmp, os.path.getsize(tmp)
+
+
+def _stage_job(job: OctopusJob, root: Path, fsync: bool) -> Tuple[list, int]:
+    """Write all files of a job to temporary names.
+
+    :return: (temporary, final) path pairs and bytes written.
+    """
+    subdir = Path(root, job.directory)
+    renames, n_bytes = [], 0
+    try:
+        for fname, attr in job_files:
+            path = Path(subdir, fname)
+            tmp, size = _write_file(path, getattr(job, attr), fsync)
+            renames.append((tmp, path))
+            n_bytes += size
+
+        # Those produced by another job are copied when the job runs
+        for file in job.depends_on.values():
+            if "after" in file:
+                continue
+            path = Path(root, file["dest"])
+            tmp, size = _copy_file(file["source"], path, fsync)
+            renames.append((tmp, path))
+            n_bytes += size
+    except BaseException:
+        _discard(renames)
+        raise
+    return renames, n_bytes
+
+
+def _commit(renames: list):
+    for tmp, path in renames:
+        os.replace(tmp, path)
+
+
+def _discard(renames: list):
+    """Remove the temporary files of renames not (yet) committed."""
+    for tmp, _ in renames:
+        tmp.unlink(missing_ok=True)
+
+
+def _fsync(path: Path):
+    """fsync a file or directory."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _gather(executor: ThreadPoolExecutor, func, items) -> Tuple[list, list]:
+    """Apply func to every item, letting all calls complete.
+
+    :return: Results of the calls that succeeded, and exceptions raised.
+    """
+    futures = [executor.submit(func, item) for item in items]
+    wait(futures)
+    results = [f.result() for f in futures if f.exception() is None]
+    errors = [f.exception() for f in futures if f.exception() is not None]
+    return results, errors
+
+
+def _write_batch(
+    executor: ThreadPoolExecutor, stage_job, batch: List[OctopusJob]
+) -> List[Tuple[int, int]]:
+    """Stage every job of a batch, fsync the temporary files, rename them,
+    then fsync the directories renamed into."""
+    staged, errors = _gather(executor, stage_job, batch)
+    renames = [pair for job_renames, _ in staged for pair in job_renames]
+    try:
+        if errors:
+            raise errors[0]
+        list(executor.map(_fsync, [tmp for tmp, _ in renames]))
+        list(executor.map(_commit, [r for r, _ in staged]))
+    except BaseException:
+        _discard(renames)
+        raise
+    directories = {path.parent for _, path in renames}
+    list(executor.map(_fsync, directories))
+    return [(len(r), size) for r, size in staged]
+
+
+def write_jobs(
+    jobs: Dict[str, OctopusJob],
+    root="",
+    exist_ok=False,
+    max_workers: int = 16,
+    fsync: str | None = None,
+    batch_size: int = 512,
+) -> dict:
+    """Write the directories of a sweep, as `OctopusJob.write` for each job.
+
+    :param jobs: Jobs, in the format of `ground_state_calculation`.
+    :param root: Directory the jobs are written to.
+    :param exist_ok: Allow job directories to exist already.
+    :param max_workers: Maximum number of concurrent writes.
+    :param fsync: None, 'file' to fsync every file before its rename, or
+    'batch' to fsync the files of each batch before renaming them. Job
+    directories are then fsynced, such that the renames are durable.
+    :param batch_size: Number of jobs per batch.
+    :return: Throughput report, with 'jobs', 'files', 'bytes', 'seconds',
+    'jobs_per_second' and 'megabytes_per_second'.
+    """
+    if fsync not in fsync_modes:
+        raise ValueError(f"fsync must be one of {fsync_modes}: {fsync}")
+    jobs: List[OctopusJob] = list(jobs.values())
+    start = time.perf_counter()
+
+    # Directories first, such that file writes never wait on a mkdir
+    Path(root).mkdir(parents=True, exist_ok=True)
+    directories = [Path(root, job.directory) for job in jobs]
+
+    def make_directory(directory: Path):
+        directory.mkdir(parents=True, exist_ok=exist_ok)
+
+    n_files, n_bytes = 0, 0
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        with stage("mkdir", len(jobs)):
+            list(executor.map(make_directory, directories))
+
+        def write(job: OctopusJob):
+            renames, size = _stage_job(job, root, fsync == "file")
+            try:
+                _commit(renames)
+            except BaseException:
+                _discard(renames)
+                raise
+            if fsync == "file":
+                for directory in {path.parent for _, path in renames}:
+                    _fsync(directory)
+            return len(renames), size
+
+        def stage_job(job: OctopusJob):
+            return _stage_job(job, root, False)
+
+        for i in range(0, len(jobs), batch_size):
+            batch = jobs[i : i + batch_size]
+            with stage("write_jobs", len(batch)):
+                if fsync == "batch":
+                    results = _write_batch(executor, stage_job, batch)
+                else:
+                    results = list(executor.map(write, batch))
+            n_files += sum(n for n, _ in results)
+            n_bytes += sum(size for _, size in results)
+
+    seconds = time.perf_counter() - start
+    return {
+        "jobs": len(jobs),
+        "files": n_files,
+        "bytes": n_bytes,
+        "seconds": seconds,
+        "jobs_per_second": len(jobs) / seconds if seconds > 0 else None,
+        "megabytes_per_second": (
+            n_bytes / 1.0e6 / seconds if seconds > 0 else None
+        ),
+    }
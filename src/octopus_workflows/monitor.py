@@ -0,0 +1,334 @@
+""" Monitor running SCF calculations, and abort those that diverge or stall.
+
+Rules and actions are plain callables, in the same spirit as `file_rules`:
+
+* A rule takes the convergence data read so far, and returns a reason
+  string if the calculation should be aborted, else None.
+* An action takes the MonitoredJob to abort.
+"""
+from __future__ import annotations
+
+import os
+import re
+import signal
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+
+from octopus_workflows.oct_convergence import (
+    convergence_fields,
+    convergence_file,
+    parse_convergence_string,
+)
+from octopus_workflows.oct_static import info_file, parse_info_string
+
+
+class ConvergenceTail:
+    """Incrementally read a convergence file that is still being written.
+
+    Only bytes appended since the last read are read. Any partially-written
+    line is left in the file, and re-read once it is complete.
+    """
+
+    def __init__(self, file):
+        self.file = Path(file)
+        self.offset = 0
+        self.size = -1
+        self.data = np.empty(shape=(0, len(convergence_fields)))
+        # (mtime, number of iterations) when first and last read
+        self.first_seen = None
+        self.last_seen = None
+
+    def read(self) -> int:
+        """Read any newly-appended lines.
+
+        :return: Number of new SCF iterations read.
+        """
+        try:
+            stat = os.stat(self.file)
+        except FileNotFoundError:
+            return 0
+
+        if stat.st_size == self.size:
+            return 0
+
+        # File has been truncated or re-written, for example by a restart
+        if stat.st_size < self.offset:
+            self.offset = 0
+            self.data = np.empty(shape=(0, len(convergence_fields)))
+
+        with open(self.file, "rb") as fid:
+            fid.seek(self.offset)
+            new_bytes = fid.read(stat.st_size - self.offset)
+
+        end = new_bytes.rfind(b"\n") + 1
+        self.size = stat.st_size
+        self.offset += end
+
+        new_data = parse_convergence_string(new_bytes[:end])
+        if new_data.shape[0] == 0:
+            return 0
+        if self.data.shape[0] == 0:
+            self.data = new_data
+        else:
+            self.data = np.concatenate([self.data, new_data])
+
+        if self.first_seen is None:
+            self.first_seen = (stat.st_mtime, self.data.shape[0])
+        self.last_seen = (stat.st_mtime, self.data.shape[0])
+        return new_data.shape[0]
+
+    def seconds_per_iteration(self) -> float | None:
+        """Average wall time per SCF iteration, from the file mtimes.
+        None if too few iterations have been observed."""
+        if self.first_seen is None:
+            return None
+        (t0, n0), (t1, n1) = self.first_seen, self.last_seen
+        if n1 <= n0:
+            return None
+        return (t1 - t0) / (n1 - n0)
+
+
+def divergence_rule(
+    field: str = "rel_dens", factor: float = 1.0e3, min_iterations: int = 10
+) -> Callable:
+    """Abort if abs(field) grows by more than factor from its minimum.
+
+    :param field: Convergence field, see convergence_fields.
+    :param factor: Ratio of the latest value to the minimum value.
+    :param min_iterations: Never abort before this many iterations.
+    :return: Rule.
+    """
+    index = convergence_fields[field]
+
+    def rule(data: np.ndarray) -> str | None:
+        if data.shape[0] < min_iterations:
+            return None
+        values = np.abs(data[:, index])
+        if values[-1] > factor * np.min(values):
+            return (
+                f"{field} diverging: {values[-1]:.3e} > "
+                f"{factor:g} x minimum {np.min(values):.3e}"
+            )
+        return None
+
+    return rule
+
+
+def stagnation_rule(
+    field: str = "rel_dens", window: int = 30, min_reduction: float = 0.5
+) -> Callable:
+    """Abort if the minimum of abs(field) has not been reduced by
+    min_reduction over the last window iterations.
+
+    :param field: Convergence field, see convergence_fields.
+    :param window: Number of SCF iterations.
+    :param min_reduction: Required reduction factor over the window.
+    :return: Rule.
+    """
+    index = convergence_fields[field]
+
+    def rule(data: np.ndarray) -> str | None:
+        if data.shape[0] <= window:
+            return None
+        values = np.abs(data[:, index])
+        previous_min = np.min(values[:-window])
+        window_min = np.min(values[-window:])
+        if window_min > min_reduction * previous_min:
+            return (
+                f"{field} stagnated: minimum {window_min:.3e} over the last "
+                f"{window} iterations, compared to {previous_min:.3e}"
+            )
+        return None
+
+    return rule
+
+
+# energy_diff is not a default: it falls by orders of magnitude, then
+# scatters near machine precision once converged, far above its minimum
+default_rules = [
+    divergence_rule("rel_dens"),
+    stagnation_rule("rel_dens"),
+]
+
+
+class MonitoredJob:
+    """A running calculation.
+
+    :param directory: Calculation directory.
+    :param job_id: Slurm job id. If None, inferred from slurm-<id>.out.
+    :param pid: Process id, for calculations run locally.
+    :param n_gpus: Number of GPUs allocated, used to report GPU-hours.
+    :param max_iterations: MaximumIter of the calculation.
+    """
+
+    def __init__(
+        self,
+        directory,
+        job_id: str | None = None,
+        pid: int | None = None,
+        n_gpus: int = 1,
+        max_iterations: int = 200,
+    ):
+        self.directory = Path(directory)
+        self.job_id = job_id
+        self.pid = pid
+        self.n_gpus = n_gpus
+        self.max_iterations = max_iterations
+        self.tail = ConvergenceTail(Path(directory, convergence_file))
+        self.aborted: str | None = None
+        # Why the run ended, if it ended without being aborted
+        self.finished: str | None = None
+        # Consecutive polls in which the convergence file did not grow,
+        # counted from its first output
+        self.idle_polls = 0
+
+    def slurm_job_id(self) -> str | None:
+        """Slurm job id, given explicitly or from a slurm-<id>.out file."""
+        if self.job_id is not None:
+            return self.job_id
+        for file in self.directory.glob("slurm-*.out"):
+            match = re.fullmatch(r"slurm-(\d+)\.out", file.name)
+            if match:
+                return match.group(1)
+        return None
+
+    def end_of_run(self) -> str | None:
+        """Reason the run has ended, from its output, else None.
+
+        Only output of the current run is considered: a static/info older
+        than the latest convergence data read, such as one left from before
+        a restart, is ignored.
+        """
+        if self.tail.last_seen is None:
+            return None
+        if self.tail.data.shape[0] >= self.max_iterations:
+            return "reached max_iterations"
+        file = Path(self.directory, info_file)
+        try:
+            if file.stat().st_mtime < self.tail.last_seen[0]:
+                return None
+            raw = file.read_text()
+        except FileNotFoundError:
+            return None
+        if parse_info_string(raw)["converged"]:
+            return "converged"
+        return "finished without converging"
+
+    def saved_gpu_hours(self) -> float:
+        """Estimated GPU-hours saved by stopping at the current iteration,
+        rather than running to max_iterations."""
+        seconds = self.tail.seconds_per_iteration()
+        if seconds is None:
+            return 0.0
+        remaining = max(self.max_iterations - self.tail.data.shape[0], 0)
+        return remaining * seconds * self.n_gpus / 3600.0
+
+
+def scancel_action(job: MonitoredJob):
+    """Cancel a Slurm job."""
+    job_id = job.slurm_job_id()
+    if job_id is None:
+        raise ValueError(
+            f"Cannot determine the Slurm job id of {job.directory}"
+        )
+    subprocess.run(["scancel", job_id], check=True)
+
+
+def kill_action(job: MonitoredJob):
+    """Terminate a locally-run calculation."""
+    if job.pid is None:
+        raise ValueError(f"No process id for {job.directory}")
+    os.kill(job.pid, signal.SIGTERM)
+
+
+class ScfMonitor:
+    """Poll the convergence files of many running calculations.
+
+    Each poll costs one stat per job, and only files that have grown are
+    read.
+
+    :param jobs: Jobs to monitor.
+    :param rules: Abort rules. Defaults to `default_rules`.
+    :param action: Called once for each job that breaks a rule.
+    :param max_idle_polls: Consider a job finished once its convergence
+    file has not grown for this many polls, for example if it crashed or
+    was cancelled. Polls before its first output, such as while the job is
+    queued, are not counted. None to wait indefinitely.
+    """
+
+    def __init__(
+        self,
+        jobs: List[MonitoredJob],
+        rules: List[Callable] = None,
+        action: Callable = scancel_action,
+        max_idle_polls: int | None = 30,
+    ):
+        self.jobs = jobs
+        self.rules = default_rules if rules is None else rules
+        self.action = action
+        self.max_idle_polls = max_idle_polls
+
+    def running(self) -> List[MonitoredJob]:
+        """Jobs that have neither been aborted, nor finished."""
+        return [
+            job
+            for job in self.jobs
+            if job.aborted is None and job.finished is None
+        ]
+
+    def poll(self) -> List[MonitoredJob]:
+        """Read new convergence data and apply the rules.
+
+        :return: Jobs aborted in this poll.
+        """
+        aborted = []
+        for job in self.running():
+            if job.tail.read() == 0:
+                if job.tail.last_seen is not None:
+                    job.idle_polls += 1
+            else:
+                job.idle_polls = 0
+                for rule in self.rules:
+                    reason = rule(job.tail.data)
+                    if reason is not None:
+                        job.aborted = reason
+                        self.action(job)
+                        aborted.append(job)
+                        break
+                if job.aborted is not None:
+                    continue
+
+            job.finished = job.end_of_run()
+            if (
+                job.finished is None
+                and self.max_idle_polls is not None
+                and job.idle_polls >= self.max_idle_polls
+            ):
+                job.finished = f"no output for {job.idle_polls} polls"
+        return aborted
+
+    def run(self, interval: float = 60.0, max_polls: int | None = None):
+        """Poll until no jobs are left running, or max_polls is reached.
+
+        :param interval: Seconds between polls.
+        :param max_polls: Maximum number of polls.
+        """
+        n_polls = 0
+        while self.running():
+            self.poll()
+            n_polls += 1
+            if not self.running() or n_polls == max_polls:
+                break
+            time.sleep(interval)
+
+    def report(self) -> dict:
+        """Summary of aborted jobs, and the estimated GPU-hours saved."""
+        aborted = [job for job in self.jobs if job.aborted is not None]
+        return {
+            "aborted": {str(job.directory): job.aborted for job in aborted},
+            "saved_gpu_hours": sum(job.saved_gpu_hours() for job in aborted),
+        }
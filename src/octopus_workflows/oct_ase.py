@@ -1,14 +1,19 @@
 """ Convert Octopus-formatted structure input to ASE Atoms, and vice versa.
 """
-import ase
-import numpy as np
-import scipy.linalg
+from __future__ import annotations
+
+from octopus_workflows.utils import lazy_import
+
+ase = lazy_import("ase")
+np = lazy_import("numpy")
 
 bohr_to_ang = 0.52917721092
 ang_to_bohr = 1.0 / bohr_to_ang
 
 
 def unit_vector(a):
+    import scipy.linalg
+
     return np.asarray(a) / scipy.linalg.norm(a)
 
 
@@ -20,6 +25,7 @@ def parse_oct_structure_to_atoms(options: dict) -> ase.atoms.Atoms:
     :param options:
     :return:
     """
+    import scipy.linalg
 
     # Get cell angles from the lattice vectors
     lattice_vectors = options["LatticeVectors"]
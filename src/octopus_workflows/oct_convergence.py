@@ -0,0 +1,372 @@
+""" Read Octopus SCF convergence files, static/convergence.
+"""
+from __future__ import annotations
+
+import struct
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from octopus_workflows import cache
+
+# Map column names to column indices
+convergence_fields = {
+    "iter": 0,
+    "energy": 1,
+    "energy_diff": 2,
+    "abs_dens": 3,
+    "rel_dens": 4,
+    "abs_ev": 5,
+    "rel_ev": 6,
+}
+
+convergence_file = "static/convergence"
+
+_cache_tag = "conv"
+
+
+def parse_convergence_string(raw: bytes | str) -> np.ndarray:
+    """Parse the contents of a convergence file in one pass.
+
+    Header lines (starting with #) are skipped. Any trailing line that has
+    not been terminated, or is missing columns, is assumed to still be in
+    the process of being written, and is dropped.
+
+    :param raw: Contents of a convergence file.
+    :return: data: Array of shape (n_iterations, n_columns).
+    """
+    if isinstance(raw, bytes):
+        raw = raw.decode("ascii", errors="replace")
+
+    # Drop header lines
+    start = 0
+    while raw.startswith("#", start):
+        start = raw.find("\n", start) + 1
+        if start == 0:
+            return np.empty(shape=(0, len(convergence_fields)))
+
+    # Drop any partially-written line
+    end = raw.rfind("\n") + 1
+    body = raw[start:end]
+
+    first_line_end = body.find("\n")
+    if first_line_end <= 0:
+        return np.empty(shape=(0, len(convergence_fields)))
+    n_cols = len(body[:first_line_end].split())
+
+    # Raises on any token that is not a number
+    values = np.array(body.split(), dtype=float)
+    n_rows = values.size // n_cols
+    return values[: n_rows * n_cols].reshape(n_rows, n_cols)
+
+
+def read_convergence(file, use_cache=True, mmap_mode="r") -> np.ndarray:
+    """Read a convergence file, using a cached .npy sidecar where possible.
+
+    The sidecar is keyed by the size and mtime of the convergence file, so
+    it is re-generated whenever the file changes. Sidecars are not written
+    for files that end in a partial line, as the job is still running.
+
+    :param file: Convergence file.
+    :param use_cache: Read and write the .npy sidecar.
+    :param mmap_mode: Memory-map mode used when loading the sidecar.
+    :return: data: Array of shape (n_iterations, n_columns).
+    """
+    if use_cache:
+        signature = cache.file_signature(file)
+        data = cache.load_array(file, _cache_tag, signature, mmap_mode)
+        if data is not None:
+            return data
+
+    with open(file, "rb") as fid:
+        raw = fid.read()
+    data = parse_convergence_string(raw)
+
+    if use_cache and raw.endswith(b"\n"):
+        cache.save_array(file, _cache_tag, signature, data)
+
+    return data
+
+
+def load_convergence(root, use_cache=True, mmap_mode="r") -> np.ndarray:
+    """Read static/convergence from a calculation directory.
+
+    :param root: Calculation directory.
+    :return: data: Array of shape (n_iterations, n_columns).
+    """
+    return read_convergence(
+        Path(root, convergence_file), use_cache=use_cache, mmap_mode=mmap_mode
+    )
+
+
+def load_convergence_files(
+    roots: List[str], max_workers: int | None = None, use_cache=True
+) -> List[np.ndarray]:
+    """Read static/convergence from many calculation directories.
+
+    Files are read concurrently, as reading is dominated by file system
+    latency rather than parsing.
+
+    :param roots: Calculation directories.
+    :param max_workers: Maximum number of threads. Defaults to the
+    ThreadPoolExecutor default.
+    :return: List of convergence data, in the same order as roots.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(
+            executor.map(
+                lambda root: load_convergence(root, use_cache=use_cache),
+                roots,
+            )
+        )
+
+
+def _memmap_npz_member(file, name: str) -> np.ndarray:
+    """Memory-map an array stored (uncompressed) in an .npz archive.
+
+    np.load does not support memory-mapping .npz members, however
+    np.savez stores members uncompressed, so the array data is a contiguous
+    block of the archive, and can be mapped directly.
+
+    :param file: .npz file.
+    :param name: Array name.
+    :return: Read-only memory-mapped array.
+    """
+    with zipfile.ZipFile(file) as archive:
+        info = archive.getinfo(f"{name}.npy")
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise ValueError(f"Cannot memory-map compressed member {name}")
+
+    with open(file, "rb") as fid:
+        # Skip the zip local file header
+        fid.seek(info.header_offset)
+        local_header = fid.read(30)
+        n_name, n_extra = struct.unpack("<HH", local_header[26:30])
+        fid.seek(info.header_offset + 30 + n_name + n_extra)
+        # Skip the .npy header
+        version = np.lib.format.read_magic(fid)
+        if version == (1, 0):
+            shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(
+                fid
+            )
+        else:
+            shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(
+                fid
+            )
+        offset = fid.tell()
+
+    return np.memmap(
+        file,
+        dtype=dtype,
+        mode="r",
+        shape=shape,
+        order="F" if fortran_order else "C",
+        offset=offset,
+    )
+
+
+def _as_slice(columns: List[int]) -> slice | List[int]:
+    """Evenly-spaced, increasing columns as a slice, which indexes a view
+    rather than a copy."""
+    if len(columns) == 1 and columns[0] >= 0:
+        return slice(columns[0], columns[0] + 1)
+    steps = set(np.diff(columns).tolist())
+    if len(steps) == 1 and min(columns) >= 0 and min(steps) > 0:
+        return slice(columns[0], columns[-1] + 1, columns[1] - columns[0])
+    return list(columns)
+
+
+class ConvergenceStore:
+    """Convergence data for many calculations, packed into a single array.
+
+    Rows of all calculations are concatenated into `data`, of shape
+    (n_total_iterations, n_columns). Rows of calculation i are
+    data[offsets[i]:offsets[i + 1]]. Calculations with fewer columns than
+    the widest calculation are padded with NaN.
+    """
+
+    def __init__(self, names: List[str], offsets: np.ndarray, data):
+        assert (
+            len(offsets) == len(names) + 1
+        ), "Expect n_calculations + 1 offsets"
+        self.names = list(names)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.data = data
+        self._index = {name: i for i, name in enumerate(self.names)}
+
+    @classmethod
+    def from_arrays(cls, names: List[str], arrays: List[np.ndarray]):
+        """Pack a list of convergence arrays into a store.
+
+        :param names: Calculation names.
+        :param arrays: Convergence data per calculation.
+        :return: ConvergenceStore instance.
+        """
+        n_cols = max(
+            [a.shape[1] for a in arrays if a.ndim == 2]
+            + [len(convergence_fields)]
+        )
+        offsets = np.zeros(shape=len(arrays) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([a.shape[0] for a in arrays])
+
+        data = np.full(shape=(offsets[-1], n_cols), fill_value=np.nan)
+        for i, a in enumerate(arrays):
+            data[offsets[i] : offsets[i + 1], : a.shape[1]] = a
+
+        return cls(names, offsets, data)
+
+    @classmethod
+    def from_directories(
+        cls, roots: List[str], names: List[str] = None, max_workers=None
+    ):
+        """Read static/convergence for all calculation directories.
+
+        :param roots: Calculation directories.
+        :param names: Calculation names. Defaults to the directory names.
+        :param max_workers: Maximum number of threads used for reading.
+        :return: ConvergenceStore instance.
+        """
+        if names is None:
+            names = [Path(root).name for root in roots]
+        arrays = load_convergence_files(roots, max_workers=max_workers)
+        return cls.from_arrays(names, arrays)
+
+    def save(self, file):
+        """Write the store to a single, uncompressed .npz file."""
+        np.savez(
+            file,
+            data=np.ascontiguousarray(self.data),
+            offsets=self.offsets,
+            names=np.array(self.names, dtype=str),
+        )
+
+    @classmethod
+    def load(cls, file, mmap=True):
+        """Load a store written by `save`.
+
+        :param file: .npz file.
+        :param mmap: Memory-map the data, rather than reading it into memory.
+        :return: ConvergenceStore instance.
+        """
+        with np.load(file, allow_pickle=False) as npz:
+            offsets = npz["offsets"]
+            names = npz["names"].tolist()
+            data = None if mmap else npz["data"]
+        if mmap:
+            data = _memmap_npz_member(file, "data")
+        return cls(names, offsets, data)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        i = self._index[name]
+        return self.data[self.offsets[i] : self.offsets[i + 1]]
+
+    def column(self, field: str) -> np.ndarray:
+        try:
+            return self.data[:, convergence_fields[field]]
+        except KeyError:
+            raise KeyError(f"Invalid data field key: {field}")
+
+    def n_scf_iterations(self) -> np.ndarray:
+        """Number of SCF iterations run per calculation."""
+        return np.diff(self.offsets)
+
+    def _non_empty(self) -> np.ndarray:
+        return np.flatnonzero(self.n_scf_iterations() > 0)
+
+    def initial(self, field: str) -> np.ndarray:
+        """Value of a field at the first SCF iteration, per calculation.
+        NaN for calculations with no iterations."""
+        values = np.full(shape=len(self), fill_value=np.nan)
+        i = self._non_empty()
+        values[i] = self.column(field)[self.offsets[i]]
+        return values
+
+    def final(self, field: str = "rel_dens") -> np.ndarray:
+        """Value of a field at the last SCF iteration, per calculation.
+        NaN for calculations with no iterations."""
+        values = np.full(shape=len(self), fill_value=np.nan)
+        i = self._non_empty()
+        values[i] = self.column(field)[self.offsets[i + 1] - 1]
+        return values
+
+    def iterations_to_tolerance(
+        self, tolerance: float, field: str = "rel_dens"
+    ) -> np.ndarray:
+        """Number of SCF iterations before abs(field) first drops below
+        tolerance, per calculation. -1 if the tolerance is never reached.
+        """
+        n_total = self.data.shape[0]
+        below = np.abs(self.column(field)) < tolerance
+        first_below = np.where(below, np.arange(n_total), n_total)
+
+        n_iter = np.full(shape=len(self), fill_value=-1, dtype=np.int64)
+        i = self._non_empty()
+        if i.size == 0:
+            return n_iter
+
+        first = np.minimum.reduceat(first_below, self.offsets[i])
+        converged = first < self.offsets[i + 1]
+        n_iter[i[converged]] = (
+            first[converged] - self.offsets[i][converged] + 1
+        )
+        return n_iter
+
+    def convergence_rate(self, field: str = "rel_dens") -> np.ndarray:
+        """Average change in log10(abs(field)) per SCF iteration.
+
+        Given by the gradient of a least-squares linear fit, per calculation,
+        over the iterations where log10(abs(field)) is finite. Zero and
+        missing values are excluded from the fit. Negative values imply
+        convergence. NaN for calculations with fewer than two such
+        iterations.
+        """
+        n_iter = self.n_scf_iterations()
+        rate = np.full(shape=len(self), fill_value=np.nan)
+        i = self._non_empty()
+        if i.size == 0:
+            return rate
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            y = np.log10(np.abs(self.column(field)))
+        # Points excluded from the fit have zero weight
+        w = np.isfinite(y).astype(float)
+        y = np.where(w > 0, y, 0.0)
+        # Iteration index, local to each calculation
+        x = np.arange(self.data.shape[0]) - np.repeat(
+            self.offsets[:-1], n_iter
+        )
+
+        x = x * w
+
+        starts = self.offsets[i]
+        n = np.add.reduceat(w, starts)
+        sx = np.add.reduceat(x, starts)
+        sy = np.add.reduceat(y, starts)
+        sxx = np.add.reduceat(x * x, starts)
+        sxy = np.add.reduceat(x * y, starts)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            gradient = (n * sxy - sx * sy) / (n * sxx - sx * sx)
+        rate[i] = np.where(n > 1, gradient, np.nan)
+        return rate
+
+    def to_system_calcs(self, columns=None) -> dict:
+        """Convert to the dict returned by parse_convergence_calculations.
+
+        Data are views into the store if columns are evenly spaced, as the
+        default columns are. Otherwise, they are copies.
+
+        :param columns: Optional list of columns. Defaults to iteration and
+        relative change in density.
+        :return: Dict with keys of calculation names, and values {'data'}.
+        """
+        if columns is None:
+            columns = [0, 4]
+        columns = _as_slice(columns)
+        return {name: {"data": self[name][:, columns]} for name in self.names}
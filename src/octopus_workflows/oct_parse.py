@@ -7,8 +7,6 @@ from __future__ import annotations
 import re
 from typing import List, Tuple
 
-from sympy.parsing.sympy_parser import parse_expr
-
 
 def parse_key_value_pairs(input: str) -> dict:
     """Parse key-value blocks from Octopus input files.
@@ -217,6 +215,8 @@ def evaluate_expressions(
     :param expressions:
     :return:
     """
+    # sympy takes longer to import than the rest of the package
+    from sympy.parsing.sympy_parser import parse_expr
 
     def recursive_eval(lst, local_dict):
         for i, item in enumerate(lst):
@@ -0,0 +1,457 @@
+""" Read Octopus profiling files, profiling/time.<rank>.
+"""
+from __future__ import annotations
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from octopus_workflows import cache
+
+# Columns of the cumulative and self tables, in file order
+cumulative_fields = [
+    "NUM_CALLS",
+    "TOTAL_TIME",
+    "TIME_PER_CALL",
+    "MIN_TIME",
+    "MFLOPS",
+    "MBYTES/S",
+    "%TIME",
+]
+self_fields = [
+    "NUM_CALLS",
+    "TOTAL_TIME",
+    "TIME_PER_CALL",
+    "MFLOPS",
+    "MBYTES/S",
+    "%TIME",
+]
+
+# Number of values per line: number of calls, then the two tables
+_n_values = 1 + (len(cumulative_fields) - 1) + (len(self_fields) - 1)
+
+_n_header = 4
+
+_cache_tag = "prof"
+
+
+def parse_profiling_string(raw: str) -> Tuple[List[str], np.ndarray]:
+    """Parse the contents of a single profiling file.
+
+    Region names are extracted with one regex, and all numerical values are
+    converted to an array in a single call.
+
+    :param raw: Contents of a profiling file.
+    :return: regions: Region names, and values: Array of shape
+    (n_regions, 12), containing the number of calls, followed by the
+    cumulative (6 columns) and self (5 columns) table values.
+    """
+    body = (
+        raw.split("\n", _n_header)[-1] if raw.count("\n") >= _n_header else ""
+    )
+
+    regions = re.findall(r"^[ \t]*(\S+)", body, flags=re.MULTILINE)
+    numbers = re.sub(r"^[ \t]*\S+|\|", " ", body, flags=re.MULTILINE)
+    # Raises on any token that is not a number
+    values = np.array(numbers.split(), dtype=float)
+
+    n_regions = min(len(regions), values.size // _n_values)
+    values = values[: n_regions * _n_values].reshape(n_regions, _n_values)
+    return regions[:n_regions], values
+
+
+def split_tables(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Split parsed profiling values into cumulative and self tables.
+
+    :param values: Array of shape (..., 12), from `parse_profiling_string`.
+    :return: cumulative, self: Arrays with final dimension given by
+    cumulative_fields and self_fields, respectively.
+    """
+    n_cumulative = len(cumulative_fields)
+    n_calls = values[..., :1]
+    cumulative = values[..., :n_cumulative]
+    self_table = np.concatenate([n_calls, values[..., n_cumulative:]], axis=-1)
+    return cumulative, self_table
+
+
+def profiling_to_timings(regions: List[str], values: np.ndarray) -> dict:
+    """Convert parsed values for one rank into nested dicts.
+
+    :return: timings: {'cumulative': {region: {field: value}}, 'self': ...}
+    """
+    cumulative, self_table = split_tables(values)
+    timings = {"cumulative": {}, "self": {}}
+    for table, fields, data in [
+        ("cumulative", cumulative_fields, cumulative),
+        ("self", self_fields, self_table),
+    ]:
+        for region, row in zip(regions, data.tolist()):
+            if np.isnan(row[0]):
+                continue
+            entry = dict(zip(fields, row))
+            entry["NUM_CALLS"] = int(entry["NUM_CALLS"])
+            timings[table][region] = entry
+    return timings
+
+
+def _read_file(file) -> Tuple[List[str], np.ndarray]:
+    with open(file, "r") as fid:
+        return parse_profiling_string(fid.read())
+
+
+class RankProfiling:
+    """Profiling data of all MPI ranks of one calculation.
+
+    values has shape (n_ranks, n_regions, 12). Regions that a rank never
+    entered are NaN.
+    """
+
+    def __init__(self, ranks: List[int], regions: List[str], values):
+        self.ranks = list(ranks)
+        self.regions = list(regions)
+        self.values = values
+
+    @classmethod
+    def from_files(cls, files: List[str], max_workers=None):
+        """Parse a set of profiling files, one per rank.
+
+        :param files: Profiling files, named time.<rank>.
+        :param max_workers: Maximum number of threads used for reading.
+        :return: RankProfiling instance.
+        """
+        files = sorted(files, key=lambda f: int(Path(f).suffix[1:]))
+        ranks = [int(Path(f).suffix[1:]) for f in files]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            parsed = list(executor.map(_read_file, files))
+
+        # Union of regions, in order of first appearance
+        regions = list(dict.fromkeys(r for names, _ in parsed for r in names))
+        index = {region: i for i, region in enumerate(regions)}
+
+        values = np.full(
+            shape=(len(files), len(regions), _n_values), fill_value=np.nan
+        )
+        for i, (names, rank_values) in enumerate(parsed):
+            values[i, [index[r] for r in names], :] = rank_values
+
+        return cls(ranks, regions, values)
+
+    def table(self, table: str = "cumulative") -> np.ndarray:
+        """Cumulative or self table for all ranks.
+
+        :return: Array of shape (n_ranks, n_regions, n_fields).
+        """
+        cumulative, self_table = split_tables(self.values)
+        if table == "cumulative":
+            return cumulative
+        elif table == "self":
+            return self_table
+        raise ValueError(f"Invalid table: {table}")
+
+    def metric(
+        self, metric: str = "TOTAL_TIME", table: str = "cumulative"
+    ) -> np.ndarray:
+        """A single metric for all ranks and regions.
+
+        :return: Array of shape (n_ranks, n_regions).
+        """
+        fields = cumulative_fields if table == "cumulative" else self_fields
+        try:
+            index = fields.index(metric)
+        except ValueError:
+            raise KeyError(f"Invalid {table} metric: {metric}")
+        return self.table(table)[..., index]
+
+    def timings(self, rank: int = 0) -> dict:
+        """Timings of a single rank, in the format of `parse_profiling`."""
+        return profiling_to_timings(
+            self.regions, self.values[self.ranks.index(rank)]
+        )
+
+    def statistics(
+        self, metric: str = "TOTAL_TIME", table: str = "cumulative"
+    ) -> dict:
+        """Per-region statistics over ranks.
+
+        The imbalance ratio is max / mean, such that 1 is perfectly balanced.
+        Efficiency is the inverse: the fraction of the slowest rank's time
+        that the average rank spends doing useful work in the region.
+
+        :return: Dict of arrays, each of length n_regions:
+        min, mean, max, imbalance, efficiency and argmax (slowest rank).
+        """
+        data = self.metric(metric, table)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            minimum = np.nanmin(data, axis=0)
+            mean = np.nanmean(data, axis=0)
+            maximum = np.nanmax(data, axis=0)
+            imbalance = np.where(mean > 0, maximum / mean, 1.0)
+        slowest = np.argmax(np.nan_to_num(data, nan=-np.inf), axis=0)
+        return {
+            "min": minimum,
+            "mean": mean,
+            "max": maximum,
+            "imbalance": imbalance,
+            "efficiency": 1.0 / imbalance,
+            "argmax": np.asarray(self.ranks)[slowest],
+        }
+
+    def critical_path(self, n_regions: int = 10) -> List[dict]:
+        """Regions that dominate the wall time.
+
+        Wall time is set by the slowest rank, so regions are ranked by their
+        maximum self time over ranks. The time lost to load imbalance,
+        max - mean, is the time that would be saved by perfect balancing.
+
+        :param n_regions: Number of regions to return.
+        :return: List of dicts, sorted by descending max self time.
+        """
+        stats = self.statistics("TOTAL_TIME", "self")
+        order = np.argsort(-np.nan_to_num(stats["max"], nan=-np.inf))
+        path = []
+        for i in order[:n_regions]:
+            path.append(
+                {
+                    "region": self.regions[i],
+                    "max_time": float(stats["max"][i]),
+                    "mean_time": float(stats["mean"][i]),
+                    "imbalance": float(stats["imbalance"][i]),
+                    "lost_time": float(stats["max"][i] - stats["mean"][i]),
+                    "slowest_rank": int(stats["argmax"][i]),
+                }
+            )
+        return path
+
+
+def profiling_files(root) -> List[Path]:
+    """Find all per-rank profiling files in a calculation directory."""
+    return [
+        f
+        for f in Path(root, "profiling").glob("time.*")
+        if f.suffix[1:].isdigit()
+    ]
+
+
+def load_profiling(root, use_cache=True, max_workers=None) -> RankProfiling:
+    """Parse profiling/time.* for all ranks of a calculation.
+
+    The parsed array is cached in .npy sidecars next to the profiling
+    directory, keyed by the sizes and mtimes of all rank files.
+
+    :param root: Calculation directory.
+    :param use_cache: Read and write the sidecars.
+    :param max_workers: Maximum number of threads used for reading.
+    :return: RankProfiling instance.
+    """
+    files = profiling_files(root)
+    if not files:
+        raise FileNotFoundError(f"No profiling files in {root}/profiling")
+
+    directory = Path(root, "profiling")
+    if use_cache:
+        signature = cache.file_signature(files)
+        values = cache.load_array(directory, _cache_tag, signature)
+        index = cache.load_json(directory, _cache_tag, signature)
+        if values is not None and index is not None:
+            return RankProfiling(index["ranks"], index["regions"], values)
+
+    profiling = RankProfiling.from_files(files, max_workers=max_workers)
+
+    if use_cache:
+        cache.save_array(directory, _cache_tag, signature, profiling.values)
+        cache.save_json(
+            directory,
+            _cache_tag,
+            signature,
+            {"ranks": profiling.ranks, "regions": profiling.regions},
+        )
+    return profiling
+
+
+def region_metric(
+    profiling: RankProfiling | dict,
+    metric: str = "TOTAL_TIME",
+    table: str = "cumulative",
+) -> dict:
+    """Reduce profiling data to {region: value} for one metric.
+
+    For multi-rank data, the maximum over ranks is taken, as the slowest
+    rank determines the wall time.
+
+    :param profiling: RankProfiling instance, or the dict returned by
+    `parse_profiling`.
+    :return: Dict of region: value.
+    """
+    if isinstance(profiling, RankProfiling):
+        data = np.nan_to_num(profiling.metric(metric, table), nan=-np.inf)
+        values = np.max(data, axis=0)
+        return {
+            r: float(v)
+            for r, v in zip(profiling.regions, values)
+            if np.isfinite(v)
+        }
+    return {
+        region: entry[metric] for region, entry in profiling[table].items()
+    }
+
+
+class ProfilingComparison:
+    """Per-region comparison of a reference and a new set of calculations.
+
+    time_a and time_b have shape (n_systems, n_regions), and are NaN where
+    a region is absent from a calculation. A difference is only classed as
+    significant if it exceeds both the absolute and relative thresholds,
+    such that timer noise in short regions is not reported.
+    """
+
+    def __init__(
+        self,
+        systems: List[str],
+        regions: List[str],
+        time_a: np.ndarray,
+        time_b: np.ndarray,
+        abs_threshold: float = 0.1,
+        rel_threshold: float = 0.05,
+    ):
+        self.systems = systems
+        self.regions = regions
+        self.time_a = time_a
+        self.time_b = time_b
+        self.delta = time_b - time_a
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.speedup = time_a / time_b
+            relative = np.abs(self.delta) / time_a
+        significant = (np.abs(self.delta) > abs_threshold) & (
+            relative > rel_threshold
+        )
+        self.regression = significant & (self.delta > 0)
+        self.improvement = significant & (self.delta < 0)
+
+    def _ranked(self, mask: np.ndarray, n: int | None, descending: bool):
+        i_sys, i_reg = np.nonzero(mask)
+        order = np.argsort(self.delta[i_sys, i_reg])
+        if descending:
+            order = order[::-1]
+        return [self._record(i_sys[k], i_reg[k]) for k in order[slice(n)]]
+
+    def _record(self, i: int, j: int) -> dict:
+        return {
+            "system": self.systems[i],
+            "region": self.regions[j],
+            "time_a": float(self.time_a[i, j]),
+            "time_b": float(self.time_b[i, j]),
+            "delta": float(self.delta[i, j]),
+            "speedup": float(self.speedup[i, j]),
+        }
+
+    def regressions(self, n: int | None = None) -> List[dict]:
+        """Significant slow-downs, largest absolute increase first."""
+        return self._ranked(self.regression, n, descending=True)
+
+    def improvements(self, n: int | None = None) -> List[dict]:
+        """Significant speed-ups, largest absolute reduction first."""
+        return self._ranked(self.improvement, n, descending=False)
+
+    def missing(self) -> dict:
+        """Regions present in only one of the two calculations.
+
+        :return: {'removed': [(system, region)], 'added': [(system, region)]}
+        """
+        a, b = np.isfinite(self.time_a), np.isfinite(self.time_b)
+        return {
+            key: [
+                (self.systems[i], self.regions[j])
+                for i, j in zip(*np.nonzero(mask))
+            ]
+            for key, mask in [("removed", a & ~b), ("added", ~a & b)]
+        }
+
+    def to_records(self) -> List[dict]:
+        """All regions present in both calculations, for example for
+        constructing a pandas DataFrame."""
+        mask = np.isfinite(self.time_a) & np.isfinite(self.time_b)
+        records = []
+        for i, j in zip(*np.nonzero(mask)):
+            record = self._record(i, j)
+            record["regression"] = bool(self.regression[i, j])
+            record["improvement"] = bool(self.improvement[i, j])
+            records.append(record)
+        return records
+
+
+def compare_sweeps(
+    sweep_a: Dict[str, RankProfiling | dict],
+    sweep_b: Dict[str, RankProfiling | dict],
+    metric: str = "TOTAL_TIME",
+    table: str = "cumulative",
+    abs_threshold: float = 0.1,
+    rel_threshold: float = 0.05,
+) -> ProfilingComparison:
+    """Compare the profiling of two sweeps, matched by system name.
+
+    Only systems present in both sweeps are compared.
+
+    :param sweep_a: Reference profiling data, keyed by system.
+    :param sweep_b: New profiling data, keyed by system.
+    :param metric: Metric to compare.
+    :param table: 'cumulative' or 'self'.
+    :param abs_threshold: Minimum absolute difference to be significant.
+    :param rel_threshold: Minimum difference, relative to the reference,
+    to be significant.
+    :return: ProfilingComparison instance.
+    """
+    systems = [s for s in sweep_a if s in sweep_b]
+    metrics_a = [region_metric(sweep_a[s], metric, table) for s in systems]
+    metrics_b = [region_metric(sweep_b[s], metric, table) for s in systems]
+
+    regions = list(dict.fromkeys(r for m in metrics_a + metrics_b for r in m))
+    index = {region: j for j, region in enumerate(regions)}
+
+    def to_array(all_metrics: List[dict]) -> np.ndarray:
+        array = np.full(shape=(len(systems), len(regions)), fill_value=np.nan)
+        for i, m in enumerate(all_metrics):
+            array[i, [index[r] for r in m]] = list(m.values())
+        return array
+
+    return ProfilingComparison(
+        systems,
+        regions,
+        to_array(metrics_a),
+        to_array(metrics_b),
+        abs_threshold=abs_threshold,
+        rel_threshold=rel_threshold,
+    )
+
+
+def compare_profiling(
+    a: RankProfiling | dict, b: RankProfiling | dict, **kwargs
+) -> ProfilingComparison:
+    """Compare the profiling of two calculations.
+
+    See `compare_sweeps` for keyword arguments.
+    """
+    return compare_sweeps({"": a}, {"": b}, **kwargs)
+
+
+def load_sweep_profiling(
+    roots: List[str], get_system_name=lambda d: d.name, max_workers=None
+) -> Dict[str, RankProfiling]:
+    """Load the profiling of all calculations of a sweep.
+
+    :param roots: Calculation directories.
+    :param get_system_name: Callable that gets the system name from the
+    calculation directory. Default assumes the directory name.
+    :param max_workers: Maximum number of threads.
+    :return: Dict of system name: RankProfiling.
+    """
+    roots = [Path(root) for root in roots]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        all_profiling = list(
+            executor.map(
+                lambda root: load_profiling(root, max_workers=1), roots
+            )
+        )
+    return {get_system_name(r): p for r, p in zip(roots, all_profiling)}
@@ -0,0 +1,259 @@
+""" Read Octopus ground-state results, static/info and static/eigenvalues.
+"""
+from __future__ import annotations
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from octopus_workflows import cache
+
+info_file = "static/info"
+eigenvalues_file = "static/eigenvalues"
+
+_number = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[EeDd][-+]?\d+)?"
+# Eigenvalue tables are converted in bulk by numpy, which only accepts E
+_eigen_number = r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[Ee][-+]?\d+)?"
+
+_energy_block = re.compile(
+    r"^Energy \[(\w+)\]:\s*\n((?:.*=.*\n|\s*-+\s*\n)+)", re.M
+)
+_energy_line = re.compile(rf"^\s*(\S.*?)\s*=\s*({_number})\s*$", re.M)
+_fermi = re.compile(rf"Fermi energy\s*=\s*({_number})")
+_converged = re.compile(r"SCF converged in\s+(\d+) iterations")
+
+_kpoint = re.compile(
+    rf"^#k\s*=\s*(\d+),\s*k\s*=\s*\(\s*({_number}),\s*({_number}),\s*({_number})\)",
+    re.M,
+)
+_state = re.compile(
+    rf"^\s*(\d+)\s+(--|up|dn)\s+({_eigen_number})\s+({_eigen_number})", re.M
+)
+_units = re.compile(r"^Eigenvalues \[(\w+)\]", re.M)
+
+_info_tag = "info"
+_eigenvalues_tag = "eigen"
+
+
+def _to_float(value: str) -> float:
+    """Convert to float, allowing Fortran double-precision exponents."""
+    return float(value.replace("D", "E").replace("d", "e"))
+
+
+def parse_info_string(raw: str) -> dict:
+    """Parse energies and SCF status from the contents of static/info.
+
+    :param raw: Contents of static/info.
+    :return: Dict with keys: 'energies' {component: value}, 'units',
+    'fermi_energy' (None if absent), 'converged' and 'n_iterations'
+    (None if not converged).
+    """
+    energies, units = {}, None
+    match = _energy_block.search(raw)
+    if match:
+        units = match.group(1)
+        energies = {
+            key: _to_float(value)
+            for key, value in _energy_line.findall(match.group(2))
+        }
+
+    fermi = _fermi.search(raw)
+    converged = _converged.search(raw)
+    return {
+        "energies": energies,
+        "units": units,
+        "fermi_energy": _to_float(fermi.group(1)) if fermi else None,
+        "converged": converged is not None,
+        "n_iterations": int(converged.group(1)) if converged else None,
+    }
+
+
+def parse_eigenvalues_string(raw: str) -> dict:
+    """Parse eigenvalues and occupations from static/eigenvalues.
+
+    Calculations without k-points are treated as a single k-point at Gamma.
+
+    :param raw: Contents of static/eigenvalues.
+    :return: Dict with keys 'kpoints' (n_k, 3), and 'eigenvalues' and
+    'occupations', of shape (n_k, n_spin, n_states), and 'units'.
+    """
+    units = _units.search(raw)
+    kpoints = np.array(
+        [[_to_float(x) for x in k[1:]] for k in _kpoint.findall(raw)]
+    ).reshape(-1, 3)
+    n_k = max(len(kpoints), 1)
+    if len(kpoints) == 0:
+        kpoints = np.zeros(shape=(1, 3))
+
+    states = _state.findall(raw)
+    if not states:
+        empty = np.empty(shape=(n_k, 1, 0))
+        return {
+            "kpoints": kpoints,
+            "eigenvalues": empty,
+            "occupations": empty.copy(),
+            "units": units.group(1) if units else None,
+        }
+
+    _, spins, eigenvalues, occupations = zip(*states)
+    n_spin = 2 if "dn" in spins else 1
+    eigenvalues = np.array(eigenvalues, dtype=float)
+    occupations = np.array(occupations, dtype=float)
+
+    # States are listed per k-point, with spin interleaved per state
+    shape = (n_k, -1, n_spin)
+    return {
+        "kpoints": kpoints,
+        "eigenvalues": eigenvalues.reshape(shape).transpose(0, 2, 1),
+        "occupations": occupations.reshape(shape).transpose(0, 2, 1),
+        "units": units.group(1) if units else None,
+    }
+
+
+def load_info(root, use_cache=True) -> dict:
+    """Parse static/info of a calculation, with a JSON sidecar cache.
+
+    :param root: Calculation directory.
+    :return: See `parse_info_string`.
+    """
+    file = Path(root, info_file)
+    if use_cache:
+        signature = cache.file_signature(file)
+        info = cache.load_json(file, _info_tag, signature)
+        if info is not None:
+            return info
+
+    with open(file, "r") as fid:
+        info = parse_info_string(fid.read())
+
+    if use_cache:
+        cache.save_json(file, _info_tag, signature, info)
+    return info
+
+
+def load_eigenvalues(root, use_cache=True) -> dict:
+    """Parse static/eigenvalues of a calculation, with sidecar caches.
+
+    :param root: Calculation directory.
+    :return: See `parse_eigenvalues_string`.
+    """
+    file = Path(root, eigenvalues_file)
+    if use_cache:
+        signature = cache.file_signature(file)
+        values = cache.load_array(file, _eigenvalues_tag, signature)
+        meta = cache.load_json(file, _eigenvalues_tag, signature)
+        if values is not None and meta is not None:
+            return {
+                "kpoints": np.array(meta["kpoints"]).reshape(-1, 3),
+                "eigenvalues": values[0],
+                "occupations": values[1],
+                "units": meta["units"],
+            }
+
+    with open(file, "r") as fid:
+        eigen = parse_eigenvalues_string(fid.read())
+
+    if use_cache:
+        cache.save_array(
+            file,
+            _eigenvalues_tag,
+            signature,
+            np.stack([eigen["eigenvalues"], eigen["occupations"]]),
+        )
+        cache.save_json(
+            file,
+            _eigenvalues_tag,
+            signature,
+            {"kpoints": eigen["kpoints"].tolist(), "units": eigen["units"]},
+        )
+    return eigen
+
+
+def band_edges(eigen: dict, threshold: float = 1.0e-6) -> dict:
+    """Highest occupied and lowest unoccupied eigenvalues, over all
+    k-points and spins.
+
+    :param eigen: Output of `load_eigenvalues`.
+    :param threshold: Occupation below which a state is unoccupied.
+    :return: Dict with 'homo', 'lumo' and 'gap'. NaN where undefined.
+    """
+    eigenvalues = eigen["eigenvalues"]
+    occupied = eigen["occupations"] > threshold
+    homo = np.max(eigenvalues, where=occupied, initial=-np.inf)
+    lumo = np.min(eigenvalues, where=~occupied, initial=np.inf)
+    homo = homo if np.isfinite(homo) else np.nan
+    lumo = lumo if np.isfinite(lumo) else np.nan
+    return {"homo": homo, "lumo": lumo, "gap": lumo - homo}
+
+
+def static_table(
+    roots: List[str], names: List[str] = None, max_workers=None
+) -> dict:
+    """Consolidated table of ground-state results over a sweep.
+
+    Files are parsed in parallel over calculation directories. Missing files
+    give NaN entries, rather than an error, such that failed calculations
+    can be included in a sweep comparison.
+
+    :param roots: Calculation directories.
+    :param names: Calculation names. Defaults to the directory names.
+    :param max_workers: Maximum number of threads.
+    :return: Dict of columns, for example for pd.DataFrame: 'name',
+    'converged', 'n_iterations', 'fermi_energy', 'homo', 'lumo', 'gap', and
+    one column per energy component, prefixed with 'energy_'.
+    """
+    if names is None:
+        names = [Path(root).name for root in roots]
+
+    def parse(root):
+        try:
+            info = load_info(root)
+        except FileNotFoundError:
+            info = None
+        try:
+            edges = band_edges(load_eigenvalues(root))
+        except FileNotFoundError:
+            edges = None
+        return info, edges
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(parse, roots))
+
+    n = len(roots)
+    components = list(
+        dict.fromkeys(
+            key
+            for info, _ in results
+            if info is not None
+            for key in info["energies"]
+        )
+    )
+    table = {
+        "name": list(names),
+        "converged": np.zeros(shape=n, dtype=bool),
+        "n_iterations": np.full(shape=n, fill_value=-1, dtype=int),
+        "fermi_energy": np.full(shape=n, fill_value=np.nan),
+        "homo": np.full(shape=n, fill_value=np.nan),
+        "lumo": np.full(shape=n, fill_value=np.nan),
+        "gap": np.full(shape=n, fill_value=np.nan),
+    }
+    for key in components:
+        table[f"energy_{key}"] = np.full(shape=n, fill_value=np.nan)
+
+    for i, (info, edges) in enumerate(results):
+        if info is not None:
+            table["converged"][i] = info["converged"]
+            if info["n_iterations"] is not None:
+                table["n_iterations"][i] = info["n_iterations"]
+            if info["fermi_energy"] is not None:
+                table["fermi_energy"][i] = info["fermi_energy"]
+            for key, value in info["energies"].items():
+                table[f"energy_{key}"][i] = value
+        if edges is not None:
+            for key in ["homo", "lumo", "gap"]:
+                table[key][i] = edges[key]
+
+    return table
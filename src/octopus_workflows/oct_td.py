@@ -0,0 +1,234 @@
+""" Stream Octopus time-dependent outputs, such as td.general/multipoles.
+
+Time series can grow to millions of rows, so they are read in fixed-size
+chunks of rows, and reduced chunk by chunk. Reads resume from the offset
+of the last complete line, such that the series of a running job can be
+re-read incrementally.
+"""
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+# Bytes read per block
+_block_size = 1 << 22
+
+
+class TDSeries:
+    """Time series output, read in chunks.
+
+    Follows the field-mapping interface of ConvergenceData, where
+    `mapping` maps column names to column indices.
+
+    :param root: Calculation directory.
+    :param chunk_rows: Number of rows per chunk.
+    """
+
+    file = ""
+    mapping = {"iter": 0, "t": 1}
+
+    def __init__(self, root, chunk_rows: int = 65536):
+        self.root = root
+        self.chunk_rows = chunk_rows
+        # Byte offset of the first unread line
+        self.offset = 0
+        self.n_rows = 0
+        self.n_cols: int | None = None
+
+    @property
+    def path(self) -> Path:
+        return Path(self.root, self.file)
+
+    def list_fields(self) -> list:
+        return list(self.mapping)
+
+    def get(self, chunk: np.ndarray, key: str) -> np.ndarray:
+        """A single field from a chunk."""
+        try:
+            return chunk[:, self.mapping[key]]
+        except KeyError:
+            raise KeyError(f"Invalid data field key: {key}")
+
+    def _lines(self) -> Iterator[str]:
+        """Complete lines appended since the last read, in text blocks."""
+        with open(self.path, "rb") as fid:
+            fid.seek(self.offset)
+            while True:
+                block = fid.read(_block_size)
+                end = block.rfind(b"\n") + 1
+                if end == 0:
+                    return
+                # Leave any partial final line for the next read
+                fid.seek(self.offset + end)
+                self.offset += end
+                yield block[:end].decode("ascii", errors="replace")
+
+    def _parse(self, text: str) -> np.ndarray:
+        # Header lines only appear at the start of the file
+        if text.startswith("#"):
+            lines = text.split("\n")
+            n_header = next(
+                (
+                    i
+                    for i, line in enumerate(lines)
+                    if not line.startswith("#")
+                ),
+                len(lines),
+            )
+            text = "\n".join(lines[n_header:])
+        if self.n_cols is None:
+            first_line = text.split("\n", 1)[0].split()
+            if not first_line:
+                return np.empty(shape=(0, 0))
+            self.n_cols = len(first_line)
+        # Raises on any token that is not a number
+        values = np.array(text.split(), dtype=float)
+        n_rows = values.size // self.n_cols
+        return values[: n_rows * self.n_cols].reshape(n_rows, self.n_cols)
+
+    def chunks(self) -> Iterator[np.ndarray]:
+        """Rows appended since the last read, in chunks of chunk_rows.
+
+        The final chunk may be smaller. Calling again, after the file has
+        grown, continues from where the previous read stopped.
+
+        :return: Iterator of arrays, of shape (<= chunk_rows, n_columns).
+        """
+        buffer = []
+        n_buffered = 0
+        for text in self._lines():
+            rows = self._parse(text)
+            if rows.size == 0:
+                continue
+            buffer.append(rows)
+            n_buffered += rows.shape[0]
+            while n_buffered >= self.chunk_rows:
+                rows = np.concatenate(buffer) if len(buffer) > 1 else buffer[0]
+                chunk, rest = rows[: self.chunk_rows], rows[self.chunk_rows :]
+                buffer, n_buffered = [rest], rest.shape[0]
+                self.n_rows += chunk.shape[0]
+                yield chunk
+        if n_buffered > 0:
+            chunk = np.concatenate(buffer)
+            self.n_rows += chunk.shape[0]
+            yield chunk
+
+    def reset(self):
+        """Re-read from the start of the file."""
+        self.offset = 0
+        self.n_rows = 0
+        self.n_cols = None
+
+
+class MultipolesData(TDSeries):
+    """td.general/multipoles, for one spin channel and lmax = 1."""
+
+    file = "td.general/multipoles"
+    mapping = {"iter": 0, "t": 1, "charge": 2, "x": 3, "y": 4, "z": 5}
+
+
+class TDEnergyData(TDSeries):
+    """td.general/energy."""
+
+    file = "td.general/energy"
+    mapping = {
+        "iter": 0,
+        "t": 1,
+        "total": 2,
+        "kinetic_ions": 3,
+        "ion_ion": 4,
+        "electronic": 5,
+    }
+
+
+class RunningFourierTransform:
+    """Fourier transform of a time series, accumulated chunk by chunk.
+
+    F(w) = sum_t [f(t) - f(t0)] exp(i w t) exp(-t / tau) dt
+
+    which, for the dipole following a delta kick, gives the absorption
+    spectrum. Assumes a uniform time step.
+
+    :param frequencies: Frequencies at which to evaluate the transform.
+    :param damping_time: Exponential damping time, tau. No damping if None.
+    :param max_elements: Bound on the size of the (n_times, n_frequencies)
+    phase matrix evaluated at once.
+    """
+
+    def __init__(
+        self,
+        frequencies: np.ndarray,
+        damping_time: float | None = None,
+        max_elements: int = 1 << 22,
+    ):
+        self.frequencies = np.asarray(frequencies, dtype=float)
+        self.damping_time = damping_time
+        self.max_elements = max_elements
+        self.transform = None
+        self.f0 = None
+        self.t_last = None
+        self.dt = None
+
+    def update(self, t: np.ndarray, f: np.ndarray):
+        """Accumulate a chunk.
+
+        :param t: Times, of shape (n,).
+        :param f: Values, of shape (n,) or (n, n_components).
+        """
+        f = np.asarray(f, dtype=float)
+        if f.ndim == 1:
+            f = f[:, np.newaxis]
+        if t.size == 0:
+            return
+        if self.f0 is None:
+            self.f0 = f[0].copy()
+            self.transform = np.zeros(
+                shape=(self.frequencies.size, f.shape[1]), dtype=complex
+            )
+        if self.dt is None and t.size > 1:
+            self.dt = float(t[1] - t[0])
+        if self.dt is None and self.t_last is not None:
+            self.dt = float(t[0] - self.t_last)
+        self.t_last = float(t[-1])
+
+        n_sub = max(self.max_elements // max(self.frequencies.size, 1), 1)
+        for i in range(0, t.size, n_sub):
+            t_sub, f_sub = t[i : i + n_sub], f[i : i + n_sub] - self.f0
+            if self.damping_time is not None:
+                f_sub = f_sub * np.exp(-t_sub / self.damping_time)[:, None]
+            phase = np.exp(1j * np.outer(self.frequencies, t_sub))
+            self.transform += phase @ f_sub
+
+    def result(self) -> np.ndarray:
+        """Transform, of shape (n_frequencies, n_components)."""
+        if self.transform is None:
+            return np.zeros(shape=(self.frequencies.size, 0), dtype=complex)
+        return self.transform * (self.dt if self.dt is not None else 1.0)
+
+
+class RunningStatistics:
+    """Count, mean, min and max of each column, accumulated chunk by chunk."""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = None
+        self.min = None
+        self.max = None
+
+    def update(self, chunk: np.ndarray):
+        if chunk.shape[0] == 0:
+            return
+        if self.sum is None:
+            self.sum = np.zeros(shape=chunk.shape[1])
+            self.min = np.full(shape=chunk.shape[1], fill_value=np.inf)
+            self.max = np.full(shape=chunk.shape[1], fill_value=-np.inf)
+        self.count += chunk.shape[0]
+        self.sum += chunk.sum(axis=0)
+        self.min = np.minimum(self.min, chunk.min(axis=0))
+        self.max = np.maximum(self.max, chunk.max(axis=0))
+
+    @property
+    def mean(self) -> np.ndarray:
+        return self.sum / self.count
@@ -0,0 +1,306 @@
+""" Read Octopus volumetric outputs, such as densities, in cube or xsf format.
+
+Only the header is read on construction. Grid data are streamed in chunks
+of planes along the slowest-varying axis of the file, such that reductions
+never hold the whole grid in memory. Alternatively, the grid can be
+converted once to a memory-mapped .npy sidecar.
+"""
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Iterator, Tuple
+
+import numpy as np
+
+from octopus_workflows import cache
+
+_cache_tag = "grid"
+
+# Bytes read per block when streaming grid values
+_block_size = 1 << 22
+
+
+def _parse_cube_header(fid) -> dict:
+    """Parse a Gaussian cube header. Lengths are in Bohr."""
+    fid.readline()
+    fid.readline()
+    n_atoms, *origin = fid.readline().split()[:4]
+    n_atoms = int(n_atoms)
+    shape, voxel = [], []
+    for _ in range(3):
+        n, *vector = fid.readline().split()
+        shape.append(int(n))
+        voxel.append([float(x) for x in vector])
+    atoms = [fid.readline().split() for _ in range(abs(n_atoms))]
+    # Negative number of atoms implies a line of orbital indices follows
+    if n_atoms < 0:
+        fid.readline()
+    return {
+        "shape": tuple(shape),
+        "origin": np.array([float(x) for x in origin]),
+        "voxel": np.array(voxel),
+        "numbers": np.array([int(a[0]) for a in atoms], dtype=int),
+        "positions": np.array([[float(x) for x in a[2:5]] for a in atoms]),
+        # Final index varies fastest
+        "order": "C",
+        "periodic_endpoints": False,
+    }
+
+
+def _parse_xsf_header(fid) -> dict:
+    """Parse an XSF header, up to the start of the first 3D datagrid.
+
+    XSF general grids include the periodic images of the grid origin, so
+    the voxel is span / (n - 1).
+    """
+    numbers, positions = [], []
+    line = fid.readline()
+    while line:
+        key = line.strip().upper()
+        if key in (b"PRIMCOORD", b"ATOMS"):
+            if key == b"PRIMCOORD":
+                n_atoms = int(fid.readline().split()[0])
+                lines = [fid.readline().split() for _ in range(n_atoms)]
+            else:
+                lines = []
+                while True:
+                    position = fid.tell()
+                    split = fid.readline().split()
+                    try:
+                        [float(x) for x in split[1:4]]
+                    except ValueError:
+                        split = []
+                    if len(split) < 4:
+                        fid.seek(position)
+                        break
+                    lines.append(split)
+            numbers = [int(s[0]) if s[0].isdigit() else 0 for s in lines]
+            positions = [[float(x) for x in s[1:4]] for s in lines]
+        elif key.startswith(b"BEGIN_DATAGRID_3D"):
+            shape = tuple(int(x) for x in fid.readline().split()[:3])
+            origin = np.array([float(x) for x in fid.readline().split()])
+            span = np.array(
+                [[float(x) for x in fid.readline().split()] for _ in range(3)]
+            )
+            voxel = span / (np.array(shape)[:, np.newaxis] - 1)
+            return {
+                "shape": shape,
+                "origin": origin,
+                "voxel": voxel,
+                "numbers": np.array(numbers, dtype=int),
+                "positions": np.array(positions),
+                # First index varies fastest
+                "order": "F",
+                "periodic_endpoints": True,
+            }
+        line = fid.readline()
+    raise ValueError("No BEGIN_DATAGRID_3D block found")
+
+
+class VolumetricData:
+    """Lazily-read scalar field on a regular 3D grid.
+
+    :param file: .cube or .xsf file.
+    """
+
+    def __init__(self, file):
+        self.file = Path(file)
+        with open(self.file, "rb") as fid:
+            if self.file.suffix.lower() == ".xsf":
+                header = _parse_xsf_header(fid)
+            else:
+                header = _parse_cube_header(fid)
+            self._data_offset = fid.tell()
+
+        self.shape: Tuple[int, int, int] = header["shape"]
+        self.origin: np.ndarray = header["origin"]
+        self.voxel: np.ndarray = header["voxel"]
+        self.numbers: np.ndarray = header["numbers"]
+        self.positions: np.ndarray = header["positions"]
+        self.order: str = header["order"]
+        self.periodic_endpoints: bool = header["periodic_endpoints"]
+
+    @property
+    def stream_axis(self) -> int:
+        """Grid axis along which the file is chunked (slowest varying)."""
+        return 0 if self.order == "C" else 2
+
+    @property
+    def voxel_volume(self) -> float:
+        return abs(float(np.linalg.det(self.voxel)))
+
+    def _values(self) -> Iterator[np.ndarray]:
+        """Stream all grid values, in file order, as 1D arrays."""
+        n_remaining = int(np.prod(self.shape))
+        remainder = ""
+        with open(self.file, "rb") as fid:
+            fid.seek(self._data_offset)
+            while n_remaining > 0:
+                block = fid.read(_block_size)
+                text = remainder + block.decode("ascii")
+                # End of file, or trailing keywords such as END_DATAGRID_3D
+                end = text.find("END")
+                final = end >= 0 or not block
+                if final:
+                    text, remainder = text[: end if end >= 0 else None], ""
+                else:
+                    # Do not split a number across blocks
+                    split = max(text.rfind(" "), text.rfind("\n")) + 1
+                    text, remainder = text[:split], text[split:]
+                # Raises on any token that is not a number
+                values = np.array(text.split(), dtype=float)[:n_remaining]
+                n_remaining -= values.size
+                yield values
+                if final and n_remaining > 0:
+                    raise ValueError(
+                        f"{self.file} ends {n_remaining} values early"
+                    )
+
+    def chunks(self, n_planes: int = 16) -> Iterator[Tuple[int, np.ndarray]]:
+        """Stream the grid in chunks of planes along `stream_axis`.
+
+        :param n_planes: Number of planes per chunk.
+        :return: Iterator of (start index along stream_axis, chunk), where
+        chunk has the full grid extent in the other two axes.
+        """
+        axis = self.stream_axis
+        n_stream = self.shape[axis]
+        plane_shape = [n for i, n in enumerate(self.shape) if i != axis]
+        plane_size = int(np.prod(plane_shape))
+        chunk_size = plane_size * n_planes
+
+        buffer = np.empty(shape=0)
+        start = 0
+        for values in self._values():
+            buffer = (
+                np.concatenate([buffer, values]) if buffer.size else values
+            )
+            while buffer.size >= chunk_size or (
+                buffer.size and start + buffer.size // plane_size == n_stream
+            ):
+                n = min(n_planes, buffer.size // plane_size)
+                chunk, buffer = np.split(buffer, [n * plane_size])
+                yield start, self._reshape(chunk, n)
+                start += n
+
+    def _reshape(self, chunk: np.ndarray, n: int) -> np.ndarray:
+        if self.order == "C":
+            return chunk.reshape((n, self.shape[1], self.shape[2]))
+        return chunk.reshape((self.shape[0], self.shape[1], n), order="F")
+
+    def load(self) -> np.ndarray:
+        """Read the whole grid into memory."""
+        data = np.empty(shape=self.shape, order=self.order)
+        for start, chunk in self.chunks(n_planes=64):
+            self._slot(data, start, chunk)[...] = chunk
+        return data
+
+    def _slot(self, data: np.ndarray, start: int, chunk: np.ndarray):
+        n = chunk.shape[self.stream_axis]
+        if self.stream_axis == 0:
+            return data[start : start + n]
+        return data[:, :, start : start + n]
+
+    def memmap(self) -> np.ndarray:
+        """Memory-mapped grid, from a binary .npy sidecar.
+
+        The sidecar is written by streaming the file on first use, and is
+        keyed by the size and mtime of the file. If it cannot be written,
+        for example in a read-only or full directory, the grid is read into
+        memory instead.
+        """
+        signature = cache.file_signature(self.file)
+        data = cache.load_array(self.file, _cache_tag, signature)
+        if data is not None:
+            return data
+
+        sidecar = cache.signed_path(self.file, _cache_tag, signature, ".npy")
+        tmp = Path(sidecar.parent, f"{sidecar.name}.{os.getpid()}.tmp")
+        try:
+            data = np.lib.format.open_memmap(
+                tmp,
+                mode="w+",
+                dtype=np.float64,
+                shape=self.shape,
+                fortran_order=self.order == "F",
+            )
+            for start, chunk in self.chunks(n_planes=64):
+                self._slot(data, start, chunk)[...] = chunk
+            data.flush()
+            del data
+            os.replace(tmp, sidecar)
+        except OSError:
+            tmp.unlink(missing_ok=True)
+            return self.load()
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        cache.remove_stale(self.file, _cache_tag, signature, ".npy")
+        return np.load(sidecar, mmap_mode="r")
+
+    def _unique_chunks(self, n_planes: int):
+        """Chunks excluding the periodic endpoints of XSF grids."""
+        n_stream = self.shape[self.stream_axis]
+        for start, chunk in self.chunks(n_planes):
+            # XSF grids are streamed along the final axis
+            if self.periodic_endpoints:
+                n = min(chunk.shape[2], n_stream - 1 - start)
+                if n <= 0:
+                    continue
+                chunk = chunk[:-1, :-1, :n]
+            yield start, chunk
+
+    def integrate(self, n_planes: int = 16) -> float:
+        """Integral of the field over the cell, for example the number of
+        electrons of a density."""
+        total = 0.0
+        for _, chunk in self._unique_chunks(n_planes):
+            total += float(np.sum(chunk))
+        return total * self.voxel_volume
+
+    def planar_average(self, axis: int = 2, n_planes: int = 16) -> np.ndarray:
+        """Average of the field over planes perpendicular to an axis.
+
+        :param axis: Grid axis.
+        :return: Array of length shape[axis].
+        """
+        n_unique = [
+            n - 1 if self.periodic_endpoints else n for n in self.shape
+        ]
+        average = np.zeros(shape=n_unique[axis])
+        other_axes = tuple(i for i in range(3) if i != axis)
+        for start, chunk in self._unique_chunks(n_planes):
+            n = chunk.shape[self.stream_axis]
+            if axis == self.stream_axis:
+                average[start : start + n] = chunk.mean(axis=other_axes)
+            else:
+                average += chunk.sum(axis=other_axes)
+        if axis != self.stream_axis:
+            average /= np.prod([n_unique[i] for i in other_axes])
+        return average
+
+
+def density_difference(
+    a: VolumetricData, b: VolumetricData, n_planes: int = 16
+) -> dict:
+    """Compare two fields on the same grid, streaming both files together.
+
+    :return: Dict with the integrated absolute difference, the maximum
+    absolute difference, and the integrated difference.
+    """
+    if a.shape != b.shape or a.order != b.order:
+        raise ValueError(f"Grids are not compatible: {a.shape} and {b.shape}")
+    abs_integral, max_abs, integral = 0.0, 0.0, 0.0
+    for (_, chunk_a), (_, chunk_b) in zip(
+        a._unique_chunks(n_planes), b._unique_chunks(n_planes)
+    ):
+        diff = chunk_b - chunk_a
+        abs_integral += float(np.sum(np.abs(diff)))
+        integral += float(np.sum(diff))
+        max_abs = max(max_abs, float(np.max(np.abs(diff))))
+    return {
+        "integrated_abs_difference": abs_integral * a.voxel_volume,
+        "max_abs_difference": max_abs,
+        "integrated_difference": integral * a.voxel_volume,
+    }
@@ -1,7 +1,11 @@
 """ Convert dictionary to octopus input file string.
 """
-import ase
-import numpy as np
+from __future__ import annotations
+
+from octopus_workflows.utils import lazy_import
+
+ase = lazy_import("ase")
+np = lazy_import("numpy")
 
 
 def write_octopus_input(options: dict) -> str:
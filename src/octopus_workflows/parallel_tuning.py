@@ -0,0 +1,264 @@
+""" Tune the parallelization of Octopus runs with short benchmark runs.
+
+A layout is a flat dict of Slurm and Octopus settings:
+
+    {'ntasks_per_node': 4, 'cpus_per_task': 18,
+     'ParStates': 4, 'ParDomains': 1, 'ParKPoints': 1}
+
+For a representative job of each system size class, a short run (reduced
+MaximumIter) is generated per layout. The fastest layout per class, read
+from the profiling of the runs, is then applied to the production sweep.
+"""
+from __future__ import annotations
+
+import math
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from octopus_workflows.components import directory_names
+from octopus_workflows.oct_profiling import load_profiling, region_metric
+from octopus_workflows.simple_oct_workflow import (
+    OctopusJob,
+    ground_state_calculation,
+)
+from octopus_workflows.utils import expand_matrix
+
+# Layout keys that are Slurm settings. All other keys are Octopus inputs
+slurm_layout_keys = ("ntasks_per_node", "cpus_per_task")
+
+
+def _divisors(n: int) -> List[int]:
+    return [i for i in range(1, n + 1) if n % i == 0]
+
+
+def parallel_layouts(
+    cores_per_node: int,
+    nodes: int = 1,
+    n_ranks: List[int] = None,
+    n_kpoints: int = 1,
+    constraints: List[Callable] = None,
+) -> List[dict]:
+    """Enumerate MPI x OpenMP splits and ParStates x ParDomains x
+    ParKPoints distributions that use every core.
+
+    :param cores_per_node: Number of cores per node.
+    :param nodes: Number of nodes.
+    :param n_ranks: MPI ranks per node to consider. Defaults to every
+    divisor of cores_per_node.
+    :param n_kpoints: Number of k-points. ParKPoints must divide it.
+    :param constraints: Additional predicates, see `utils.expand_matrix`.
+    :return: Layouts.
+    """
+    if n_ranks is None:
+        n_ranks = _divisors(cores_per_node)
+    total_ranks = [n * nodes for n in n_ranks]
+    divisors = sorted({d for n in total_ranks for d in _divisors(n)})
+
+    matrix = {
+        "ntasks_per_node": n_ranks,
+        "ParKPoints": [d for d in divisors if n_kpoints % d == 0],
+        "ParDomains": divisors,
+        "ParStates": divisors,
+    }
+    rules = [
+        lambda opt: cores_per_node % opt["ntasks_per_node"] == 0,
+        lambda opt: (opt["ntasks_per_node"] * nodes) % opt["ParKPoints"] == 0,
+        lambda opt: opt["ParKPoints"] * opt["ParDomains"] * opt["ParStates"]
+        == opt["ntasks_per_node"] * nodes,
+    ]
+    layouts, _ = expand_matrix(matrix, rules + list(constraints or []))
+    for layout in layouts:
+        layout["cpus_per_task"] = cores_per_node // layout["ntasks_per_node"]
+    return layouts
+
+
+def layout_name(layout: dict) -> str:
+    """Short, unique name of a layout, used in job ids."""
+    return (
+        f"mpi{layout['ntasks_per_node']}_omp{layout['cpus_per_task']}"
+        f"_k{layout.get('ParKPoints', 1)}_d{layout.get('ParDomains', 1)}"
+        f"_s{layout.get('ParStates', 1)}"
+    )
+
+
+def split_layout(layout: dict) -> Tuple[dict, dict]:
+    """Split a layout into Slurm settings and Octopus inputs."""
+    slurm = {k: v for k, v in layout.items() if k in slurm_layout_keys}
+    inputs = {k: v for k, v in layout.items() if k not in slurm_layout_keys}
+    return slurm, inputs
+
+
+def layout_time(
+    root, region: str = "SCF_CYCLE", metric: str = "TIME_PER_CALL"
+) -> float:
+    """Time of a tuning run, from the profiling of its slowest rank.
+
+    The default, time per SCF cycle, excludes initialisation, which
+    dominates short runs but not production runs.
+
+    :return: Time in seconds, NaN if the run has no profiling or region.
+    """
+    try:
+        times = region_metric(load_profiling(root), metric)
+    except FileNotFoundError:
+        return math.nan
+    return times.get(region, math.nan)
+
+
+class ParallelTuner:
+    """Short runs of representative jobs over parallelization layouts.
+
+    :param representatives: Size class: matrix of a single representative
+    job, in the format of `ground_state_calculation`.
+    :param static_options: Options fixed for all calculations.
+    :param layouts: Layouts to benchmark, for example from
+    `parallel_layouts`.
+    :param max_iterations: MaximumIter of the tuning runs.
+    :param slurm_settings: Slurm settings, overridden by the layouts.
+    :param workflow_options: Passed to `ground_state_calculation`, for
+    example meta_value_ops, file_rules and binary_path.
+    """
+
+    def __init__(
+        self,
+        representatives: Dict[str, dict],
+        static_options: dict,
+        layouts: List[dict],
+        max_iterations: int = 5,
+        slurm_settings: dict = None,
+        **workflow_options,
+    ):
+        self.representatives = representatives
+        self.static_options = static_options
+        self.layouts = layouts
+        self.max_iterations = max_iterations
+        self.slurm_settings = {} if slurm_settings is None else slurm_settings
+        self.workflow_options = workflow_options
+
+    @staticmethod
+    def job_id(size_class: str, layout: dict) -> str:
+        return f"{size_class}_{layout_name(layout)}"
+
+    def jobs(self) -> Dict[str, OctopusJob]:
+        """Tuning jobs, with ids <size class>_<layout name>.
+
+        :return: Jobs, in the format of `ground_state_calculation`.
+        """
+        all_jobs = {}
+        for size_class, matrix in self.representatives.items():
+            for layout in self.layouts:
+                slurm, inputs = split_layout(layout)
+                jobs = ground_state_calculation(
+                    matrix,
+                    {
+                        **self.static_options,
+                        **inputs,
+                        "MaximumIter": self.max_iterations,
+                        "ProfilingMode": "prof_time",
+                    },
+                    slurm_settings={**self.slurm_settings, **slurm},
+                    **self.workflow_options,
+                )
+                if len(jobs) != 1:
+                    raise ValueError(
+                        f"Representative of {size_class} defines "
+                        f"{len(jobs)} jobs, rather than one"
+                    )
+                job = next(iter(jobs.values()))
+                job_id = self.job_id(size_class, layout)
+                job.rename(job_id)
+                all_jobs[job_id] = job
+        return all_jobs
+
+    def timings(self, root, **kwargs) -> Dict[str, List[float]]:
+        """Time of every layout, per size class.
+
+        :param root: Directory the jobs were written to.
+        :param kwargs: Passed to `layout_time`.
+        :return: Size class: times, in the order of layouts.
+        """
+        return {
+            size_class: [
+                layout_time(
+                    Path(root, self.job_id(size_class, layout)), **kwargs
+                )
+                for layout in self.layouts
+            ]
+            for size_class in self.representatives
+        }
+
+    def best_layouts(self, root, **kwargs) -> Dict[str, dict]:
+        """Fastest layout per size class. Classes without any successful
+        run are omitted.
+
+        :param root: Directory the jobs were written to.
+        :param kwargs: Passed to `layout_time`.
+        """
+        best = {}
+        for size_class, times in self.timings(root, **kwargs).items():
+            finished = [
+                (t, i) for i, t in enumerate(times) if not math.isnan(t)
+            ]
+            if finished:
+                best[size_class] = self.layouts[min(finished)[1]]
+        return best
+
+
+def apply_layouts(
+    matrix: dict,
+    static_options: dict,
+    system_key: str,
+    size_class: Callable,
+    layouts: Dict[str, dict],
+    slurm_settings: dict = None,
+    **workflow_options,
+) -> Dict[str, OctopusJob]:
+    """Production sweep, with the tuned layout of each system's size class
+    written into its inputs and Slurm settings.
+
+    Job ids, and their order, are identical to those of the untuned sweep.
+
+    :param matrix: Sweep matrix, in the format of `ground_state_calculation`.
+    :param static_options: Options fixed for all calculations.
+    :param system_key: Matrix key of the systems.
+    :param size_class: Callable taking a system (matrix value), returning
+    its size class.
+    :param layouts: Size class: layout, for example from
+    `ParallelTuner.best_layouts`. Systems of classes without a layout use
+    static_options and slurm_settings unchanged.
+    :param slurm_settings: Slurm settings, overridden by the layouts.
+    :param workflow_options: Passed to `ground_state_calculation`.
+    :return: Jobs, in the format of `ground_state_calculation`.
+    """
+    if slurm_settings is None:
+        slurm_settings = {}
+
+    # Group systems by layout, preserving their order
+    groups: Dict[str | None, list] = {}
+    for system in matrix[system_key]:
+        cls = size_class(system)
+        groups.setdefault(cls if cls in layouts else None, []).append(system)
+
+    jobs = {}
+    for cls, systems in groups.items():
+        slurm, inputs = (
+            split_layout(layouts[cls]) if cls is not None else ({}, {})
+        )
+        jobs.update(
+            ground_state_calculation(
+                {**matrix, system_key: systems},
+                {**static_options, **inputs},
+                slurm_settings={**slurm_settings, **slurm},
+                **workflow_options,
+            )
+        )
+
+    # Order of the untuned sweep, rather than grouped by layout
+    options, _ = expand_matrix(
+        matrix, workflow_options.get("constraints"), static_options
+    )
+    return {
+        job_id: jobs[job_id]
+        for job_id in directory_names(options)
+        if job_id in jobs
+    }
@@ -0,0 +1,266 @@
+""" Recover jobs killed by the Slurm time limit or a node failure.
+
+For each job directory, the tail of the latest Slurm output is checked for
+a recoverable termination. If ground-state restart data exist, the job's
+inp is rewritten to restart with the remaining SCF iterations, its time
+limit is re-estimated from the progress made, and it is resubmitted. The
+number of resubmissions per job is bounded by a retry budget, recorded in
+the job directory.
+"""
+from __future__ import annotations
+
+import datetime
+import json
+import re
+import subprocess
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from octopus_workflows.oct_convergence import (
+    convergence_file,
+    read_convergence,
+)
+from octopus_workflows.simple_oct_workflow import OctopusJob
+from octopus_workflows.triage import FailureMatcher, failure_rules
+
+# Categories of `triage.failure_rules` that a restart can recover from
+recoverable_categories = ["walltime", "node_failure", "preempted"]
+
+restart_dir = "restart/gs"
+record_file = "recovery.json"
+
+# Octopus default
+_default_max_iter = 200
+
+# Bytes read from the end of the Slurm output
+_tail_size = 1 << 14
+
+_matcher = FailureMatcher(
+    {category: failure_rules[category] for category in recoverable_categories},
+    tail_bytes=_tail_size,
+)
+
+_time_line = re.compile(r"^(#SBATCH\s+(?:--time|-t)[\s=]+)(\S+)", re.M)
+
+
+def parse_slurm_time(time: str) -> datetime.timedelta:
+    """Parse a Slurm time limit: M, M:S, H:M:S, D-H, D-H:M or D-H:M:S."""
+    days, _, clock = time.rpartition("-")
+    fields = [int(x) for x in clock.split(":")]
+    if days:
+        # With days, fields are hours[:minutes[:seconds]]
+        fields += [0] * (3 - len(fields))
+        hours, minutes, seconds = fields
+    elif len(fields) == 3:
+        hours, minutes, seconds = fields
+    elif len(fields) == 2:
+        hours, (minutes, seconds) = 0, fields
+    else:
+        hours, minutes, seconds = 0, fields[0], 0
+    return datetime.timedelta(
+        days=int(days or 0), hours=hours, minutes=minutes, seconds=seconds
+    )
+
+
+def format_slurm_time(time: datetime.timedelta) -> str:
+    """Format a time limit as D-HH:MM:SS, rounded up to the minute."""
+    minutes = -(-int(time.total_seconds()) // 60)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{days}-{hours:02d}:{minutes:02d}:00"
+
+
+def set_input_options(inp: str, options: dict) -> str:
+    """Set key = value options in an input string, replacing any existing
+    assignment. Octopus keys are case-insensitive."""
+    for key, value in options.items():
+        line = re.compile(rf"^\s*{re.escape(key)}\s*=.*$", re.M | re.I)
+        if line.search(inp):
+            inp = line.sub(f"{key} = {value}", inp, count=1)
+        else:
+            inp = f"{key} = {value}\n" + inp
+    return inp
+
+
+def _input_value(inp: str, key: str) -> str | None:
+    match = re.search(rf"^\s*{re.escape(key)}\s*=\s*(\S+)", inp, re.M | re.I)
+    return match.group(1) if match else None
+
+
+def latest_slurm_output(directory) -> Path | None:
+    """slurm-<id>.out with the largest job id."""
+    outputs = []
+    for file in Path(directory).glob("slurm-*.out"):
+        match = re.fullmatch(r"slurm-(\d+)\.out", file.name)
+        if match:
+            outputs.append((int(match.group(1)), file))
+    return max(outputs)[1] if outputs else None
+
+
+def termination_reason(directory) -> str | None:
+    """Recoverable termination of the latest run of a job, if any.
+
+    :return: One of `recoverable_categories`, or None.
+    """
+    output = latest_slurm_output(directory)
+    if output is None:
+        return None
+    return next(iter(_matcher.scan(output)), None)
+
+
+def has_restart_data(directory) -> bool:
+    restart = Path(directory, restart_dir)
+    return restart.is_dir() and any(restart.iterdir())
+
+
+def sbatch_submit(directory) -> str:
+    """Submit slurm.sh from the job directory.
+
+    :return: Slurm job id.
+    """
+    result = subprocess.run(
+        ["sbatch", "--parsable", "slurm.sh"],
+        cwd=directory,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return result.stdout.strip().split(";")[0]
+
+
+class JobRecovery:
+    """Resubmit recoverable jobs.
+
+    :param max_retries: Maximum resubmissions per job.
+    :param safety_factor: Multiplies the estimated remaining run time.
+    :param max_time: Upper bound of the time limit, for example the
+    partition limit.
+    :param submit: Callable taking a job directory, that submits the job.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        safety_factor: float = 1.5,
+        max_time: datetime.timedelta = datetime.timedelta(days=1),
+        submit: Callable = sbatch_submit,
+    ):
+        self.max_retries = max_retries
+        self.safety_factor = safety_factor
+        self.max_time = max_time
+        self.submit = submit
+
+    def estimate_time(
+        self, time: datetime.timedelta, done: int, remaining: int
+    ) -> datetime.timedelta:
+        """Time limit for the remaining iterations, assuming the previous
+        run used its whole time limit for `done` iterations."""
+        if done > 0:
+            estimate = time * (remaining / done) * self.safety_factor
+        else:
+            estimate = time * self.safety_factor
+        return min(estimate, self.max_time)
+
+    def recover(self, directory, job: OctopusJob = None) -> dict:
+        """Check one job directory, and resubmit it if recoverable.
+
+        :param directory: Job directory.
+        :param job: Job, updated with the rewritten inp and slurm strings.
+        :return: Dict with 'status', one of 'ok', 'pending', 'no_restart',
+        'budget_exhausted' or 'resubmitted', 'reason', and
+        for resubmitted jobs 'max_iter', 'time' and 'job_id'.
+        """
+        directory = Path(directory)
+        record_path = Path(directory, record_file)
+        record = {"attempts": []}
+        if record_path.exists():
+            with open(record_path) as fid:
+                record = json.load(fid)
+
+        # Resubmitted, but the new run has not started
+        if record["attempts"]:
+            job_id = record["attempts"][-1]["job_id"]
+            if not Path(directory, f"slurm-{job_id}.out").exists():
+                return {"status": "pending", "reason": None}
+
+        reason = termination_reason(directory)
+        if reason is None:
+            return {"status": "ok", "reason": None}
+        if not has_restart_data(directory):
+            return {"status": "no_restart", "reason": reason}
+        if len(record["attempts"]) >= self.max_retries:
+            return {"status": "budget_exhausted", "reason": reason}
+
+        inp = Path(directory, "inp").read_text()
+        slurm = Path(directory, "slurm.sh").read_text()
+
+        max_iter = int(_input_value(inp, "MaximumIter") or _default_max_iter)
+        try:
+            done = read_convergence(
+                Path(directory, convergence_file), use_cache=False
+            ).shape[0]
+        except FileNotFoundError:
+            done = 0
+        remaining = max(max_iter - done, 1)
+        inp = set_input_options(
+            inp,
+            {
+                "FromScratch": "no",
+                "RestartWrite": "yes",
+                "MaximumIter": remaining,
+            },
+        )
+
+        time = None
+        match = _time_line.search(slurm)
+        if match:
+            previous = parse_slurm_time(match.group(2))
+            # Only a timeout implies the whole time limit was used
+            time = (
+                self.estimate_time(previous, done, remaining)
+                if reason == "walltime"
+                else previous
+            )
+            slurm = _time_line.sub(
+                lambda m: m.group(1) + format_slurm_time(time), slurm, count=1
+            )
+
+        Path(directory, "inp").write_text(inp)
+        Path(directory, "slurm.sh").write_text(slurm)
+        if job is not None:
+            job.inp, job.slurm = inp, slurm
+
+        job_id = self.submit(directory)
+        record["attempts"].append(
+            {"reason": reason, "iterations": done, "job_id": job_id}
+        )
+        with open(record_path, "w") as fid:
+            json.dump(record, fid, indent=1)
+
+        return {
+            "status": "resubmitted",
+            "reason": reason,
+            "max_iter": remaining,
+            "time": format_slurm_time(time) if time is not None else None,
+            "job_id": job_id,
+        }
+
+    def recover_sweep(
+        self, root, jobs: Dict[str, OctopusJob] = None
+    ) -> Dict[str, dict]:
+        """Check every job of a sweep in one pass.
+
+        :param root: Directory the jobs were written to.
+        :param jobs: Jobs of the sweep. If None, every sub-directory of
+        root containing an inp file.
+        :return: Job directory: result of `recover`.
+        """
+        if jobs is None:
+            directories: List[str] = sorted(
+                p.parent.name for p in Path(root).glob("*/inp")
+            )
+            return {d: self.recover(Path(root, d)) for d in directories}
+        return {
+            job.directory: self.recover(Path(root, job.directory), job)
+            for job in jobs.values()
+        }
@@ -0,0 +1,227 @@
+""" Generate strong and weak scaling studies, and tabulate their results.
+
+* Strong scaling: a fixed problem, run on an increasing number of nodes.
+* Weak scaling: a bulk supercell grown in proportion to the number of nodes,
+  such that the work per node is fixed.
+"""
+from __future__ import annotations
+
+import copy
+import math
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from octopus_workflows.components import ase_bulk_structure_constructor
+from octopus_workflows.oct_ase import ase_atoms_to_oct_structure
+from octopus_workflows.oct_parse import parse_oct_input
+from octopus_workflows.oct_profiling import load_profiling, region_metric
+from octopus_workflows.simple_oct_workflow import (
+    OctopusJob,
+    ground_state_calculation,
+)
+
+
+def strong_scaling_jobs(
+    matrix: dict,
+    static_options: dict,
+    nodes: List[int],
+    slurm_settings: dict = None,
+    **workflow_options,
+) -> Dict[str, OctopusJob]:
+    """Strong-scaling series of a single job.
+
+    :param matrix: Matrix of a single job, in the format of
+    `ground_state_calculation`.
+    :param static_options: Options fixed for all calculations.
+    :param nodes: Node counts.
+    :param slurm_settings: Slurm settings. 'nodes' is set per job.
+    :param workflow_options: Passed to `ground_state_calculation`, for
+    example meta_value_ops, file_rules and binary_path.
+    :return: Jobs, with ids <job id>_strong_n<nodes>.
+    """
+    if slurm_settings is None:
+        slurm_settings = {}
+    all_jobs = {}
+    for n in nodes:
+        jobs = ground_state_calculation(
+            matrix,
+            static_options,
+            slurm_settings={**slurm_settings, "nodes": n},
+            **workflow_options,
+        )
+        if len(jobs) != 1:
+            raise ValueError(
+                f"matrix defines {len(jobs)} jobs, rather than one"
+            )
+        job_id, job = next(iter(jobs.items()))
+        job.rename(f"{job_id}_strong_n{n}")
+        all_jobs[job.directory] = job
+    return all_jobs
+
+
+def weak_supercells(supercell: List[int], nodes: List[int]) -> List[List[int]]:
+    """Supercells with a number of cells proportional to the node count.
+
+    The prime factors of each node count are distributed over the axes,
+    each multiplying the currently-shortest axis, such that the supercells
+    stay as close to isotropic as possible.
+
+    :param supercell: Supercell for the first node count.
+    :param nodes: Node counts. Each must be a multiple of the first.
+    :return: Supercell per node count.
+    """
+    supercells = []
+    for n in nodes:
+        if n % nodes[0] != 0:
+            raise ValueError(f"{n} nodes is not a multiple of {nodes[0]}")
+        ratio = n // nodes[0]
+        factors = []
+        p = 2
+        while ratio > 1:
+            while ratio % p == 0:
+                factors.append(p)
+                ratio //= p
+            p += 1
+        cell = list(supercell)
+        for p in sorted(factors, reverse=True):
+            i = int(np.argmin(cell))
+            cell[i] *= p
+        supercells.append(cell)
+    return supercells
+
+
+def bulk_structure(ase_constructor: dict, supercell: List[int]) -> dict:
+    """Octopus structure options of a bulk supercell.
+
+    :param ase_constructor: Arguments of ase.build.bulk, including 'name'.
+    :param supercell: Supercell.
+    :return: LatticeParameters, LatticeVectors and ReducedCoordinates.
+    """
+    atoms = ase_bulk_structure_constructor(
+        [
+            {
+                "ase_constructor": copy.deepcopy(ase_constructor),
+                "supercell": supercell,
+            }
+        ]
+    )[0]
+    return parse_oct_input(
+        ase_atoms_to_oct_structure(atoms), do_substitutions=False
+    )
+
+
+def weak_scaling_jobs(
+    ase_constructor: dict,
+    supercell: List[int],
+    static_options: dict,
+    nodes: List[int],
+    slurm_settings: dict = None,
+    file_rules=None,
+    binary_path: str = "",
+    **workflow_options,
+) -> Dict[str, OctopusJob]:
+    """Weak-scaling series of a bulk crystal.
+
+    Structures are built with `ase_bulk_structure_constructor`, and
+    substituted into the inputs by `ground_state_calculation`.
+
+    :param ase_constructor: Arguments of ase.build.bulk, including 'name'.
+    :param supercell: Supercell for the first node count.
+    :param static_options: Options fixed for all calculations.
+    :param nodes: Node counts.
+    :param slurm_settings: Slurm settings. 'nodes' is set per job.
+    :param file_rules: File dependency rules, see
+    `set_job_file_dependencies`.
+    :param binary_path: Octopus installation root.
+    :param workflow_options: Passed to `ground_state_calculation`, for
+    example slurm_profile.
+    :return: Jobs, with ids <name>_weak_n<nodes>.
+    """
+    if slurm_settings is None:
+        slurm_settings = {}
+
+    name = ase_constructor["name"]
+    supercells = {
+        f"{name}_weak_n{n}": cell
+        for n, cell in zip(nodes, weak_supercells(supercell, nodes))
+    }
+
+    def structure(job_id: str) -> dict:
+        return bulk_structure(ase_constructor, supercells[job_id])
+
+    all_jobs = {}
+    for n, job_id in zip(nodes, supercells):
+        # The structure placeholder names the job
+        jobs = ground_state_calculation(
+            {"^structure": [job_id]},
+            static_options,
+            meta_value_ops={"^structure": structure},
+            file_rules=file_rules,
+            slurm_settings={**slurm_settings, "nodes": n},
+            binary_path=binary_path,
+            **workflow_options,
+        )
+        all_jobs.update(jobs)
+    return all_jobs
+
+
+def scaling_table(
+    roots: List[str],
+    nodes: List[int],
+    mode: str = "strong",
+    region: str = "COMPLETE_RUN",
+    metric: str = "TOTAL_TIME",
+) -> dict:
+    """Speedup and parallel efficiency of a scaling series, relative to
+    the first node count.
+
+    Strong scaling: speedup = t_0 / t_n, and efficiency is the speedup over
+    the ideal speedup, n / n_0. Weak scaling: efficiency = t_0 / t_n, and
+    the scaled speedup is efficiency * n / n_0.
+
+    Times are the maximum over ranks. Runs without profiling give NaN.
+
+    :param roots: Calculation directories, one per node count.
+    :param nodes: Node counts.
+    :param mode: 'strong' or 'weak'.
+    :param region: Profiling region.
+    :param metric: Cumulative profiling metric.
+    :return: Dict of columns: 'nodes', 'time', 'ideal_speedup', 'speedup',
+    'efficiency' and 'node_hours'.
+    """
+    if mode not in ("strong", "weak"):
+        raise ValueError(f"Invalid scaling mode: {mode}")
+
+    times = np.full(shape=len(roots), fill_value=np.nan)
+    for i, root in enumerate(roots):
+        try:
+            times[i] = region_metric(load_profiling(root), metric).get(
+                region, math.nan
+            )
+        except FileNotFoundError:
+            pass
+
+    nodes = np.asarray(nodes)
+    ideal = nodes / nodes[0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = times[0] / times
+    if mode == "strong":
+        speedup, efficiency = ratio, ratio / ideal
+    else:
+        speedup, efficiency = ratio * ideal, ratio
+
+    return {
+        "nodes": nodes,
+        "time": times,
+        "ideal_speedup": ideal,
+        "speedup": speedup,
+        "efficiency": efficiency,
+        "node_hours": times * nodes / 3600.0,
+    }
+
+
+def scaling_roots(root, jobs: Dict[str, OctopusJob]) -> List[Path]:
+    """Calculation directories of a series of scaling jobs."""
+    return [Path(root, job.directory) for job in jobs.values()]
@@ -0,0 +1,198 @@
+""" Deterministic sharding of sweeps across machines and accounts.
+
+Each job is assigned to one of num_shards shards by a stable hash of its id,
+so every machine that expands the same sweep agrees on the assignment
+without communicating. Optionally, shards are balanced by an estimated cost
+per job. Balancing depends on the whole sweep, so every shard must evaluate
+the same costs.
+
+Each shard generates, writes and submits only its own jobs, and records a
+manifest of them. Manifests are merged into one index of the sweep, which
+fails if a shard's manifest is missing, a job was assigned to more than one
+shard or, given the job ids of the sweep, a job is missing.
+"""
+from __future__ import annotations
+
+import hashlib
+import heapq
+from typing import Callable, Dict, List
+
+
+def stable_hash(job_id: str) -> int:
+    """Hash of a job id, identical on every machine and Python process."""
+    digest = hashlib.blake2b(job_id.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+def _check_shard(shard_index: int, num_shards: int):
+    if num_shards < 1:
+        raise ValueError(f"num_shards must be at least 1: {num_shards}")
+    if not 0 <= shard_index < num_shards:
+        raise ValueError(
+            f"shard_index must be in [0, {num_shards}): {shard_index}"
+        )
+
+
+def assign_shards(
+    job_ids: List[str], num_shards: int, costs: List[float] = None
+) -> List[int]:
+    """Shard of each job.
+
+    Without costs, a job's shard only depends on its id. With costs, jobs
+    are assigned in decreasing cost to the least loaded shard, ties broken
+    by the hash of the id, such that the assignment only depends on the set
+    of jobs and their costs.
+
+    :param job_ids: Job ids.
+    :param num_shards: Number of shards.
+    :param costs: Estimated cost of each job.
+    :return: Shard index of each job.
+    """
+    _check_shard(0, num_shards)
+    if costs is None:
+        return [stable_hash(job_id) % num_shards for job_id in job_ids]
+    if len(costs) != len(job_ids):
+        raise ValueError(
+            f"Expected one cost per job: {len(costs)} != {len(job_ids)}"
+        )
+
+    order = sorted(
+        range(len(job_ids)),
+        key=lambda i: (-costs[i], stable_hash(job_ids[i]), job_ids[i]),
+    )
+    # Load and index of each shard
+    loads = [(0.0, shard) for shard in range(num_shards)]
+    shards = [0] * len(job_ids)
+    for i in order:
+        load, shard = heapq.heappop(loads)
+        shards[i] = shard
+        heapq.heappush(loads, (load + costs[i], shard))
+    return shards
+
+
+def select_shard(
+    job_ids: List[str],
+    shard_index: int,
+    num_shards: int,
+    costs: List[float] = None,
+) -> List[int]:
+    """Positions of the jobs of one shard, in sweep order.
+
+    See `assign_shards`.
+    """
+    _check_shard(shard_index, num_shards)
+    shards = assign_shards(job_ids, num_shards, costs)
+    return [i for i, shard in enumerate(shards) if shard == shard_index]
+
+
+def shard_jobs(
+    jobs: dict,
+    shard_index: int,
+    num_shards: int,
+    cost: Callable = None,
+) -> dict:
+    """Jobs of one shard.
+
+    Jobs chained by `OctopusJob.after`, such as warm-start siblings, wait on
+    each other, so are kept in the shard of the first job of their chain.
+
+    :param jobs: Jobs, in the format of `ground_state_calculation`.
+    :param shard_index: Shard to select.
+    :param num_shards: Number of shards.
+    :param cost: Estimated cost of a job, given the job.
+    :return: Jobs of the shard, in sweep order.
+    """
+
+    def chain_root(job_id: str) -> str:
+        seen = set()
+        while job_id in jobs and jobs[job_id].after and job_id not in seen:
+            seen.add(job_id)
+            job_id = jobs[job_id].after[0]
+        return job_id
+
+    groups: Dict[str, List[str]] = {}
+    for job_id in jobs:
+        groups.setdefault(chain_root(job_id), []).append(job_id)
+
+    roots = list(groups)
+    costs = None
+    if cost is not None:
+        costs = [
+            sum(cost(jobs[job_id]) for job_id in groups[root])
+            for root in roots
+        ]
+    selected = {
+        job_id
+        for i in select_shard(roots, shard_index, num_shards, costs)
+        for job_id in groups[roots[i]]
+    }
+    return {job_id: job for job_id, job in jobs.items() if job_id in selected}
+
+
+def shard_manifest(
+    jobs: dict, shard_index: int, num_shards: int, results: dict = None
+) -> dict:
+    """Record of the jobs generated by one shard.
+
+    :param jobs: Jobs of the shard.
+    :param results: Optional result per job id, such as the category of
+    each job from `triage.triage_sweep`.
+    :return: JSON-serialisable manifest.
+    """
+    _check_shard(shard_index, num_shards)
+    results = results or {}
+    records = {}
+    for job_id, job in jobs.items():
+        records[job_id] = {"directory": job.directory, "hash": job.hash}
+        if job_id in results:
+            records[job_id]["result"] = results[job_id]
+    return {
+        "shard_index": shard_index,
+        "num_shards": num_shards,
+        "jobs": records,
+    }
+
+
+def merge_manifests(
+    manifests: List[dict], complete=True, job_ids: List[str] = None
+) -> dict:
+    """Merge the manifests of a sweep's shards into one index.
+
+    :param manifests: Manifests, as returned by `shard_manifest`.
+    :param complete: Require a manifest from every shard.
+    :param job_ids: Job ids of the whole sweep, such as
+    `directory_names` of its permutations. If given, every job must be in
+    exactly one manifest, and no other jobs may be.
+    :return: Job id: directory, hash, shard and any result of the job.
+    """
+    num_shards = {m["num_shards"] for m in manifests}
+    if len(num_shards) > 1:
+        raise ValueError(f"Manifests of different shardings: {num_shards}")
+
+    index, shards = {}, set()
+    for manifest in manifests:
+        shard = manifest["shard_index"]
+        if shard in shards:
+            raise ValueError(f"Duplicate manifest of shard {shard}")
+        shards.add(shard)
+        for job_id, record in manifest["jobs"].items():
+            if job_id in index:
+                raise ValueError(
+                    f"Job {job_id} is in shards {index[job_id]['shard']} "
+                    f"and {shard}"
+                )
+            index[job_id] = {**record, "shard": shard}
+
+    if complete and num_shards:
+        missing = set(range(num_shards.pop())) - shards
+        if missing:
+            raise ValueError(f"Missing manifests of shards {sorted(missing)}")
+
+    if job_ids is not None:
+        missing = [job_id for job_id in job_ids if job_id not in index]
+        if missing:
+            raise ValueError(f"Jobs missing from the manifests: {missing}")
+        unexpected = sorted(set(index) - set(job_ids))
+        if unexpected:
+            raise ValueError(f"Jobs not in the sweep: {unexpected}")
+    return index
@@ -2,18 +2,30 @@
 but can still facilitate it.
 """
 import copy
+import functools
+import logging
 import shutil
+import threading
+from collections import OrderedDict
 from pathlib import Path
 from typing import Callable, Dict, List
 
 from octopus_workflows.components import (
-    directory_generation,
-    expand_input_dictionary,
-    set_job_file_dependencies,
-    slurm_submission_scripts,
+    directory_names,
+    slurm_submission_script,
 )
+from octopus_workflows.file_dependencies import DependencyIndex
+from octopus_workflows.instrument import instrumented, stage
 from octopus_workflows.metadata import create_hashes
 from octopus_workflows.oct_write import write_octopus_input
+from octopus_workflows.sharding import select_shard
+from octopus_workflows.slurm_templates import default_profile
+from octopus_workflows.utils import expand_matrix
+
+logger = logging.getLogger(__name__)
+
+# Number of inputs rendered at once when hashing a sweep
+_chunk_size = 1024
 
 
 def substitute_specific_settings(
@@ -36,15 +48,115 @@ def substitute_specific_settings(
     return inputs
 
 
+# Maximum number of rendered inp and slurm strings held by the render
+# cache, shared by all jobs. 0 disables caching
+render_cache_size = 1024
+
+_render_cache: OrderedDict = OrderedDict()
+_render_lock = threading.Lock()
+
+
+def _render(source) -> str:
+    """Render a job file from its source: a string, or a callable that
+    returns one. Rendered strings are held in a bounded LRU cache."""
+    if isinstance(source, str):
+        return source
+    if render_cache_size <= 0:
+        return source()
+    with _render_lock:
+        text = _render_cache.get(source)
+        if text is not None:
+            _render_cache.move_to_end(source)
+            return text
+    text = source()
+    with _render_lock:
+        _render_cache[source] = text
+        while len(_render_cache) > render_cache_size:
+            _render_cache.popitem(last=False)
+    return text
+
+
+def _merge(layers: tuple) -> dict:
+    options = {}
+    for layer in layers:
+        options.update(layer)
+    return options
+
+
+def _render_input(layers: tuple) -> str:
+    """Render an inp from option dicts, merged in order."""
+    return write_octopus_input(_merge(layers))
+
+
+def _render_slurm(
+    oct_root: str, options: dict, profile: str, job_id: str
+) -> str:
+    return slurm_submission_script(
+        oct_root, {**options, "job_name": f"oct_{job_id}"}, profile
+    )
+
+
 # TODO(Alex) Move this class
 class OctopusJob:
-    def __init__(self, directory, inp, slurm, hash, depends_on: dict):
+    """Files and metadata of one job.
+
+    inp and slurm are given either as strings, or as callables that render
+    them. Callables are only rendered on access or `write`, and the result
+    is not stored on the job, such that a large sweep only holds references
+    to the option dicts its jobs share.
+    """
+
+    __slots__ = ("directory", "_inp", "_slurm", "hash", "depends_on", "after")
+
+    def __init__(
+        self, directory, inp, slurm, hash, depends_on: dict, after=None
+    ):
         self.directory = directory
-        self.inp = inp
-        self.slurm = slurm
+        self._inp = inp
+        self._slurm = slurm
         self.hash = hash
         self.depends_on = depends_on
+        # Ids of jobs that must complete successfully before this job runs
+        self.after: List[str] = [] if after is None else after
+
+    @property
+    def inp(self) -> str:
+        return _render(self._inp)
+
+    @inp.setter
+    def inp(self, value):
+        self._inp = value
+
+    @property
+    def slurm(self) -> str:
+        return _render(self._slurm)
 
+    @slurm.setter
+    def slurm(self, value):
+        self._slurm = value
+
+    def rename(self, directory):
+        """Move the job to a new directory, including the destinations of
+        its file dependencies, and the job name of its Slurm script."""
+        # The job name of a Slurm script is derived from the directory
+        if (
+            isinstance(self._slurm, functools.partial)
+            and self._slurm.func is _render_slurm
+        ):
+            self._slurm = functools.partial(
+                _render_slurm, *self._slurm.args[:3], directory
+            )
+        elif isinstance(self._slurm, str):
+            self._slurm = self._slurm.replace(
+                f"oct_{self.directory}", f"oct_{directory}"
+            )
+        self.directory = directory
+        self.depends_on = {
+            name: {**file, "dest": f"{directory}/{name}"}
+            for name, file in self.depends_on.items()
+        }
+
+    @instrumented("write", items=1)
     def write(self, root="", parents=True, exist_ok=False):
         """
         :return:
@@ -60,13 +172,63 @@ class OctopusJob:
             ("hash.txt", "hash"),
         ]:
             with open(Path(subdir, fname), "w") as fid:
-                fid.write(self.__dict__[attr])
+                fid.write(getattr(self, attr))
 
-        # Copy dependencies
+        # Copy dependencies. Those produced by another job are copied when
+        # the job runs
         for file in self.depends_on.values():
+            if "after" in file:
+                continue
             shutil.copyfile(file["source"], Path(root, file["dest"]))
 
 
+def _input_layers(
+    options: List[dict],
+    static_options: dict,
+    meta_value_ops: Dict[str, Callable],
+    meta_key: str,
+) -> List[tuple]:
+    """Option dicts of each job, to be merged in order.
+
+    Equivalent to `substitute_specific_settings` over the merged options,
+    but static options and the substituted settings are shared between
+    jobs, and each meta value is only substituted once.
+    """
+    static_plain = {
+        k: v for k, v in static_options.items() if not k.startswith(meta_key)
+    }
+    static_meta = {
+        k: v for k, v in static_options.items() if k.startswith(meta_key)
+    }
+    fragments = {}
+
+    def fragment(key, placeholder) -> dict:
+        try:
+            memo_key = (key, placeholder)
+            hash(memo_key)
+        except TypeError:
+            return copy.deepcopy(meta_value_ops[key](placeholder))
+        if memo_key not in fragments:
+            fragments[memo_key] = copy.deepcopy(
+                meta_value_ops[key](placeholder)
+            )
+        return fragments[memo_key]
+
+    layers = []
+    for opt in options:
+        meta_keys = [k for k in opt if k.startswith(meta_key)]
+        if not meta_keys and not static_meta:
+            layers.append((opt, static_plain))
+            continue
+        plain = {k: v for k, v in opt.items() if not k.startswith(meta_key)}
+        meta = {**{k: opt[k] for k in meta_keys}, **static_meta}
+        layers.append(
+            (plain, static_plain)
+            + tuple(fragment(k, v) for k, v in meta.items())
+        )
+    return layers
+
+
 def ground_state_calculation(
     matrix: dict,
     static_options: dict,
@@ -75,6 +237,12 @@ def ground_state_calculation(
     file_rules=None,
     slurm_settings: dict = None,
     binary_path: str = "",
+    constraints: List[Callable] = None,
+    slurm_profile: str = default_profile,
+    validate_files: bool = True,
+    shard_index: int = 0,
+    num_shards: int = 1,
+    shard_cost: Callable[[dict], float] = None,
 ) -> Dict[str, OctopusJob]:
     """An Octopus Workflow.
 
@@ -87,6 +255,22 @@ def ground_state_calculation(
     matrix:
     static_options
     : meta_key:
+    :param constraints: Predicates that option permutations must satisfy.
+    Infeasible permutations are never generated, hashed or written.
+    Constraints may also index static options. See `utils.expand_matrix`,
+    which also describes zipped matrix keys.
+    :param slurm_profile: Site profile of the Slurm scripts, see
+    `slurm_templates`.
+    :param validate_files: Raise FileNotFoundError if a source file of
+    the sweep's file dependencies does not exist. Rules may be
+    `file_dependencies.FileRule`s, which are only evaluated once per
+    distinct value of the keys they inspect.
+    :param shard_index: Shard of the sweep to generate, see `sharding`.
+    Only the shard's jobs are substituted, rendered and hashed.
+    :param num_shards: Number of shards the sweep is split into.
+    :param shard_cost: Estimated cost of a job, given its option
+    permutation, to balance shards by. By default, jobs are assigned by a
+    stable hash of their id.
     :return:
     """
     # Defaults
@@ -98,41 +282,81 @@ def ground_state_calculation(
         slurm_settings = {}
 
     # Generate list of input dicts
-    inputs = expand_input_dictionary(matrix, static_options)
-
-    # Substitute specific settings
-    inputs = substitute_specific_settings(inputs, meta_value_ops, meta_key)
+    with stage("expand") as expand:
+        options, n_pruned = expand_matrix(matrix, constraints, static_options)
+        expand.items = len(options)
+    if n_pruned:
+        logger.info(
+            f"Pruned {n_pruned} of {len(options) + n_pruned} permutations"
+        )
 
-    # Go from dicts to strings
-    input_strings = [write_octopus_input(input) for input in inputs]
+    # Select this shard's permutations, before any are rendered
+    if num_shards > 1:
+        with stage("shard", len(options)):
+            costs = None
+            if shard_cost is not None:
+                costs = [shard_cost(opt) for opt in options]
+            selected = select_shard(
+                directory_names(options), shard_index, num_shards, costs
+            )
+            options = [options[i] for i in selected]
+    n_jobs = len(options)
 
-    # Unique hashes
-    hashes = create_hashes(input_strings)
+    # Substitute specific settings. Copied once, as jobs are rendered from
+    # them lazily
+    with stage("substitute", n_jobs):
+        layers = _input_layers(
+            options, copy.deepcopy(static_options), meta_value_ops, meta_key
+        )
 
     # Use directory names as job ids
-    job_ids = directory_generation(matrix)
+    with stage("job_ids", n_jobs):
+        job_ids = directory_names(options)
 
-    # Note location of any file dependencies
-    file_dependencies = []
-    for i, inp in enumerate(input_strings):
-        file_dependencies.append(
-            set_job_file_dependencies(inp, job_ids[i], file_rules)
-        )
+    # Render inputs in chunks, to hash them and find their file
+    # dependencies, without holding every input string at once
+    hashes, file_dependencies = [], []
+    dependencies = DependencyIndex(file_rules)
+    for i in range(0, n_jobs, _chunk_size):
+        with stage("render", len(layers[i : i + _chunk_size])):
+            chunk = [_merge(layer) for layer in layers[i : i + _chunk_size]]
+            input_strings = [write_octopus_input(opt) for opt in chunk]
 
-    # Submission scripts
-    sub_scripts = slurm_submission_scripts(
-        binary_path, slurm_settings, job_ids
-    )
+        with stage("hash", len(chunk)):
+            hashes.extend(create_hashes(input_strings))
+
+        with stage("file_dependencies", len(chunk)):
+            for opt, inp, id in zip(
+                chunk, input_strings, job_ids[i : i + _chunk_size]
+            ):
+                file_dependencies.append(
+                    dependencies.job_dependencies(opt, inp, id)
+                )
+
+    # Fail before any job is written
+    if validate_files:
+        dependencies.validate()
+
+    # Submission scripts, rendered on access
+    with stage("slurm", n_jobs):
+        slurm_settings = copy.deepcopy(slurm_settings)
+        sub_scripts = [
+            functools.partial(
+                _render_slurm, binary_path, slurm_settings, slurm_profile, id
+            )
+            for id in job_ids
+        ]
 
     # Package information
-    jobs = {}
-    for i, id in enumerate(job_ids):
-        jobs[id] = OctopusJob(
-            id,
-            input_strings[i],
-            sub_scripts[i],
-            hashes[i],
-            file_dependencies[i],
-        )
+    with stage("package", n_jobs):
+        jobs = {}
+        for i, id in enumerate(job_ids):
+            jobs[id] = OctopusJob(
+                id,
+                functools.partial(_render_input, layers[i]),
+                sub_scripts[i],
+                hashes[i],
+                file_dependencies[i],
+            )
 
     return jobs
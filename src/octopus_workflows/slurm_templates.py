@@ -0,0 +1,153 @@
+""" Slurm submission scripts from precompiled Jinja2 templates.
+
+Site profiles are template files, extending templates/slurm/base.j2 and
+overriding its blocks: modules, environment and run. Bundled profiles:
+
+* ada: ADA's MPI and CUDA modules. The default.
+* ada_gpu: ada, with GPUs bound to the closest cores.
+* generic: modules given by the `modules` template variable.
+
+A profile may also be the path to a template file, which can extend the
+bundled templates.
+
+The #SBATCH header is formatted as simple_slurm formats it, reusing its
+table of sbatch arguments, but without building an argument parser per job.
+These are private to simple_slurm.core, so simple-slurm is pinned to the
+range they are tested against.
+"""
+from __future__ import annotations
+
+import functools
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from octopus_workflows.utils import lazy_import
+
+jinja2 = lazy_import("jinja2")
+
+template_dir = Path(__file__).parent / "templates" / "slurm"
+
+default_profile = "ada"
+
+shell = "/bin/sh"
+
+
+@functools.lru_cache(maxsize=None)
+def _sbatch_arguments() -> Tuple[Dict[str, str], Dict[str, int]]:
+    """Canonical name of each sbatch argument and alias, and the position
+    of each canonical name in simple_slurm's output."""
+    from simple_slurm.core import read_simple_txt
+
+    names, order = {}, {}
+    for keys in read_simple_txt("arguments.txt"):
+        if not keys[0]:
+            continue
+        order[keys[0]] = len(order)
+        for key in keys:
+            names[key] = keys[0]
+    return names, order
+
+
+def sbatch_directives(options: dict) -> Dict[str, str]:
+    """Normalise sbatch options, as simple_slurm.Slurm(**options).
+
+    :param options: Long names with underscores, short names, or either
+    prefixed with dashes, such as job_name, c, --job-name or -c.
+    :return: Canonical name: formatted value, in simple_slurm's order.
+    """
+    from simple_slurm.core import IGNORE_BOOLEAN, fmt_value
+
+    names, order = _sbatch_arguments()
+    directives = {}
+    for key, value in options.items():
+        name = names.get(str(key).strip().lstrip("-").replace("-", "_"))
+        if name is None:
+            raise KeyError(f"Unknown sbatch option: {key}")
+        value = fmt_value(value)
+        if value is not IGNORE_BOOLEAN:
+            directives[name] = value
+    return dict(sorted(directives.items(), key=lambda item: order[item[0]]))
+
+
+def sbatch_header(directives: Dict[str, str]) -> str:
+    """Shebang and #SBATCH lines, as simple_slurm.Slurm.script()."""
+    lines = [
+        f"#SBATCH --{name.replace('_', '-'):<19} {value}"
+        for name, value in directives.items()
+    ]
+    return "\n".join([f"#!{shell}", "", *lines]).strip() + "\n"
+
+
+@functools.lru_cache(maxsize=None)
+def _environment(search_path: Tuple[str, ...]):
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(list(search_path)),
+        trim_blocks=True,
+        lstrip_blocks=True,
+        undefined=jinja2.StrictUndefined,
+        autoescape=False,
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def load_template(profile: str = default_profile):
+    """Compiled template of a site profile.
+
+    :param profile: Name of a bundled profile, or path to a template file.
+    """
+    path = Path(profile)
+    if path.suffix == ".j2" or path.is_file():
+        if not path.is_file():
+            raise FileNotFoundError(f"No Slurm template: {profile}")
+        search_path = (str(path.parent.resolve()), str(template_dir))
+        return _environment(search_path).get_template(path.name)
+    if not Path(template_dir, f"{profile}.j2").is_file():
+        raise ValueError(f"Unknown Slurm profile: {profile}")
+    return _environment((str(template_dir),)).get_template(f"{profile}.j2")
+
+
+def render_script(
+    oct_root: str,
+    options: dict,
+    profile: str = default_profile,
+    **variables,
+) -> str:
+    """Slurm script of one job.
+
+    :param oct_root: Octopus installation root.
+    :param options: sbatch options.
+    :param profile: Site profile.
+    :param variables: Additional template variables.
+    :return: Slurm input file string.
+    """
+    return load_template(profile).render(
+        sbatch=sbatch_header(sbatch_directives(options)),
+        oct_root=oct_root,
+        **variables,
+    )
+
+
+def render_scripts(
+    oct_root: str,
+    options: dict,
+    job_ids: List[str],
+    profile: str = default_profile,
+    **variables,
+) -> List[str]:
+    """Slurm scripts of a sweep, named oct_<job id>.
+
+    The options shared by all jobs are normalised once.
+    """
+    template = load_template(profile)
+    shared = sbatch_directives(options)
+    scripts = []
+    for job_id in job_ids:
+        directives = sbatch_directives({**shared, "job_name": f"oct_{job_id}"})
+        scripts.append(
+            template.render(
+                sbatch=sbatch_header(directives),
+                oct_root=oct_root,
+                **variables,
+            )
+        )
+    return scripts
@@ -0,0 +1,305 @@
+""" Compact sweeps: shared base inputs, plus a table of per-job overrides.
+
+Most of each inp in a sweep is shared: the fixed settings, and the
+structure of its system. A `SweepTable` stores the option layers that
+jobs share once, and one row per job with its matrix values, as split by
+`expand_input_dictionary` and `ground_state_calculation`. Slurm scripts
+are stored once per distinct script, up to the job name.
+
+Options are stored as the input lines they render to, one per key, so a
+materialised inp is identical to the one `ground_state_calculation`
+renders. Full inputs are only materialised on demand, when jobs are
+written, or at job start with:
+
+    python -m octopus_workflows.sweep_table materialise sweep.json <job id>
+"""
+from __future__ import annotations
+
+import argparse
+import functools
+import gzip
+import json
+import sys
+from typing import Dict, List
+
+from octopus_workflows.oct_write import write_octopus_input
+from octopus_workflows.simple_oct_workflow import OctopusJob, _render_input
+
+format_version = 1
+
+
+def _open(file, mode: str):
+    """Open a sweep file, gzipped if its name ends in .gz."""
+    if str(file).endswith(".gz"):
+        return gzip.open(file, mode + "t", encoding="utf-8")
+    return open(file, mode, encoding="utf-8")
+
+
+def _render_lines(options: dict) -> List[list]:
+    """Input line(s) of each option, as [key, lines] pairs."""
+    return [
+        [key, write_octopus_input({key: value})]
+        for key, value in options.items()
+    ]
+
+
+def _input_layers(job: OctopusJob) -> tuple:
+    """Option dicts a job's inp is merged from. An input that was not
+    rendered by `ground_state_calculation` is a single layer of text."""
+    source = job._inp
+    # Compared by name, as the module may be imported under two names
+    if (
+        isinstance(source, functools.partial)
+        and getattr(source.func, "__name__", None) == _render_input.__name__
+    ):
+        return source.args[0]
+    return ({None: job.inp},)
+
+
+def _compact_dependencies(job: OctopusJob) -> dict:
+    """File dependencies, with the source alone where the destination is
+    in the job directory."""
+    compact = {}
+    for name, file in job.depends_on.items():
+        implied = {"source": file["source"], "dest": f"{job.directory}/{name}"}
+        compact[name] = file["source"] if file == implied else file
+    return compact
+
+
+def _ordered(keys: List[str], columns: Dict[str, int]) -> bool:
+    """Whether keys are in the order of the table's columns."""
+    positions = [columns.get(key, -1) for key in keys]
+    return -1 not in positions and positions == sorted(positions)
+
+
+class SweepTable:
+    """Jobs of a sweep, stored as shared input layers and per-job rows.
+
+    Build with `SweepTable.from_jobs`, or `SweepTable.load`.
+    """
+
+    def __init__(self, data: dict):
+        if data.get("format") != format_version:
+            raise ValueError(
+                f"Unsupported sweep table format: {data.get('format')}"
+            )
+        self.layers: List[List[list]] = data["layers"]
+        self.layer_sets: List[List[int]] = data["layer_sets"]
+        self.columns: List[dict] = data["columns"]
+        self.slurm_parts: List[List[str]] = data["slurm"]
+        self.rows: Dict[str, list] = data["jobs"]
+        # Job id: row
+        self._index = {job_id: i for i, job_id in enumerate(self.rows["id"])}
+
+    @classmethod
+    def from_jobs(cls, jobs: Dict[str, OctopusJob]) -> SweepTable:
+        """Table of jobs, in the format of `ground_state_calculation`.
+
+        The first option layer of each job, its matrix values, fills the
+        job's row. Its other layers are stored once per distinct content.
+        """
+        layers, layer_ids = [], {}
+        layer_sets, layer_set_ids = [], {}
+        columns, column_ids = [], {}
+        slurm_parts, slurm_ids = [], {}
+        rows = {
+            key: []
+            for key in [
+                "id",
+                "directory",
+                "hash",
+                "values",
+                "layer_set",
+                "slurm",
+                "depends_on",
+                "after",
+            ]
+        }
+        # Shared option dicts are rendered once
+        rendered: Dict[int, int] = {}
+
+        def layer_id(layer: dict) -> int:
+            if id(layer) in rendered:
+                return rendered[id(layer)]
+            if None in layer:
+                lines = [[None, layer[None]]]
+            else:
+                lines = _render_lines(layer)
+            key = json.dumps(lines)
+            if key not in layer_ids:
+                layer_ids[key] = len(layers)
+                layers.append(lines)
+            # Only dicts held by the jobs keep their id
+            if None not in layer:
+                rendered[id(layer)] = layer_ids[key]
+            return layer_ids[key]
+
+        for job_id, job in jobs.items():
+            delta, *shared = _input_layers(job)
+            if None in delta:
+                shared, delta = [delta], {}
+            # A row's keys are kept in column order. Otherwise, the job's
+            # matrix values are stored as a layer of their own
+            for key in delta:
+                if key not in column_ids:
+                    column_ids[key] = len(columns)
+                    columns.append({"key": key, "values": [], "ids": {}})
+            if not _ordered(list(delta), column_ids):
+                shared, delta = [delta, *shared], {}
+
+            values = [None] * len(columns)
+            for key, lines in _render_lines(delta):
+                column = columns[column_ids[key]]
+                if lines not in column["ids"]:
+                    column["ids"][lines] = len(column["values"])
+                    column["values"].append(lines)
+                values[column_ids[key]] = column["ids"][lines]
+
+            layer_set = tuple(layer_id(layer) for layer in shared)
+            if layer_set not in layer_set_ids:
+                layer_set_ids[layer_set] = len(layer_sets)
+                layer_sets.append(list(layer_set))
+
+            parts = tuple(job.slurm.split(f"oct_{job_id}"))
+            if parts not in slurm_ids:
+                slurm_ids[parts] = len(slurm_parts)
+                slurm_parts.append(list(parts))
+
+            depends_on = _compact_dependencies(job)
+
+            rows["id"].append(job_id)
+            rows["directory"].append(job.directory)
+            rows["hash"].append(job.hash)
+            rows["values"].append(values)
+            rows["layer_set"].append(layer_set_ids[layer_set])
+            rows["slurm"].append(slurm_ids[parts])
+            rows["depends_on"].append(depends_on)
+            rows["after"].append(list(job.after))
+
+        # Rows are padded to the final number of columns
+        for values in rows["values"]:
+            values.extend([None] * (len(columns) - len(values)))
+
+        return cls(
+            {
+                "format": format_version,
+                "layers": layers,
+                "layer_sets": layer_sets,
+                "columns": [
+                    {"key": c["key"], "values": c["values"]} for c in columns
+                ],
+                "slurm": slurm_parts,
+                "jobs": rows,
+            }
+        )
+
+    @classmethod
+    def load(cls, file) -> SweepTable:
+        with _open(file, "r") as fid:
+            return cls(json.load(fid))
+
+    def save(self, file):
+        """Save as JSON, gzipped if the file name ends in .gz."""
+        data = {
+            "format": format_version,
+            "layers": self.layers,
+            "layer_sets": self.layer_sets,
+            "columns": self.columns,
+            "slurm": self.slurm_parts,
+            "jobs": self.rows,
+        }
+        with _open(file, "w") as fid:
+            json.dump(data, fid, separators=(",", ":"))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    @property
+    def job_ids(self) -> List[str]:
+        return list(self._index)
+
+    def inp(self, job_id: str) -> str:
+        """Materialise the input of a job.
+
+        Layers are merged as `ground_state_calculation` merges them: the
+        job's matrix values first, then its shared layers in order.
+        """
+        i = self._index[job_id]
+        lines = {}
+        for column, value in zip(self.columns, self.rows["values"][i]):
+            if value is not None:
+                lines[column["key"]] = column["values"][value]
+        for layer in self.layer_sets[self.rows["layer_set"][i]]:
+            lines.update(self.layers[layer])
+        return "".join(lines.values())
+
+    def slurm(self, job_id: str) -> str:
+        """Materialise the Slurm script of a job."""
+        parts = self.slurm_parts[self.rows["slurm"][self._index[job_id]]]
+        return f"oct_{job_id}".join(parts)
+
+    def job(self, job_id: str) -> OctopusJob:
+        """Job, with its inp and slurm materialised on access."""
+        i = self._index[job_id]
+        directory = self.rows["directory"][i]
+        depends_on = {
+            name: (
+                {"source": file, "dest": f"{directory}/{name}"}
+                if isinstance(file, str)
+                else file
+            )
+            for name, file in self.rows["depends_on"][i].items()
+        }
+        return OctopusJob(
+            directory,
+            functools.partial(self.inp, job_id),
+            functools.partial(self.slurm, job_id),
+            self.rows["hash"][i],
+            depends_on,
+            after=list(self.rows["after"][i]),
+        )
+
+    def jobs(self, job_ids: List[str] = None) -> Dict[str, OctopusJob]:
+        """Jobs, in the format of `ground_state_calculation`.
+
+        :param job_ids: Subset of jobs. All by default.
+        """
+        if job_ids is None:
+            job_ids = self.job_ids
+        return {job_id: self.job(job_id) for job_id in job_ids}
+
+    def write(self, root="", job_ids: List[str] = None, **kwargs) -> dict:
+        """Materialise and write job directories, with
+        `job_writer.write_jobs`.
+
+        :param job_ids: Subset of jobs. All by default.
+        :param kwargs: Passed to `write_jobs`.
+        """
+        from octopus_workflows.job_writer import write_jobs
+
+        return write_jobs(self.jobs(job_ids), root, **kwargs)
+
+
+def main(argv: List[str] = None) -> int:
+    """Materialise jobs of a sweep table."""
+    parser = argparse.ArgumentParser(
+        description="Materialise jobs of a sweep table."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    materialise = subparsers.add_parser(
+        "materialise", help="Write job directories"
+    )
+    materialise.add_argument("sweep", help="Sweep table JSON")
+    materialise.add_argument("job_ids", nargs="*", help="All by default")
+    materialise.add_argument(
+        "--root", default="", help="Directory jobs are written to"
+    )
+    args = parser.parse_args(argv)
+
+    table = SweepTable.load(args.sweep)
+    table.write(args.root, args.job_ids or None, exist_ok=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
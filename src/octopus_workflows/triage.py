@@ -0,0 +1,196 @@
+""" Classify why the jobs of a sweep failed, from their logs.
+
+All rules are compiled into a single regular expression, with one named
+group per rule, such that each log is scanned once. Only the tail of each
+log is scanned, as Octopus and Slurm report fatal errors last; large logs
+are memory-mapped rather than read.
+
+Rules are plain data, in the same spirit as `file_rules`: a dict of
+category: pattern, in order of priority. When several rules match a log,
+the job is classified by the first.
+"""
+from __future__ import annotations
+
+import hashlib
+import mmap
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List
+
+from octopus_workflows import cache
+
+failure_rules = {
+    "walltime": rb"DUE TO TIME LIMIT",
+    "node_failure": rb"DUE TO NODE FAIL|NODE_FAIL",
+    "preempted": rb"DUE TO PREEMPTION",
+    "oom": rb"(?i:out[- ]of[- ]memory|oom[-_ ]kill)",
+    "cuda_error": rb"CUDA error|CUDA_ERROR|cudaError|CUBLAS_STATUS|CUFFT_",
+    "missing_pseudopotential": (
+        rb"(?i:pseudopotential file[^\n]{0,200}(?:not found|could not|cannot))"
+        rb"|(?i:cannot open[^\n]{0,200}\.(?:upf|psp8|psf))"
+    ),
+    "parse_error": rb"Parser error|(?i:syntax error)|Input error",
+    "segfault": rb"Segmentation fault|SIGSEGV",
+    "scf_not_converged": rb"SCF \*?not\*? converged",
+}
+
+# Logs scanned in each job directory
+log_patterns = ["std.out", "std.err", "slurm-*.out"]
+
+_cache_tag = "triage"
+
+# Files larger than this are memory-mapped
+_mmap_size = 1 << 20
+
+
+class FailureMatcher:
+    """Single compiled matcher over a set of rules.
+
+    :param rules: Category: bytes pattern, in order of priority.
+    :param tail_bytes: Number of bytes scanned from the end of each file.
+    """
+
+    def __init__(self, rules: Dict[str, bytes] = None, tail_bytes=1 << 16):
+        self.rules = failure_rules if rules is None else rules
+        self.categories = list(self.rules)
+        self.tail_bytes = tail_bytes
+        self.pattern = re.compile(
+            b"|".join(
+                b"(?P<r%d>%s)" % (i, pattern)
+                for i, pattern in enumerate(self.rules.values())
+            )
+        )
+
+    @property
+    def signature(self) -> str:
+        """Hash of the rules and tail size, to invalidate cached results."""
+        sha1_hash = hashlib.sha1(str(self.tail_bytes).encode("utf-8"))
+        for category, pattern in self.rules.items():
+            sha1_hash.update(category.encode("utf-8") + b"\0" + pattern)
+        return sha1_hash.hexdigest()[:16]
+
+    def _matches(self, buffer, start: int) -> Dict[str, str]:
+        matches = {}
+        for match in self.pattern.finditer(buffer, start):
+            category = self.categories[int(match.lastgroup[1:])]
+            if category not in matches:
+                # Full line containing the match
+                begin = buffer.rfind(b"\n", start, match.start()) + 1
+                end = buffer.find(b"\n", match.end())
+                line = buffer[begin : end if end >= 0 else len(buffer)]
+                matches[category] = line.decode("utf-8", "replace").strip()
+        return matches
+
+    def scan(self, file) -> Dict[str, str]:
+        """Categories matched in the tail of a file.
+
+        :return: Category: first matching line, in order of priority.
+        """
+        with open(file, "rb") as fid:
+            size = fid.seek(0, 2)
+            start = max(size - self.tail_bytes, 0)
+            if size == 0:
+                return {}
+            if size > _mmap_size:
+                with mmap.mmap(fid.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    matches = self._matches(mm, start)
+            else:
+                fid.seek(0)
+                matches = self._matches(fid.read(), start)
+        return {c: matches[c] for c in self.categories if c in matches}
+
+
+def job_logs(directory) -> List[Path]:
+    """Log files of a job directory."""
+    logs = []
+    for pattern in log_patterns:
+        logs.extend(sorted(Path(directory).glob(pattern)))
+    return logs
+
+
+def triage_sweep(
+    root,
+    directories: List[str] = None,
+    matcher: FailureMatcher = None,
+    use_cache=True,
+    max_workers=None,
+) -> dict:
+    """Classify every job of a sweep.
+
+    Results are cached per log file in a JSON sidecar inside root,
+    .logs.triage.<signature>.json, keyed by the rules, and re-used for logs
+    whose size and mtime are unchanged.
+
+    :param root: Directory the jobs were written to.
+    :param directories: Job directories, relative to root. Defaults to
+    every sub-directory containing an inp file.
+    :param matcher: Defaults to a matcher over `failure_rules`.
+    :param max_workers: Maximum number of threads.
+    :return: Dict of columns: 'job', 'category' (None if no rule matched),
+    'file' and 'line' of the match, and 'categories', all matched
+    categories.
+    """
+    root = Path(root)
+    if directories is None:
+        directories = sorted(p.parent.name for p in root.glob("*/inp"))
+    if matcher is None:
+        matcher = FailureMatcher()
+
+    # Sidecar inside the sweep directory, keyed by the rules, such that
+    # sweeps sharing a parent directory have separate caches
+    sidecar = Path(root, "logs")
+    cached = {}
+    if use_cache:
+        cached = cache.load_json(sidecar, _cache_tag, matcher.signature) or {}
+
+    logs = {d: job_logs(Path(root, d)) for d in directories}
+    files = [log for d in directories for log in logs[d]]
+    keys = [str(log.relative_to(root)) for log in files]
+
+    def scan(file: Path, key: str):
+        signature = cache.file_signature(file)
+        entry = cached.get(key)
+        if entry is not None and entry[0] == signature:
+            return entry
+        return [signature, matcher.scan(file)]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = dict(zip(keys, executor.map(scan, files, keys)))
+
+    if use_cache and results != cached:
+        cache.save_json(sidecar, _cache_tag, matcher.signature, results)
+
+    table = {
+        "job": [],
+        "category": [],
+        "file": [],
+        "line": [],
+        "categories": [],
+    }
+    for directory in directories:
+        matches = {}
+        for log in logs[directory]:
+            key = str(log.relative_to(root))
+            for category, line in results[key][1].items():
+                matches.setdefault(category, (key, line))
+        categories = [c for c in matcher.categories if c in matches]
+        category = categories[0] if categories else None
+        file, line = matches[category] if category else (None, None)
+        table["job"].append(directory)
+        table["category"].append(category)
+        table["file"].append(file)
+        table["line"].append(line)
+        table["categories"].append(categories)
+    return table
+
+
+def triage_summary(table: dict) -> Dict[str | None, List[str]]:
+    """Jobs per failure category, from the table of `triage_sweep`.
+
+    Jobs that match no rule are listed under None.
+    """
+    summary = {}
+    for job, category in zip(table["job"], table["category"]):
+        summary.setdefault(category, []).append(job)
+    return summary
@@ -1,7 +1,148 @@
-import itertools
+import importlib.util
+import sys
+from collections import ChainMap
+from types import ModuleType
+from typing import Callable, List, Tuple
 
 
-def cartesian_product(matrix: dict):
+def lazy_import(name: str) -> ModuleType:
+    """Import a top-level module, deferring its execution until the first
+    attribute access.
+
+    Heavy dependencies are imported this way, such that light paths like
+    parsing, hashing and writing inputs do not pay for them at start-up.
+    Submodules of a lazy package, such as scipy.linalg, cannot be deferred
+    this way, as finding them executes the package: import them within the
+    functions that use them instead.
+
+    :param name: Module name, without dots.
+    :return: Module, or its lazy placeholder.
+    """
+    if "." in name:
+        raise ValueError(
+            f"Only top-level modules can be lazily imported: {name}"
+        )
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def expand_matrix(
+    matrix: dict, constraints: List[Callable] = None, static: dict = None
+) -> Tuple[List[dict], int]:
+    """Expand a matrix of options into all feasible combinations.
+
+    A key may be a tuple of option names, to zip options that vary
+    together. Each value is then a tuple with one entry per name:
+
+    {('supercell', 'KPointsGrid'): [([1, 1, 1], [[4, 4, 4]]),
+                                    ([2, 2, 2], [[2, 2, 2]])],
+     'Mixing': [0.1, 0.3]}
+
+    gives 4 combinations rather than 8. Zipped options are unzipped in the
+    returned combinations.
+
+    Constraints are predicates that take a combination and return False if
+    it is infeasible. They are evaluated lazily, as soon as every option
+    they index has been assigned, such that whole branches of the product
+    are pruned without being generated. Predicates must index options as
+    combination[key], as a KeyError is used to defer evaluation:
+
+    lambda opt: not (opt['MixingScheme'] == 'linear' and opt['MixingKerker'] == 'yes')
+
+    Options fixed for every combination may be given as static, for
+    constraints to index. They are not included in the returned
+    combinations, and options of the matrix take precedence over them.
+
+    :param matrix: Dict of option: values.
+    :param constraints: Predicates that combinations must satisfy.
+    :param static: Options fixed for every combination.
+    :return: Feasible combinations, in the order of the full product, and
+    the number of combinations pruned.
+    """
+    axes = []
+    for key, values in matrix.items():
+        if isinstance(key, tuple):
+            for value in values:
+                if len(value) != len(key):
+                    raise ValueError(
+                        f"Zipped axis {key} has a value of length "
+                        f"{len(value)}: {value}"
+                    )
+            axes.append((key, [tuple(value) for value in values]))
+        else:
+            axes.append(((key,), [(value,) for value in values]))
+
+    # Number of full combinations below each depth of the product
+    n_below = [1] * len(axes)
+    for depth in range(len(axes) - 2, -1, -1):
+        n_below[depth] = n_below[depth + 1] * len(axes[depth + 1][1])
+
+    combinations = []
+    n_pruned = 0
+    partial = {}
+    # Combination seen by the constraints. Static options also in the
+    # matrix are hidden, such that constraints on them are deferred
+    matrix_keys = {key for keys, _ in axes for key in keys}
+    static = {k: v for k, v in (static or {}).items() if k not in matrix_keys}
+    view = ChainMap(partial, static) if static else partial
+
+    def evaluate(constraint: Callable) -> bool:
+        """Evaluate a constraint on a complete combination."""
+        try:
+            return bool(constraint(view))
+        except KeyError as error:
+            raise ValueError(
+                f"Constraint {getattr(constraint, '__name__', constraint)} "
+                f"indexes an option in neither the matrix nor the static "
+                f"options: {error.args[0] if error.args else error}"
+            ) from error
+
+    def expand(depth: int, pending: List[Callable]):
+        nonlocal n_pruned
+        if depth == len(axes):
+            if all(evaluate(constraint) for constraint in pending):
+                combinations.append(dict(partial))
+            else:
+                n_pruned += 1
+            return
+
+        keys, values = axes[depth]
+        for value in values:
+            partial.update(zip(keys, value))
+            deferred = []
+            feasible = True
+            for constraint in pending:
+                try:
+                    feasible = bool(constraint(view))
+                except KeyError:
+                    deferred.append(constraint)
+                    continue
+                if not feasible:
+                    break
+            if feasible:
+                expand(depth + 1, deferred)
+            else:
+                n_pruned += n_below[depth]
+        for key in keys:
+            partial.pop(key, None)
+
+    expand(0, list(constraints or []))
+    return combinations, n_pruned
+
+
+def cartesian_product(
+    matrix: dict, constraints: List[Callable] = None, static: dict = None
+):
     """Create all combinations of options, where the dict
     keys define the options and the values define the
     specific values that the optionals should take.
@@ -11,18 +152,13 @@ def cartesian_product(matrix: dict):
     {'Eigensolver': ['rmmdiis', 'chebyshev_filter'],
      'EigensolverTolerance':'1e-7'}
 
-    with no nesting of containers in values.
+    with no nesting of containers in values. See `expand_matrix` for
+    zipped options and constraints.
 
     :param matrix:
+    :param constraints: Predicates that combinations must satisfy.
+    :param static: Options fixed for every combination, that constraints
+    may index.
     :return:
     """
-    # Get all possible combinations
-    combinations = list(itertools.product(*matrix.values()))
-
-    # Create a list of dictionaries by pairing each key with its corresponding value from the combinations
-    all_option_permutations = [
-        {key: value for key, value in zip(matrix.keys(), combination)}
-        for combination in combinations
-    ]
-
-    return all_option_permutations
+    return expand_matrix(matrix, constraints, static)[0]
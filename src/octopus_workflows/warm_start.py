@@ -0,0 +1,225 @@
+""" Warm-start sweeps: seed the SCF of each job from a converged neighbour.
+
+One reference job per system writes restart data. Its sibling jobs wait for
+the reference to complete (Slurm afterok), copy its ground-state restart
+data when they start, and restart the SCF from it rather than from scratch.
+
+Only suitable where the starting guess is not what is being studied, such as
+scans over mixing parameters. Restart data can only be read on the same grid,
+so siblings must share the reference's Spacing and cell.
+"""
+from __future__ import annotations
+
+import functools
+import posixpath
+from typing import Callable, Dict, List
+
+from octopus_workflows.components import (
+    directory_names,
+    set_job_file_dependencies,
+)
+from octopus_workflows.sharding import select_shard
+from octopus_workflows.simple_oct_workflow import (
+    OctopusJob,
+    _render,
+    ground_state_calculation,
+)
+from octopus_workflows.utils import expand_matrix
+
+restart_dir = "restart/gs"
+
+reference_options = {"RestartWrite": "yes"}
+sibling_options = {"RestartWrite": "no", "FromScratch": "no"}
+
+
+def restart_rule(reference: str) -> Callable:
+    """File rule for the ground-state restart data of a reference job,
+    in the format expected by `set_job_file_dependencies`."""
+
+    def rule(input_string: str) -> dict:
+        return {restart_dir: f"{reference}/{restart_dir}"}
+
+    return rule
+
+
+_submit_dir = "cd ${SLURM_SUBMIT_DIR}\n"
+
+
+def _insert_copies(slurm, commands: str, directory: str) -> str:
+    """Render a Slurm script, with commands inserted after it changes to
+    the submit directory."""
+    script = _render(slurm)
+    if _submit_dir not in script:
+        raise ValueError(
+            f"Slurm script of {directory} does not change to the submit "
+            f"directory, with {_submit_dir.strip()}"
+        )
+    return script.replace(_submit_dir, _submit_dir + commands, 1)
+
+
+def _copy_on_start(job: OctopusJob):
+    """Copy dependencies produced by other jobs at the start of the job.
+
+    Paths are relative to the job directory, from which it is submitted.
+    Commands are inserted after the script changes to it, when the script
+    is rendered.
+    """
+    commands = ""
+    for name, file in job.depends_on.items():
+        if "after" in file:
+            source = posixpath.relpath(file["source"], job.directory)
+            commands += (
+                f"mkdir -p $(dirname {name}) && cp -r {source} {name}\n"
+            )
+    job.slurm = functools.partial(
+        _insert_copies, job._slurm, commands, job.directory
+    )
+
+
+def warm_start_calculation(
+    matrix: dict,
+    static_options: dict,
+    system_key: str,
+    constraints: List[Callable] = None,
+    **workflow_options,
+) -> Dict[str, OctopusJob]:
+    """Sweep in which jobs of the same system are chained to a reference.
+
+    The reference of each system is its first permutation, in matrix order.
+    When sharded, each system's reference and siblings are kept in the same
+    shard, assigned as `sharding.shard_jobs` assigns chains of jobs.
+
+    :param matrix: Sweep matrix, in the format of `ground_state_calculation`.
+    :param static_options: Options fixed for all calculations.
+    :param system_key: Matrix key of the systems.
+    :param constraints: Predicates that permutations must satisfy.
+    :param workflow_options: Passed to `ground_state_calculation`, for
+    example meta_value_ops, file_rules, slurm_settings and binary_path.
+    shard_index, num_shards and shard_cost select the shard to generate.
+    :return: Jobs, in the format of `ground_state_calculation`, with the
+    reference of each sibling in `OctopusJob.after`.
+    """
+    shard_index = workflow_options.pop("shard_index", 0)
+    num_shards = workflow_options.pop("num_shards", 1)
+    shard_cost = workflow_options.pop("shard_cost", None)
+
+    options, _ = expand_matrix(matrix, constraints, static_options)
+    job_ids = directory_names(options)
+
+    # Jobs of each system, the first of which is its reference
+    systems: Dict[str, List[str]] = {}
+    system = {}
+    for opt, job_id in zip(options, job_ids):
+        key = directory_names([{system_key: opt[system_key]}])[0]
+        systems.setdefault(key, []).append(job_id)
+        system[job_id] = key
+    references = {key: ids[0] for key, ids in systems.items()}
+
+    # Shard whole systems, such that siblings run where their reference does
+    selected = set(job_ids)
+    if num_shards > 1:
+        roots = list(references.values())
+        costs = None
+        if shard_cost is not None:
+            cost = dict(zip(job_ids, map(shard_cost, options)))
+            costs = [sum(cost[i] for i in systems[system[r]]) for r in roots]
+        selected = {
+            job_id
+            for i in select_shard(roots, shard_index, num_shards, costs)
+            for job_id in systems[system[roots[i]]]
+        }
+    reference_ids = selected & set(references.values())
+    sibling_ids = selected - reference_ids
+
+    keys = list(options[0]) if options else []
+
+    # Jobs are identified by id, as values such as blocks are not hashable.
+    # Indexes every key, so is only evaluated on complete permutations
+    def job_id_of(opt) -> str:
+        return directory_names([{k: opt[k] for k in keys}])[0]
+
+    def is_reference(opt) -> bool:
+        return job_id_of(opt) in reference_ids
+
+    def is_sibling(opt) -> bool:
+        return job_id_of(opt) in sibling_ids
+
+    constraints = list(constraints or [])
+
+    jobs = ground_state_calculation(
+        matrix,
+        {**static_options, **reference_options},
+        constraints=constraints + [is_reference],
+        **workflow_options,
+    )
+    siblings = ground_state_calculation(
+        matrix,
+        {**static_options, **sibling_options},
+        constraints=constraints + [is_sibling],
+        **workflow_options,
+    )
+
+    for job_id, job in siblings.items():
+        reference = references[system[job_id]]
+        restart = set_job_file_dependencies(
+            job.inp, job_id, [restart_rule(reference)]
+        )
+        for file in restart.values():
+            file["after"] = reference
+        job.depends_on.update(restart)
+        job.after.append(reference)
+        _copy_on_start(job)
+
+    # Preserve the order of the full sweep
+    jobs.update(siblings)
+    return {job_id: jobs[job_id] for job_id in job_ids if job_id in selected}
+
+
+def submission_order(after: Dict[str, List[str]]) -> List[str]:
+    """Order in which jobs are submitted, such that every job is submitted
+    after the jobs it depends on.
+
+    :param after: Job id: ids of the jobs it waits on, in sweep order.
+    :return: Job ids.
+    """
+    order = []
+    submitted = set()
+    remaining = list(after)
+    while remaining:
+        ready = [
+            job_id
+            for job_id in remaining
+            if all(dep in submitted for dep in after[job_id])
+        ]
+        if not ready:
+            raise ValueError(
+                f"Cyclic or missing job dependencies: {remaining}"
+            )
+        order += ready
+        submitted.update(ready)
+        remaining = [job_id for job_id in remaining if job_id not in ready]
+    return order
+
+
+def submission_script(jobs: Dict[str, OctopusJob]) -> str:
+    """Shell script that submits all jobs from the sweep root, such that
+    each job waits on the jobs in its `after` list.
+
+    :param jobs: Jobs, as written by `OctopusJob.write`.
+    :return: Script string.
+    """
+    ids = {job_id: f"job_{i}" for i, job_id in enumerate(jobs)}
+    lines = ["#!/bin/bash", "set -e"]
+
+    for job_id in submission_order({k: job.after for k, job in jobs.items()}):
+        job = jobs[job_id]
+        dependency = ""
+        if job.after:
+            after = ":".join(f"${{{ids[dep]}}}" for dep in job.after)
+            dependency = f" --dependency=afterok:{after}"
+        lines.append(
+            f"{ids[job_id]}=$(cd {job.directory} && "
+            f"sbatch --parsable{dependency} slurm.sh)"
+        )
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,79 @@
+import math
+from pathlib import Path
+
+from src.octopus_workflows.adaptive_search import SuccessiveHalving, iterations_score, runtime_score
+from tests.test_oct_profiling import write_ranks
+
+
+def test_successive_halving(tmp_path):
+    matrix = {
+        "system": [f"sys{i}" for i in range(9)],
+        "Mixing": [0.1, 0.2, 0.3],
+        "ChebyshevFilterDegree": [8, 16, 24],
+    }
+
+    # Synthetic number of SCF iterations, minimised by Mixing = 0.2 and degree 16.
+    # The final system fails to converge for large mixing
+    def score(root: Path) -> float:
+        system, mixing, degree = root.name.split("_")
+        if system == "sys8" and float(mixing) > 0.25:
+            return math.inf
+        return 20 + 100 * abs(float(mixing) - 0.2) + abs(int(degree) - 16) + int(system[3:])
+
+    search = SuccessiveHalving(matrix, {"CalculationMode": "gs"}, "system", eta=3, min_budget=1, score=score)
+    n_batches = 0
+    while not search.done:
+        jobs = search.next_batch()
+        assert jobs
+        assert all(job.inp.startswith("system = sys") for job in jobs.values())
+        n_batches += 1
+        assert search.update(tmp_path) == len(jobs)
+
+    # Rungs of 9 x 1, 3 x 3 and 1 x 9 (system, candidate) pairs, with earlier results reused
+    assert n_batches == 3
+    assert search.best() == ({"Mixing": 0.2, "ChebyshevFilterDegree": 16}, 24.0)
+    report = search.report()
+    assert report["n_jobs"] == 9 + 3 * 2 + 6
+    assert report["fraction"] < 0.3
+
+
+def test_successive_halving_pending_and_restore(tmp_path):
+    matrix = {"system": ["a", "b", "c"], "Mixing": [0.1, 0.3]}
+    search = SuccessiveHalving(matrix, {}, "system", eta=2, score=lambda root: None)
+    jobs = search.next_batch()
+    assert set(jobs) == {"a_0.1", "a_0.3"}
+
+    # Jobs still running: nothing is scored or re-submitted
+    assert search.update(tmp_path) == 0
+    assert search.next_batch() == {}
+
+    search.save(tmp_path / "state.json")
+    restored = SuccessiveHalving(matrix, {}, "system", eta=2, score=lambda root: None)
+    restored.restore(tmp_path / "state.json")
+    assert restored.pending == search.pending
+
+    assert restored.update(tmp_path, missing_as_failed=True) == 2
+    assert restored.rung == 1
+    assert set(restored.next_batch()) == {"b_0.1"}
+
+
+def test_iterations_score(tmp_path):
+    assert iterations_score(tmp_path) is None
+    Path(tmp_path, "static").mkdir()
+    info = Path(tmp_path, "static/info")
+    info.write_text("SCF converged in   17 iterations\n")
+    assert iterations_score(tmp_path) == 17.0
+    info.write_text("Some other output\n")
+    assert iterations_score(tmp_path) == math.inf
+
+
+def test_runtime_score(tmp_path):
+    assert runtime_score(tmp_path) is None
+    Path(tmp_path, "static").mkdir()
+    Path(tmp_path, "static/info").write_text("SCF converged in   17 iterations\n")
+    # Finished without profiling: never pending
+    assert runtime_score(tmp_path) == math.inf
+
+    write_ranks(tmp_path, [(10.0, 1.0), (9.0, 1.0)])
+    assert runtime_score(tmp_path) == 12.0
+    assert runtime_score(tmp_path, region="MISSING_REGION") == math.inf
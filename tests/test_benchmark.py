@@ -0,0 +1,65 @@
+import json
+
+from src.octopus_workflows.benchmark import BenchmarkSuite, compare_results, main, measure
+
+
+def test_measure():
+    calls = []
+
+    def func(lst):
+        lst.append(1)
+        calls.append(lst)
+        return [0] * 10000
+
+    result = measure(func, setup=lambda: ([],), repeat=3)
+
+    # Fresh arguments per call, including the memory measurement
+    assert len(calls) == 4
+    assert all(lst == [1] for lst in calls)
+    assert 0 < result['min'] <= result['median']
+    assert result['repeat'] == 3
+    assert result['peak_memory'] >= 10000 * 8
+
+    assert measure(lambda: None, memory=False)['peak_memory'] is None
+
+
+def test_benchmark_suite(tmp_path):
+    suite = BenchmarkSuite(repeat=2, memory=False, select='sum')
+    suite.run('sum[small]', sum, lambda: ([1, 2],))
+    suite.run('sum[error]', sum, lambda: (['a'],))
+    suite.run('max[small]', max, lambda: ([1, 2],))
+
+    assert set(suite.results) == {'sum[small]', 'sum[error]'}
+    assert suite.results['sum[error]']['error'].startswith('TypeError')
+
+    suite.save(tmp_path / 'results.json')
+    with open(tmp_path / 'results.json') as fid:
+        results = json.load(fid)
+    assert set(results) == {'metadata', 'benchmarks'}
+    assert 'python' in results['metadata']
+
+
+def results(times: dict) -> dict:
+    return {'metadata': {},
+            'benchmarks': {name: {'min': t, 'peak_memory': 100} for name, t in times.items()}}
+
+
+def test_compare_results():
+    baseline = results({'a': 1.0, 'b': 1.0, 'noisy': 1.e-6, 'removed': 1.0})
+    current = results({'a': 1.5, 'b': 1.05, 'noisy': 1.e-5, 'new': 1.0})
+
+    records = compare_results(baseline, current, threshold=0.2)
+
+    assert [r['name'] for r in records] == ['noisy', 'a', 'b']
+    regressions = {r['name']: r['regression'] for r in records}
+    assert regressions == {'a': True, 'b': False, 'noisy': False}
+
+
+def test_compare_command(tmp_path, capsys):
+    for name, times in [('baseline', {'a': 1.0}), ('fast', {'a': 0.9}), ('slow', {'a': 2.0})]:
+        with open(tmp_path / f'{name}.json', 'w') as fid:
+            json.dump(results(times), fid)
+
+    assert main([str(tmp_path / 'baseline.json'), str(tmp_path / 'fast.json')]) == 0
+    assert main([str(tmp_path / 'baseline.json'), str(tmp_path / 'slow.json')]) == 1
+    assert 'REGRESSION' in capsys.readouterr().out
@@ -0,0 +1,130 @@
+import os
+import signal
+import subprocess
+import shutil
+import time
+import zipfile
+
+import pytest
+
+from src.octopus_workflows.bundle import Bundle, launch_script, write_bundle
+from src.octopus_workflows.simple_oct_workflow import ground_state_calculation
+from src.octopus_workflows.warm_start import warm_start_calculation
+from workflows.kerker_comparison.settings import file_to_oct_dict, find_pseudopotential
+
+from tests.test_job_writer import assert_same_trees
+
+structures = "data/benchmark_structures"
+
+
+def sweep_jobs():
+    matrix = {'^system_files': [f'{structures}/TiO2', f'{structures}/Si'], 'Mixing': [0.1, 0.2, 0.3]}
+    return ground_state_calculation(matrix, {'CalculationMode': 'gs'},
+                                    meta_value_ops={'^system_files': file_to_oct_dict},
+                                    file_rules=[find_pseudopotential])
+
+
+def test_bundle_round_trip(tmp_path):
+    jobs = sweep_jobs()
+    for job in jobs.values():
+        job.write(root=tmp_path / 'tree')
+
+    report = write_bundle(jobs, tmp_path / 'sweep.zip')
+    # Pseudopotentials are stored once, for the 3 TiO2 jobs
+    assert report['jobs'] == 6 and report['dependencies'] == 2 and report['files'] == 6 * 3 + 2
+    with zipfile.ZipFile(tmp_path / 'sweep.zip') as archive:
+        assert len([name for name in archive.namelist() if name.endswith('.UPF')]) == 2
+
+    with Bundle(tmp_path / 'sweep.zip') as bundle:
+        assert bundle.job_ids == list(jobs)
+        assert bundle.read('Si_0.2', 'inp').decode() == jobs['Si_0.2'].inp
+        assert bundle.read('TiO2_0.3', 'Ti.UPF') == (tmp_path / 'tree' / 'TiO2_0.1' / 'Ti.UPF').read_bytes()
+
+        bundle.extract(tmp_path / 'extracted')
+        assert_same_trees(tmp_path / 'tree', tmp_path / 'extracted')
+
+        restored = bundle.jobs()
+        assert all(restored[id].inp == jobs[id].inp and restored[id].slurm == jobs[id].slurm
+                   and restored[id].hash == jobs[id].hash and restored[id].depends_on == jobs[id].depends_on
+                   for id in jobs)
+
+
+def test_bundle_warm_start(tmp_path):
+    jobs = warm_start_calculation({'system': ['Si', 'NiO'], 'Mixing': [0.1, 0.2]}, {}, 'system')
+    write_bundle(jobs, tmp_path / 'sweep.zip')
+
+    with Bundle(tmp_path / 'sweep.zip') as bundle:
+        assert bundle.index['NiO_0.2']['after'] == ['NiO_0.1']
+        assert 'restart/gs' not in bundle.index['NiO_0.2']['files']
+        launch = zipfile.ZipFile(tmp_path / 'sweep.zip').read('.launch/NiO_0.2.sh').decode()
+        script = bundle.submission_script()
+
+    # Restart data are copied from the reference, then onto scratch, before the run
+    signal = '#SBATCH --signal              B:TERM@120\n'
+    assert launch.replace(signal, '').startswith(jobs['NiO_0.2'].slurm.rsplit('\n', 1)[0])
+    assert launch.index('cp -r ../NiO_0.1/restart/gs restart/gs') < \
+           launch.index('cp -r restart/gs ${scratch}/restart/gs') < launch.index('cd ${scratch}\nsrun octopus')
+
+    lines = script.splitlines()
+    assert lines[2] == 'export OCT_BUNDLE=$(pwd)/sweep.zip'
+    assert lines[3] == 'job_0=$(mkdir -p Si_0.1 && cd Si_0.1 && unzip -p ${OCT_BUNDLE} .launch/Si_0.1.sh | sbatch --parsable)'
+    assert 'job_3=$(mkdir -p NiO_0.2 && cd NiO_0.2 && unzip -p ${OCT_BUNDLE} .launch/NiO_0.2.sh | ' \
+           'sbatch --parsable --dependency=afterok:${job_2})' in lines
+
+
+@pytest.mark.skipif(shutil.which('unzip') is None, reason='Requires unzip')
+def test_launch_unpacks_on_scratch(tmp_path):
+    jobs = sweep_jobs()
+    write_bundle(jobs, tmp_path / 'sweep.zip')
+    with zipfile.ZipFile(tmp_path / 'sweep.zip') as archive:
+        launch = archive.read('.launch/TiO2_0.2.sh').decode()
+
+    # Run in place of octopus: list the unpacked files
+    launch = launch.replace('srun octopus > std.out', 'ls > files.txt')
+    submit_dir = tmp_path / 'TiO2_0.2'
+    submit_dir.mkdir()
+    env = {**os.environ, 'SLURM_SUBMIT_DIR': str(submit_dir), 'SLURM_JOB_ID': '1',
+           'OCT_SCRATCH': str(tmp_path / 'scratch')}
+    subprocess.run(['sh', '-c', launch], cwd=submit_dir, env=env, check=True)
+
+    assert (tmp_path / 'scratch' / 'oct_1' / 'inp').read_text() == jobs['TiO2_0.2'].inp
+    # Results are copied back to the job directory
+    assert (submit_dir / 'files.txt').read_text().split() == ['O.UPF', 'Ti.UPF', 'files.txt', 'hash.txt', 'inp']
+
+
+def test_launch_script_run_command():
+    entry = {'directory': 'Si_0.1', 'files': {'inp': 'Si_0.1/inp'}}
+    slurm = '#!/bin/sh\ncd ${SLURM_SUBMIT_DIR}\nmpirun -np 4 octopus > std.out\necho done\n'
+    launch = launch_script(slurm, entry, {}, '../sweep.zip')
+    assert launch.startswith('#!/bin/sh\n#SBATCH --signal              B:TERM@120\ncd ${SLURM_SUBMIT_DIR}\n# Unpack')
+    assert launch.endswith('cd ${scratch}\nmpirun -np 4 octopus > std.out &\nrun_pid=$!\nwait ${run_pid}\necho done\n')
+
+    # An existing signal request is kept
+    launch = launch_script('#!/bin/sh\n#SBATCH --signal=B:USR1@60\n' + slurm[10:], entry, {}, '../sweep.zip')
+    assert launch.count('--signal') == 1
+
+    with pytest.raises(ValueError, match='Si_0.1'):
+        launch_script('#!/bin/sh\ncd ${SLURM_SUBMIT_DIR}\n', entry, {}, '../sweep.zip')
+
+
+@pytest.mark.skipif(shutil.which('unzip') is None, reason='Requires unzip')
+def test_launch_copies_back_on_walltime(tmp_path):
+    jobs = sweep_jobs()
+    write_bundle(jobs, tmp_path / 'sweep.zip')
+    with zipfile.ZipFile(tmp_path / 'sweep.zip') as archive:
+        launch = archive.read('.launch/TiO2_0.2.sh').decode()
+
+    # Killed by Slurm before the run completes
+    launch = launch.replace('srun octopus > std.out', 'echo partial > std.out; sleep 30')
+    submit_dir = tmp_path / 'TiO2_0.2'
+    submit_dir.mkdir()
+    env = {**os.environ, 'SLURM_SUBMIT_DIR': str(submit_dir), 'SLURM_JOB_ID': '1',
+           'OCT_SCRATCH': str(tmp_path / 'scratch')}
+    process = subprocess.Popen(['sh', '-c', launch], cwd=submit_dir, env=env)
+    output = tmp_path / 'scratch' / 'oct_1' / 'std.out'
+    deadline = time.monotonic() + 10
+    while not output.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=10) == 143
+    assert (submit_dir / 'std.out').read_text() == 'partial\n'
@@ -84,3 +84,15 @@ def test_directory_generation():
     expected_dir_names = ['1ALA_1.0_0.3', '1ALA_2.0_0.3']
     dir_names = directory_generation(matrix)
     assert dir_names == expected_dir_names
+
+
+def test_directory_generation_constraints():
+    matrix = {('supercell', 'KPointsGrid'): [([1, 1, 1], [[4, 4, 4]]), ([2, 2, 2], [[2, 2, 2]])],
+              'Mixing': [0.1, 0.3]}
+    dir_names = directory_generation(matrix, constraints=[lambda opt: opt['Mixing'] < 0.2])
+    assert dir_names == ['[1, 1, 1]_[[4, 4, 4]]_0.1', '[2, 2, 2]_[[2, 2, 2]]_0.1']
+
+
+def test_directory_generation_int_values():
+    matrix = {'^system_files': ['benchmark_structures/1ALA'], 'ChebyshevFilterDegree': [8, 16]}
+    assert directory_generation(matrix) == ['1ALA_8', '1ALA_16']
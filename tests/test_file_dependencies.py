@@ -0,0 +1,90 @@
+import re
+
+import pytest
+
+from src.octopus_workflows.file_dependencies import DependencyIndex, FileRule
+from src.octopus_workflows.simple_oct_workflow import ground_state_calculation
+from workflows.kerker_comparison.settings import file_to_oct_dict, find_pseudopotential
+
+structures = "data/benchmark_structures"
+
+
+def counted(rule):
+    calls = []
+
+    def wrapper(input_string):
+        calls.append(input_string)
+        return rule(input_string)
+
+    return wrapper, calls
+
+
+def test_file_rule_fragment():
+    rule = FileRule(find_pseudopotential, keys=['Species'])
+    options = {'Spacing': 0.3,
+               'species': [['"Ti"', 'species_pseudo', 'file', '"Ti.UPF"']]}
+    assert rule.fragment(options) == '%species\n"Ti" | species_pseudo | file | "Ti.UPF" \n%\n'
+    assert rule(rule.fragment(options)) == {'Ti.UPF': f'{structures}/Ti.UPF'}
+    assert rule.fragment({'Spacing': 0.3}) == ''
+
+
+def test_dependency_index_memoised():
+    find, calls = counted(find_pseudopotential)
+    index = DependencyIndex([FileRule(find, keys=['Species'])])
+    species = [['"O"', 'species_pseudo', 'file', '"O.UPF"']]
+
+    for mixing in [0.1, 0.2, 0.3]:
+        files = index.job_dependencies({'Mixing': mixing, 'Species': species}, '', f'TiO2_{mixing}')
+        assert files == {'O.UPF': {'source': f'{structures}/O.UPF', 'dest': f'TiO2_{mixing}/O.UPF'}}
+    assert len(calls) == 1 and index.n_evaluations == 1
+
+    # Plain rules see the full input of every job
+    plain, plain_calls = counted(lambda inp: {})
+    index = DependencyIndex([plain])
+    for mixing in [0.1, 0.2]:
+        index.job_dependencies({}, f'Mixing = {mixing}\n', str(mixing))
+    assert plain_calls == ['Mixing = 0.1\n', 'Mixing = 0.2\n']
+
+
+def test_missing_files_validated_once():
+    index = DependencyIndex([lambda inp: {'X.UPF': 'missing/X.UPF'} if 'X' in inp else {}])
+    index.job_dependencies({}, 'X', 'job_1')
+    index.job_dependencies({}, 'X', 'job_2')
+    index.job_dependencies({}, 'Y', 'job_3')
+    assert index.missing_files() == {'missing/X.UPF': 'job_1'}
+    with pytest.raises(FileNotFoundError, match=r'missing/X.UPF \(required by job_1\)'):
+        index.validate()
+
+
+def test_ground_state_calculation_file_rules():
+    find, calls = counted(find_pseudopotential)
+    matrix = {'^system_files': [f'{structures}/TiO2', f'{structures}/NiO', f'{structures}/Si', f'{structures}/Cr3'],
+              'Mixing': [0.1, 0.2, 0.3, 0.4]}
+    jobs = ground_state_calculation(matrix, {'CalculationMode': 'gs'},
+                                    meta_value_ops={'^system_files': file_to_oct_dict},
+                                    file_rules=[FileRule(find, keys=['Species'])])
+
+    # Once per distinct Species block. Si and Cr3 have none
+    assert len(calls) == 3
+    assert set(jobs['TiO2_0.3'].depends_on) == {'Ti.UPF', 'O.UPF'}
+    assert jobs['TiO2_0.1'].depends_on['Ti.UPF'] == {'source': f'{structures}/Ti.UPF', 'dest': 'TiO2_0.1/Ti.UPF'}
+    assert jobs['NiO_0.1'].depends_on == {}
+    assert jobs['Si_0.4'].depends_on == {}
+
+    # Same dependencies as the plain rule over full inputs
+    plain = ground_state_calculation(matrix, {'CalculationMode': 'gs'},
+                                     meta_value_ops={'^system_files': file_to_oct_dict},
+                                     file_rules=[find_pseudopotential])
+    assert all(jobs[id].depends_on == plain[id].depends_on for id in jobs)
+
+
+def test_ground_state_calculation_missing_files():
+    rule = FileRule(lambda inp: {f: f'missing/{f}' for f in re.findall(r'"([^"]+\.UPF)"', inp)}, keys=['Species'])
+    matrix = {'^system_files': [f'{structures}/TiO2'], 'Mixing': [0.1, 0.2]}
+    kwargs = {'meta_value_ops': {'^system_files': file_to_oct_dict}, 'file_rules': [rule]}
+
+    with pytest.raises(FileNotFoundError, match='2 file dependencies do not exist'):
+        ground_state_calculation(matrix, {}, **kwargs)
+
+    jobs = ground_state_calculation(matrix, {}, validate_files=False, **kwargs)
+    assert jobs['TiO2_0.2'].depends_on['Ti.UPF']['source'] == 'missing/Ti.UPF'
@@ -0,0 +1,51 @@
+import subprocess
+import sys
+
+import pytest
+
+heavy_modules = ['ase', 'numpy', 'scipy', 'simple_slurm', 'sympy']
+
+# Modules that only parse, hash and write inputs, or generate jobs
+light_modules = ['octopus_workflows.oct_parse',
+                 'octopus_workflows.metadata',
+                 'octopus_workflows.oct_write',
+                 'octopus_workflows.components',
+                 'octopus_workflows.simple_oct_workflow']
+
+# Cumulative import time budget of the light modules, in microseconds
+budget = 200000
+
+
+def import_times(modules: list) -> tuple:
+    """Import modules in a fresh interpreter, with -X importtime.
+
+    :return: Cumulative import time per top-level import, in microseconds,
+    and the modules loaded by the end.
+    """
+    code = f"import sys, {', '.join(modules)}; print(' '.join(sys.modules))"
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            capture_output=True, text=True, check=True)
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|')
+        # Nested imports are indented
+        if not name.startswith('  '):
+            times[name.strip()] = int(cumulative)
+    return times, set(result.stdout.split())
+
+
+def test_light_imports_defer_heavy_dependencies():
+    _, loaded = import_times(light_modules)
+    for heavy in heavy_modules:
+        # Executing a package imports its submodules. A lazy module is
+        # only a placeholder in sys.modules
+        assert not any(m.startswith(heavy + '.') for m in loaded), f"{heavy} was imported"
+
+
+@pytest.mark.parametrize('module', light_modules)
+def test_import_time_budget(module):
+    # Best of three, to exclude a cold file system cache
+    total = min(import_times([module])[0][module] for _ in range(3))
+    assert total < budget, f"{module} took {total / 1000:.0f} ms to import"
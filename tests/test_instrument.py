@@ -0,0 +1,71 @@
+import json
+
+from src.octopus_workflows import instrument
+from src.octopus_workflows.instrument import instrumented, recording, stage
+from src.octopus_workflows.simple_oct_workflow import ground_state_calculation
+
+
+def test_stage_disabled():
+    assert instrument._recorder is None
+    with stage("disabled", 10) as s:
+        s.items = 5
+    assert s is instrument._null_stage
+
+
+def test_stage_recording(tmp_path):
+    @instrumented(items=lambda n: n)
+    def allocate(n):
+        return [0] * n
+
+    with recording(memory=True) as recorder:
+        with stage("outer") as outer:
+            outer.items = 3
+            allocate(100000)
+            allocate(10)
+        with stage("outer", 2):
+            pass
+    assert instrument._recorder is None
+
+    stats = recorder.to_dict()
+    assert list(stats) == ["test_stage_recording.<locals>.allocate", "outer"]
+
+    inner = stats["test_stage_recording.<locals>.allocate"]
+    assert inner["calls"] == 2
+    assert inner["items"] == 100010
+    assert inner["peak_memory"] >= 100000 * 8
+
+    # The enclosing stage's peak includes its inner stages
+    assert stats["outer"]["calls"] == 2
+    assert stats["outer"]["items"] == 5
+    assert stats["outer"]["peak_memory"] >= inner["peak_memory"]
+    assert stats["outer"]["time"] >= inner["time"]
+
+    recorder.save_chrome_trace(tmp_path / "trace.json")
+    with open(tmp_path / "trace.json") as fid:
+        events = json.load(fid)["traceEvents"]
+    assert len(events) == 4
+    assert {e["ph"] for e in events} == {"X"}
+    assert events[0]["args"] == {"items": 100000}
+
+
+def test_ground_state_stages(tmp_path):
+    # Record with the module the workflow imports, by package name
+    from octopus_workflows.instrument import recording
+
+    matrix = {"Mixing": [0.1, 0.2, 0.3], "ExtraStates": [1, 2]}
+    with recording() as recorder:
+        jobs = ground_state_calculation(matrix, {"CalculationMode": "gs"})
+        for job in jobs.values():
+            job.write(tmp_path)
+
+    stats = recorder.to_dict()
+    assert list(stats) == ["expand", "substitute", "job_ids", "render", "hash",
+                           "file_dependencies", "slurm", "package", "write"]
+    assert all(s["items"] == 6 for s in stats.values())
+    assert stats["expand"]["calls"] == 1
+    assert stats["write"]["calls"] == 6
+    assert stats["render"]["peak_memory"] is None
+
+    recorder.save_json(tmp_path / "stages.json")
+    with open(tmp_path / "stages.json") as fid:
+        assert json.load(fid)["expand"]["items"] == 6
@@ -0,0 +1,105 @@
+import filecmp
+from pathlib import Path
+
+import pytest
+
+from src.octopus_workflows.job_writer import write_jobs
+from src.octopus_workflows.simple_oct_workflow import ground_state_calculation
+from workflows.kerker_comparison.settings import file_to_oct_dict, find_pseudopotential
+
+structures = "data/benchmark_structures"
+
+
+def sweep_jobs():
+    matrix = {'^system_files': [f'{structures}/TiO2', f'{structures}/Si'], 'Mixing': [0.1, 0.2, 0.3]}
+    return ground_state_calculation(matrix, {'CalculationMode': 'gs'},
+                                    meta_value_ops={'^system_files': file_to_oct_dict},
+                                    file_rules=[find_pseudopotential])
+
+
+def assert_same_trees(left, right):
+    comparison = filecmp.dircmp(left, right)
+    assert not comparison.left_only and not comparison.right_only and not comparison.diff_files
+    for subdir in comparison.common_dirs:
+        assert_same_trees(left / subdir, right / subdir)
+
+
+@pytest.mark.parametrize('fsync', [None, 'file', 'batch'])
+def test_write_jobs_matches_serial_write(tmp_path, fsync):
+    jobs = sweep_jobs()
+    for job in jobs.values():
+        job.write(root=tmp_path / 'serial')
+
+    report = write_jobs(jobs, root=tmp_path / 'parallel', max_workers=4, fsync=fsync, batch_size=4)
+    assert_same_trees(tmp_path / 'serial', tmp_path / 'parallel')
+    assert (tmp_path / 'parallel' / 'TiO2_0.1' / 'Ti.UPF').is_file()
+    assert not list((tmp_path / 'parallel').rglob('*.tmp'))
+
+    # 3 files per job, and 2 pseudopotentials per TiO2 job
+    assert report['jobs'] == 6 and report['files'] == 6 * 3 + 3 * 2
+    assert report['bytes'] == sum(f.stat().st_size for f in (tmp_path / 'parallel').rglob('*') if f.is_file())
+    assert {'seconds', 'jobs_per_second', 'megabytes_per_second'} <= set(report)
+
+
+def test_write_jobs_existing(tmp_path):
+    jobs = sweep_jobs()
+    write_jobs(jobs, root=tmp_path)
+    with pytest.raises(FileExistsError):
+        write_jobs(jobs, root=tmp_path)
+
+    # Overwrites in place
+    (tmp_path / 'Si_0.2' / 'inp').write_text('stale')
+    write_jobs(jobs, root=tmp_path, exist_ok=True)
+    assert (tmp_path / 'Si_0.2' / 'inp').read_text() == jobs['Si_0.2'].inp
+
+
+def test_write_jobs_skips_after_dependencies(tmp_path):
+    jobs = sweep_jobs()
+    jobs['Si_0.1'].depends_on = {'restart': {'source': 'Si_0.2/restart', 'dest': 'Si_0.1/restart', 'after': 'Si_0.2'}}
+    write_jobs(jobs, root=tmp_path)
+    assert sorted(f.name for f in (tmp_path / 'Si_0.1').iterdir()) == ['hash.txt', 'inp', 'slurm.sh']
+
+
+def test_write_jobs_missing_source(tmp_path):
+    jobs = sweep_jobs()
+    jobs['Si_0.1'].depends_on = {'X.UPF': {'source': 'missing/X.UPF', 'dest': 'Si_0.1/X.UPF'}}
+    with pytest.raises(FileNotFoundError):
+        write_jobs(jobs, root=tmp_path)
+    assert not (tmp_path / 'Si_0.1' / 'inp').exists()
+    assert not list(tmp_path.rglob('*.tmp'))
+
+
+def test_write_jobs_invalid_fsync(tmp_path):
+    with pytest.raises(ValueError):
+        write_jobs({}, root=tmp_path, fsync='always')
+
+
+@pytest.mark.parametrize('fsync', [None, 'batch'])
+def test_write_jobs_failed_commit(tmp_path, monkeypatch, fsync):
+    import src.octopus_workflows.job_writer as job_writer
+
+    jobs = sweep_jobs()
+    replace = job_writer.os.replace
+    calls = []
+
+    def failing_replace(src, dst):
+        calls.append(dst)
+        if len(calls) == 5:
+            raise OSError('Disk quota exceeded')
+        replace(src, dst)
+
+    monkeypatch.setattr(job_writer.os, 'replace', failing_replace)
+    with pytest.raises(OSError, match='Disk quota exceeded'):
+        write_jobs(jobs, root=tmp_path, max_workers=1, fsync=fsync)
+    assert not list(tmp_path.rglob('.*.tmp'))
+
+
+def test_write_jobs_fsyncs_written_files(tmp_path, monkeypatch):
+    import src.octopus_workflows.job_writer as job_writer
+
+    synced = []
+    monkeypatch.setattr(job_writer, '_fsync', lambda path: synced.append(Path(path)))
+    write_jobs(sweep_jobs(), root=tmp_path, fsync='batch')
+    # Every temporary file, then every job directory, and nothing else
+    assert sum(path.suffix == '.tmp' for path in synced) == 6 * 3 + 3 * 2
+    assert {path for path in synced if path.suffix != '.tmp'} == {tmp_path / id for id in sweep_jobs()}
@@ -0,0 +1,159 @@
+import os
+from pathlib import Path
+
+import numpy as np
+
+from src.octopus_workflows.monitor import (
+    ConvergenceTail,
+    MonitoredJob,
+    ScfMonitor,
+    default_rules,
+    divergence_rule,
+    stagnation_rule,
+)
+
+header = "#     iter         energy      energy_diff         abs_dens         rel_dens           abs_ev           rel_ev\n"
+
+
+def line(iteration: int, rel_dens: float) -> str:
+    return f"{iteration:7d}  -3.27E+01  {rel_dens:.8E}  1.0E+00  {rel_dens:.8E}  1.0E+00  1.0E-01\n"
+
+
+def test_convergence_tail(tmp_path):
+    file = Path(tmp_path, "convergence")
+    file.write_text(header + line(1, 1.0) + line(2, 0.1)[:10])
+
+    tail = ConvergenceTail(file)
+    assert tail.read() == 1
+    assert tail.read() == 0
+
+    # Complete the partial line, and append another
+    with open(file, "a") as fid:
+        fid.write(line(2, 0.1)[10:] + line(3, 0.01))
+    assert tail.read() == 2
+    assert np.allclose(tail.data[:, 4], [1.0, 0.1, 0.01])
+
+    # File re-written from the start
+    file.write_text(header + line(1, 1.0))
+    assert tail.read() == 1
+    assert tail.data.shape == (1, 7)
+
+
+def test_rules():
+    data = np.zeros(shape=(40, 7))
+    data[:, 4] = 10.0 ** -np.arange(40, dtype=float)
+    assert divergence_rule(factor=100.0)(data) is None
+    assert stagnation_rule(window=10)(data) is None
+
+    data[-1, 4] = 1.0
+    assert "diverging" in divergence_rule(factor=100.0)(data)
+
+    data[:, 4] = 1.0e-3
+    assert "stagnated" in stagnation_rule(window=10)(data)
+    # Too few iterations to judge
+    assert stagnation_rule(window=40)(data) is None
+
+
+def test_scf_monitor(tmp_path):
+    jobs = []
+    for name, values in [("good", 10.0 ** -np.arange(12.0)), ("bad", 10.0 ** np.arange(12.0))]:
+        Path(tmp_path, name, "static").mkdir(parents=True)
+        Path(tmp_path, name, "static/convergence").write_text(header + line(1, values[0]))
+        os.utime(Path(tmp_path, name, "static/convergence"), (0, 1000))
+        jobs.append(MonitoredJob(Path(tmp_path, name), job_id=name, n_gpus=4, max_iterations=100))
+
+    cancelled = []
+    monitor = ScfMonitor(jobs, rules=[divergence_rule(factor=1.e3, min_iterations=5)], action=cancelled.append)
+    assert monitor.poll() == []
+
+    # Append iterations, with mtimes 10 s apart per iteration
+    for name, values in [("good", 10.0 ** -np.arange(12.0)), ("bad", 10.0 ** np.arange(12.0))]:
+        file = Path(tmp_path, name, "static/convergence")
+        with open(file, "a") as fid:
+            fid.writelines(line(i + 1, v) for i, v in enumerate(values) if i > 0)
+        os.utime(file, (0, 1110))
+
+    assert monitor.poll() == [jobs[1]]
+    assert cancelled == [jobs[1]]
+    assert len(monitor.running()) == 1
+
+    report = monitor.report()
+    assert list(report["aborted"]) == [str(Path(tmp_path, "bad"))]
+    # 88 remaining iterations at 10 s each, on 4 GPUs
+    assert np.isclose(report["saved_gpu_hours"], 88 * 10 * 4 / 3600)
+
+
+def converged_trace(n: int = 40) -> str:
+    """SCF that converges, after which energy_diff scatters near machine precision."""
+    rng = np.random.default_rng(0)
+    rel_dens = 10.0 ** -np.linspace(0.0, 8.0, n)
+    energy_diff = np.concatenate([10.0 ** -np.linspace(0.0, 12.0, n // 2), 10.0 ** rng.uniform(-16, -11, n - n // 2)])
+    energy_diff[-5], energy_diff[-1] = 1.0e-16, 2.0e-12
+    return header + "".join(f"{i + 1:7d}  -3.27E+01  {e:.8E}  1.0E+00  {r:.8E}  1.0E+00  1.0E-01\n"
+                            for i, (e, r) in enumerate(zip(energy_diff, rel_dens)))
+
+
+def test_default_rules_converged_trace(tmp_path):
+    file = Path(tmp_path, "convergence")
+    file.write_text(converged_trace())
+    tail = ConvergenceTail(file)
+    tail.read()
+    # energy_diff is 1e5 above its minimum at the end, which is not divergence
+    assert np.abs(tail.data[-1, 2]) > 1.e3 * np.min(np.abs(tail.data[:, 2]))
+    assert all(rule(tail.data) is None for rule in default_rules)
+
+
+def test_monitor_finishes(tmp_path, monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("src.octopus_workflows.monitor.time.sleep", sleeps.append)
+
+    jobs = []
+    for name in ["converged", "crashed"]:
+        Path(tmp_path, name, "static").mkdir(parents=True)
+        Path(tmp_path, name, "static/convergence").write_text(converged_trace())
+        jobs.append(MonitoredJob(Path(tmp_path, name), job_id=name))
+    Path(tmp_path, "converged/static/info").write_text("SCF converged in   40 iterations\n")
+
+    monitor = ScfMonitor(jobs, action=lambda job: None, max_idle_polls=3)
+    monitor.run(interval=5.0)
+    assert jobs[0].finished == "converged" and jobs[0].aborted is None
+    # No further output, for 3 polls after the first
+    assert jobs[1].finished == "no output for 3 polls"
+    assert monitor.running() == []
+    # No sleep after the last poll
+    assert sleeps == [5.0, 5.0, 5.0]
+
+    # Bounded number of polls
+    sleeps.clear()
+    job = MonitoredJob(Path(tmp_path, "pending"))
+    ScfMonitor([job], max_idle_polls=None).run(interval=1.0, max_polls=2)
+    assert job.finished is None and sleeps == [1.0]
+
+
+def test_monitor_queued_and_restarted(tmp_path):
+    # Queued: no output yet, however long it waits
+    queued = MonitoredJob(Path(tmp_path, "queued"))
+    monitor = ScfMonitor([queued], action=lambda job: None, max_idle_polls=3)
+    for _ in range(5):
+        monitor.poll()
+    assert queued.finished is None and queued.idle_polls == 0
+
+    # Restarted: static/info is left from the previous run
+    Path(tmp_path, "restarted", "static").mkdir(parents=True)
+    info = Path(tmp_path, "restarted/static/info")
+    info.write_text("SCF converged in   40 iterations\n")
+    os.utime(info, (1.0e9, 1.0e9))
+    Path(tmp_path, "restarted/static/convergence").write_text(converged_trace(5))
+    restarted = MonitoredJob(Path(tmp_path, "restarted"))
+    monitor = ScfMonitor([restarted], action=lambda job: None)
+    monitor.poll()
+    assert restarted.finished is None
+
+    info.write_text("SCF converged in   40 iterations\n")
+    monitor.poll()
+    assert restarted.finished == "converged"
+
+
+def test_slurm_job_id(tmp_path):
+    Path(tmp_path, "slurm-123456.out").write_text("")
+    assert MonitoredJob(tmp_path).slurm_job_id() == "123456"
@@ -0,0 +1,153 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.octopus_workflows.oct_convergence import (
+    ConvergenceStore,
+    load_convergence,
+    load_convergence_files,
+    parse_convergence_string,
+    read_convergence,
+)
+
+
+@pytest.fixture()
+def convergence_string() -> str:
+    string = """#     iter         energy      energy_diff         abs_dens         rel_dens           abs_ev           rel_ev
+      1  -3.27844812E+01   3.27844812E+01   4.56331046E+00   1.42603452E-01   4.40018932E+00   1.36282396E-01
+      2  -3.29043212E+01   1.19840000E-01   1.21345046E+00   3.79203269E-02   1.53018932E-01   4.62810231E-03
+      3  -3.29101211E+01   5.79990000E-03   1.04129712E-01   3.25405350E-03   1.01230000E-02   3.07651000E-04
+"""
+    return string
+
+
+def write_job(root: Path, contents: str) -> Path:
+    Path(root, "static").mkdir(parents=True, exist_ok=True)
+    file = Path(root, "static/convergence")
+    file.write_text(contents)
+    return file
+
+
+def test_parse_convergence_string(convergence_string):
+    data = parse_convergence_string(convergence_string)
+    assert data.shape == (3, 7)
+    assert np.allclose(data[:, 0], [1, 2, 3])
+    assert np.isclose(data[2, 4], 3.25405350e-03)
+
+    # Same result as the previous np.loadtxt implementation
+    ref_data = np.loadtxt(convergence_string.splitlines(), skiprows=1)
+    assert np.allclose(data, ref_data)
+
+
+def test_parse_convergence_string_partial_file(convergence_string):
+    # Final line has not been completely written
+    data = parse_convergence_string(convergence_string + "      4  -3.291")
+    assert data.shape == (3, 7)
+
+    # Only the header has been written
+    header = convergence_string.splitlines(keepends=True)[0]
+    assert parse_convergence_string(header).shape == (0, 7)
+    assert parse_convergence_string("").shape == (0, 7)
+
+
+def test_parse_convergence_string_invalid_value(convergence_string):
+    # Fortran prints asterisks for values that overflow their format
+    with pytest.raises(ValueError):
+        parse_convergence_string(convergence_string.replace("5.79990000E-03", "**************"))
+
+
+def test_read_convergence_sidecar(tmp_path, convergence_string):
+    file = write_job(tmp_path, convergence_string)
+
+    data = read_convergence(file)
+    sidecars = list(Path(tmp_path, "static").glob(".convergence.*.npy"))
+    assert len(sidecars) == 1
+
+    # Second read comes from the memory-mapped sidecar
+    cached_data = read_convergence(file)
+    assert isinstance(cached_data, np.memmap)
+    assert np.array_equal(data, cached_data)
+
+    # Modifying the file invalidates the sidecar
+    write_job(tmp_path, convergence_string + convergence_string.splitlines()[-1] + "\n")
+    assert read_convergence(file).shape == (4, 7)
+    sidecars = list(Path(tmp_path, "static").glob(".convergence.*.npy"))
+    assert len(sidecars) == 1
+
+
+def test_load_convergence_files(tmp_path, convergence_string):
+    roots = []
+    for i in range(1, 4):
+        lines = convergence_string.splitlines(keepends=True)[: i + 1]
+        write_job(Path(tmp_path, f"job_{i}"), "".join(lines))
+        roots.append(Path(tmp_path, f"job_{i}"))
+
+    all_data = load_convergence_files(roots, max_workers=2)
+    assert [data.shape[0] for data in all_data] == [1, 2, 3]
+    assert np.array_equal(all_data[2], load_convergence(roots[2], use_cache=False))
+
+
+@pytest.fixture()
+def store() -> ConvergenceStore:
+    iterations = np.arange(1, 6)
+    # rel_dens reduced by a factor of 10 per iteration
+    fast = np.zeros(shape=(5, 7))
+    fast[:, 0] = iterations
+    fast[:, 4] = 10.0 ** -iterations.astype(float)
+    # rel_dens reduced by a factor of 10 every 2 iterations
+    slow = np.zeros(shape=(4, 7))
+    slow[:, 0] = iterations[:4]
+    slow[:, 4] = 10.0 ** (-0.5 * iterations[:4])
+    empty = np.empty(shape=(0, 7))
+    return ConvergenceStore.from_arrays(["fast", "empty", "slow"], [fast, empty, slow])
+
+
+def test_convergence_store_queries(store):
+    assert len(store) == 3
+    assert np.array_equal(store.n_scf_iterations(), [5, 0, 4])
+    assert np.array_equal(store["slow"][:, 0], [1, 2, 3, 4])
+
+    final = store.final("rel_dens")
+    assert np.isclose(final[0], 1.e-5)
+    assert np.isnan(final[1])
+    assert np.isclose(final[2], 1.e-2)
+
+    assert np.array_equal(store.iterations_to_tolerance(2.e-3), [3, -1, -1])
+    assert np.array_equal(store.iterations_to_tolerance(2.e-2), [2, -1, 4])
+
+    rate = store.convergence_rate()
+    assert np.allclose(rate[[0, 2]], [-1.0, -0.5])
+    assert np.isnan(rate[1])
+
+
+def test_convergence_rate_masks_invalid_values():
+    iterations = np.arange(1, 7, dtype=float)
+    exact = np.zeros(shape=(6, 7))
+    exact[:, 4] = 10.0 ** -iterations
+    # Zero and missing values are excluded, rather than fitted as 1.0
+    gaps = exact.copy()
+    gaps[[1, 4], 4] = [0.0, np.nan]
+    sparse = np.zeros(shape=(3, 7))
+    sparse[:, 4] = [0.0, 1.e-3, np.nan]
+
+    rate = ConvergenceStore.from_arrays(["exact", "gaps", "sparse"], [exact, gaps, sparse]).convergence_rate()
+    assert np.allclose(rate[:2], [-1.0, -1.0])
+    assert np.isnan(rate[2])
+
+
+def test_convergence_store_save_load(tmp_path, store):
+    file = Path(tmp_path, "store.npz")
+    store.save(file)
+
+    loaded = ConvergenceStore.load(file)
+    assert isinstance(loaded.data, np.memmap)
+    assert loaded.names == store.names
+    assert np.array_equal(loaded.offsets, store.offsets)
+    assert np.array_equal(loaded.data, store.data)
+
+    system_calcs = loaded.to_system_calcs()
+    assert np.array_equal(system_calcs["fast"]["data"], store["fast"][:, [0, 4]])
+    # Views, not copies
+    assert np.shares_memory(system_calcs["fast"]["data"], loaded.data)
+    assert not np.shares_memory(loaded.to_system_calcs([4, 0])["fast"]["data"], loaded.data)
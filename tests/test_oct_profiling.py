@@ -0,0 +1,156 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.octopus_workflows.oct_profiling import (
+    RankProfiling,
+    compare_profiling,
+    compare_sweeps,
+    load_profiling,
+    parse_profiling_string,
+    profiling_to_timings,
+)
+
+header = """                                            CUMULATIVE                                              |                     SELF
+TAG                    NUM_CALLS      TOTAL_TIME   TIME_PER_CALL        MIN_TIME   MFLOPS  MBYTES/S   %TIME |       TOTAL_TIME   TIME_PER_CALL   MFLOPS  MBYTES/S   %TIME
+=============================================================================================================================================================================
+
+"""
+
+
+def profiling_string(scf_time: float, dens_time: float) -> str:
+    return header + (
+        f"COMPLETE_RUN                   1    {scf_time + 2.0:14.6f}  {scf_time + 2.0:14.6f}  {scf_time + 2.0:14.6f}        0         0   100.0 |  2.000000  2.000000   0   0   1.0\n"
+        f"SCF_CYCLE                     10    {scf_time:14.6f}  {scf_time / 10:14.6f}  0.100000        0         0    90.0 |  {scf_time - dens_time:.6f}  0.100000   0   0   80.0\n"
+        f"DENSITY_CALC                  10    {dens_time:14.6f}  {dens_time / 10:14.6f}  0.010000        0         0    10.0 |  {dens_time:.6f}  0.010000   0   0   10.0\n"
+    )
+
+
+def write_ranks(root, times) -> Path:
+    Path(root, "profiling").mkdir(parents=True, exist_ok=True)
+    for rank, (scf_time, dens_time) in enumerate(times):
+        Path(root, f"profiling/time.{rank:06d}").write_text(
+            profiling_string(scf_time, dens_time)
+        )
+    return root
+
+
+def test_parse_profiling_string():
+    regions, values = parse_profiling_string(profiling_string(10.0, 1.0))
+    assert regions == ["COMPLETE_RUN", "SCF_CYCLE", "DENSITY_CALC"]
+    assert values.shape == (3, 12)
+
+    timings = profiling_to_timings(regions, values)
+    assert timings["cumulative"]["SCF_CYCLE"] == {
+        "NUM_CALLS": 10,
+        "TOTAL_TIME": 10.0,
+        "TIME_PER_CALL": 1.0,
+        "MIN_TIME": 0.1,
+        "MFLOPS": 0.0,
+        "MBYTES/S": 0.0,
+        "%TIME": 90.0,
+    }
+    assert timings["self"]["SCF_CYCLE"] == {
+        "NUM_CALLS": 10,
+        "TOTAL_TIME": 9.0,
+        "TIME_PER_CALL": 0.1,
+        "MFLOPS": 0.0,
+        "MBYTES/S": 0.0,
+        "%TIME": 80.0,
+    }
+
+
+def test_parse_profiling_string_invalid_value():
+    raw = profiling_string(10.0, 1.0).replace("0.010000", "********", 1)
+    with pytest.raises(ValueError):
+        parse_profiling_string(raw)
+
+
+def test_load_profiling_imbalance(tmp_path):
+    # Rank 1 spends 3x longer computing the density
+    root = write_ranks(tmp_path, [(10.0, 1.0), (12.0, 3.0)])
+    profiling = load_profiling(root)
+    assert profiling.ranks == [0, 1]
+    assert profiling.values.shape == (2, 3, 12)
+
+    stats = profiling.statistics("TOTAL_TIME", "self")
+    i = profiling.regions.index("DENSITY_CALC")
+    assert stats["min"][i] == 1.0
+    assert stats["max"][i] == 3.0
+    assert np.isclose(stats["imbalance"][i], 1.5)
+    assert stats["argmax"][i] == 1
+
+    path = profiling.critical_path(n_regions=2)
+    assert [p["region"] for p in path] == ["SCF_CYCLE", "DENSITY_CALC"]
+    assert np.isclose(path[1]["lost_time"], 1.0)
+
+    # Second load comes from the cache
+    cached = load_profiling(root)
+    assert isinstance(cached.values, np.memmap)
+    assert cached.regions == profiling.regions
+    assert cached.timings(1) == profiling.timings(1)
+
+
+def test_rank_profiling_missing_region(tmp_path):
+    root = write_ranks(tmp_path, [(10.0, 1.0)])
+    Path(root, "profiling/time.000001").write_text(
+        header + profiling_string(4.0, 1.0).splitlines(keepends=True)[4]
+    )
+    profiling = RankProfiling.from_files(sorted(Path(root, "profiling").glob("time.*")))
+    assert np.isnan(profiling.metric("TOTAL_TIME")[1, 1])
+    assert list(profiling.timings(1)["cumulative"]) == ["COMPLETE_RUN"]
+
+
+def test_load_profiling_no_files(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_profiling(tmp_path)
+
+
+def test_compare_sweeps():
+    regions, values = parse_profiling_string(profiling_string(10.0, 1.0))
+    reference = profiling_to_timings(regions, values)
+    # SCF is 5 s faster, whilst the density is marginally slower
+    regions, values = parse_profiling_string(profiling_string(5.0, 1.02))
+    faster = profiling_to_timings(regions, values)
+    # SCF is 2 s slower
+    regions, values = parse_profiling_string(profiling_string(12.0, 1.0))
+    slower = profiling_to_timings(regions, values)
+
+    comparison = compare_sweeps(
+        {"Si": reference, "NiO": reference, "benzene": reference},
+        {"Si": faster, "NiO": slower},
+        table="cumulative",
+    )
+    assert comparison.systems == ["Si", "NiO"]
+    assert comparison.time_a.shape == (2, 3)
+
+    improvements = comparison.improvements()
+    assert [(r["system"], r["region"]) for r in improvements] == [
+        ("Si", "COMPLETE_RUN"),
+        ("Si", "SCF_CYCLE"),
+    ]
+    assert np.isclose(improvements[1]["speedup"], 2.0)
+
+    # Change in DENSITY_CALC is below the noise threshold
+    regressions = comparison.regressions()
+    assert {(r["system"], r["region"]) for r in regressions} == {
+        ("NiO", "COMPLETE_RUN"),
+        ("NiO", "SCF_CYCLE"),
+    }
+    assert comparison.regressions(n=1)[0]["delta"] == pytest.approx(2.0)
+
+
+def test_compare_profiling_missing_region(tmp_path):
+    root = write_ranks(tmp_path, [(10.0, 1.0), (12.0, 3.0)])
+    a = load_profiling(root)
+    regions, values = parse_profiling_string(profiling_string(10.0, 1.0))
+    b = profiling_to_timings(regions[:2], values[:2])
+
+    comparison = compare_profiling(a, b, table="self")
+    assert comparison.missing() == {"removed": [("", "DENSITY_CALC")], "added": []}
+    # Multi-rank data are reduced to the slowest rank
+    record = [r for r in comparison.to_records() if r["region"] == "SCF_CYCLE"][0]
+    assert record["time_a"] == 9.0
+    assert record["time_b"] == 9.0
+    assert not record["regression"]
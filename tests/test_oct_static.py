@@ -0,0 +1,142 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.octopus_workflows.oct_static import (
+    band_edges,
+    load_eigenvalues,
+    load_info,
+    parse_eigenvalues_string,
+    parse_info_string,
+    static_table,
+)
+
+
+@pytest.fixture()
+def info_string() -> str:
+    string = """
+******************************** Grid ********************************
+Simulation Box:
+  Type = parallelepiped
+**********************************************************************
+
+SCF converged in   15 iterations
+
+Some of the states are not fully converged!
+Eigenvalues [H]
+ #st  Spin   Eigenvalue      Occupation
+   1   --    -0.491456       2.000000
+
+Energy [H]:
+      Total       =       -32.78448123
+      Free        =       -32.78448123
+      -----------
+      Ion-ion     =         2.91325311
+      Eigenvalues =        -8.32421415
+      Int[n*v_xc] =        -9.24513321
+      -TS         =        -0.00000000
+
+Fermi energy =      -0.123400 H
+
+Dipole:                 [b]          [Debye]
+"""
+    return string
+
+
+@pytest.fixture()
+def eigenvalues_string() -> str:
+    string = """All states converged.
+Criterion =      0.100000E-05
+
+Eigenvalues [H]
+ #st  Spin   Eigenvalue      Occupation     Error
+#k =       1, k = (    0.000000,    0.000000,    0.000000)
+   1   up   -0.491456       1.000000      (7.7E-07)
+   1   dn   -0.481456       1.000000      (7.7E-07)
+   2   up    0.183928       0.000000      (8.6E-07)
+   2   dn    0.193928       0.000000      (8.6E-07)
+#k =       2, k = (    0.500000,    0.000000,    0.000000)
+   1   up   -0.391456       1.000000      (7.7E-07)
+   1   dn   -0.381456       1.000000      (7.7E-07)
+   2   up    0.283928       0.000000      (8.6E-07)
+   2   dn    0.293928       0.000000      (8.6E-07)
+"""
+    return string
+
+
+def write_job(root, info: str = None, eigenvalues: str = None) -> Path:
+    Path(root, "static").mkdir(parents=True)
+    if info is not None:
+        Path(root, "static/info").write_text(info)
+    if eigenvalues is not None:
+        Path(root, "static/eigenvalues").write_text(eigenvalues)
+    return Path(root)
+
+
+def test_parse_info_string(info_string):
+    info = parse_info_string(info_string)
+    assert info["units"] == "H"
+    assert info["energies"] == {"Total": -32.78448123,
+                                "Free": -32.78448123,
+                                "Ion-ion": 2.91325311,
+                                "Eigenvalues": -8.32421415,
+                                "Int[n*v_xc]": -9.24513321,
+                                "-TS": -0.0}
+    assert info["fermi_energy"] == -0.1234
+    assert info["converged"]
+    assert info["n_iterations"] == 15
+
+    info = parse_info_string("SCF *not* converged!")
+    assert info["energies"] == {}
+    assert not info["converged"]
+    assert info["n_iterations"] is None
+
+
+def test_parse_eigenvalues_string(eigenvalues_string):
+    eigen = parse_eigenvalues_string(eigenvalues_string)
+    assert eigen["units"] == "H"
+    assert np.allclose(eigen["kpoints"], [[0, 0, 0], [0.5, 0, 0]])
+    assert eigen["eigenvalues"].shape == (2, 2, 2)
+    # k-point 2, spin down, state 1
+    assert eigen["eigenvalues"][1, 1, 0] == -0.381456
+    assert np.array_equal(eigen["occupations"][:, :, 1], np.zeros(shape=(2, 2)))
+
+    edges = band_edges(eigen)
+    assert edges["homo"] == -0.381456
+    assert edges["lumo"] == 0.183928
+
+
+def test_parse_eigenvalues_string_molecule():
+    eigen = parse_eigenvalues_string("""Eigenvalues [eV]
+ #st  Spin   Eigenvalue      Occupation
+   1   --   -10.491456       2.000000
+   2   --    -5.183928       2.000000
+""")
+    assert eigen["units"] == "eV"
+    assert np.allclose(eigen["kpoints"], [[0, 0, 0]])
+    assert np.allclose(eigen["eigenvalues"], [[[-10.491456, -5.183928]]])
+    assert np.isnan(band_edges(eigen)["lumo"])
+
+
+def test_load_with_cache(tmp_path, info_string, eigenvalues_string):
+    root = write_job(tmp_path, info_string, eigenvalues_string)
+    for _ in range(2):
+        assert load_info(root)["n_iterations"] == 15
+        eigen = load_eigenvalues(root)
+        assert eigen["eigenvalues"].shape == (2, 2, 2)
+        assert np.allclose(eigen["kpoints"][1], [0.5, 0, 0])
+    assert isinstance(eigen["eigenvalues"], np.memmap)
+
+
+def test_static_table(tmp_path, info_string, eigenvalues_string):
+    roots = [write_job(Path(tmp_path, "Si"), info_string, eigenvalues_string),
+             write_job(Path(tmp_path, "NiO"), "SCF *not* converged!"),
+             write_job(Path(tmp_path, "TiO2"))]
+    table = static_table(roots, max_workers=2)
+    assert table["name"] == ["Si", "NiO", "TiO2"]
+    assert np.array_equal(table["converged"], [True, False, False])
+    assert np.array_equal(table["n_iterations"], [15, -1, -1])
+    assert table["energy_Total"][0] == -32.78448123
+    assert np.all(np.isnan(table["energy_Total"][1:]))
+    assert np.isclose(table["gap"][0], 0.183928 + 0.381456)
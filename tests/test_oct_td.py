@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.octopus_workflows import oct_td
+from src.octopus_workflows.oct_td import MultipolesData, RunningFourierTransform, RunningStatistics
+
+header = """################################################################################
+# HEADER
+#  nspin   =    1
+#  lmax    =    1
+#  dt      =    5.000000000000E-02
+################################################################################
+#       Iter             t            Electronic dipole       <x>          <y>          <z>
+################################################################################
+"""
+
+
+def multipoles_lines(start: int, stop: int, dt: float = 0.05) -> str:
+    return "".join(
+        f"{i:8d}  {i * dt:.12E}  {-8.0:.12E}  {np.sin(i * dt):.12E}  {0.0:.12E}  {np.cos(i * dt):.12E}\n"
+        for i in range(start, stop)
+    )
+
+
+def write_multipoles(root, contents: str, mode: str = "w") -> Path:
+    file = Path(root, "td.general/multipoles")
+    file.parent.mkdir(parents=True, exist_ok=True)
+    with open(file, mode) as fid:
+        fid.write(contents)
+    return file
+
+
+def test_multipoles_chunks(tmp_path, monkeypatch):
+    # Small blocks, such that chunks are assembled from several reads
+    monkeypatch.setattr(oct_td, "_block_size", 256)
+    write_multipoles(tmp_path, header + multipoles_lines(0, 25))
+
+    multipoles = MultipolesData(tmp_path, chunk_rows=10)
+    chunks = list(multipoles.chunks())
+    assert [chunk.shape for chunk in chunks] == [(10, 6), (10, 6), (5, 6)]
+    iterations = np.concatenate([multipoles.get(c, "iter") for c in chunks])
+    assert np.array_equal(iterations, np.arange(25))
+    assert np.isclose(multipoles.get(chunks[1], "x")[0], np.sin(0.5))
+    assert multipoles.n_rows == 25
+
+
+def test_multipoles_incremental(tmp_path):
+    partial_line = multipoles_lines(10, 11)
+    write_multipoles(tmp_path, header + multipoles_lines(0, 10) + partial_line[:20])
+
+    multipoles = MultipolesData(tmp_path, chunk_rows=100)
+    assert sum(chunk.shape[0] for chunk in multipoles.chunks()) == 10
+
+    # No new complete lines
+    assert list(multipoles.chunks()) == []
+
+    write_multipoles(tmp_path, partial_line[20:] + multipoles_lines(11, 15), mode="a")
+    chunks = list(multipoles.chunks())
+    assert len(chunks) == 1
+    assert np.array_equal(chunks[0][:, 0], np.arange(10, 15))
+
+    multipoles.reset()
+    assert sum(chunk.shape[0] for chunk in multipoles.chunks()) == 15
+
+
+def test_multipoles_invalid_value(tmp_path):
+    lines = multipoles_lines(0, 10).replace(f"{np.sin(0.25):.12E}", "******************")
+    write_multipoles(tmp_path, header + lines)
+    with pytest.raises(ValueError):
+        list(MultipolesData(tmp_path).chunks())
+
+
+def test_running_reductions():
+    dt = 0.1
+    t = np.arange(1000) * dt
+    f = np.stack([np.cos(2.0 * t), np.sin(t)], axis=1)
+    frequencies = np.linspace(0, 3, 31)
+
+    # Chunked accumulation gives the same result as a single pass
+    transform = RunningFourierTransform(frequencies, damping_time=20.0, max_elements=100)
+    stats = RunningStatistics()
+    for i in range(0, t.size, 128):
+        transform.update(t[i : i + 128], f[i : i + 128])
+        stats.update(f[i : i + 128])
+
+    damping = np.exp(-t / 20.0)[:, None]
+    reference = np.exp(1j * np.outer(frequencies, t)) @ ((f - f[0]) * damping) * dt
+    assert np.allclose(transform.result(), reference)
+
+    assert stats.count == 1000
+    assert np.allclose(stats.mean, f.mean(axis=0))
+    assert np.allclose(stats.max, f.max(axis=0))
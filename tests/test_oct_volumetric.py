@@ -0,0 +1,133 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from src.octopus_workflows import oct_volumetric
+from src.octopus_workflows.oct_volumetric import VolumetricData, density_difference
+
+
+def write_cube(file, data: np.ndarray, voxel: float = 0.5) -> Path:
+    """Write a cube file, with 6 values per line and a new line per (i, j)."""
+    n1, n2, n3 = data.shape
+    lines = ["Density", "Comment",
+             "    2    0.000000    0.000000    0.000000",
+             f"{n1:5d}    {voxel:.6f}    0.000000    0.000000",
+             f"{n2:5d}    0.000000    {voxel:.6f}    0.000000",
+             f"{n3:5d}    0.000000    0.000000    {voxel:.6f}",
+             "    1    1.000000    0.000000    0.000000    0.000000",
+             "    1    1.000000    1.400000    0.000000    0.000000"]
+    for i in range(n1):
+        for j in range(n2):
+            row = data[i, j, :]
+            for k in range(0, n3, 6):
+                lines.append(" ".join(f"{x:13.5E}" for x in row[k:k + 6]))
+    Path(file).write_text("\n".join(lines) + "\n")
+    return Path(file)
+
+
+def write_xsf(file, data: np.ndarray, span: float = 2.0) -> Path:
+    """Write an XSF file, with the first index varying fastest."""
+    n1, n2, n3 = data.shape
+    lines = ["CRYSTAL", "PRIMVEC",
+             f" {span} 0.0 0.0", f" 0.0 {span} 0.0", f" 0.0 0.0 {span}",
+             "PRIMCOORD", " 1 1", " 14 0.0 0.0 0.0",
+             "BEGIN_BLOCK_DATAGRID_3D", "units: coords = b, function = rho",
+             "BEGIN_DATAGRID_3D_function",
+             f" {n1} {n2} {n3}", " 0.0 0.0 0.0",
+             f" {span} 0.0 0.0", f" 0.0 {span} 0.0", f" 0.0 0.0 {span}"]
+    values = data.flatten(order="F")
+    for k in range(0, values.size, 5):
+        lines.append(" ".join(f"{x:.8f}" for x in values[k:k + 5]))
+    lines += ["END_DATAGRID_3D", "END_BLOCK_DATAGRID_3D"]
+    Path(file).write_text("\n".join(lines) + "\n")
+    return Path(file)
+
+
+@pytest.fixture()
+def grid() -> np.ndarray:
+    rng = np.random.default_rng(42)
+    return rng.random(size=(5, 4, 7))
+
+
+def test_cube_chunks(tmp_path, grid, monkeypatch):
+    # Force several blocks, such that numbers are split across reads
+    monkeypatch.setattr(oct_volumetric, "_block_size", 100)
+    density = VolumetricData(write_cube(Path(tmp_path, "density.cube"), grid))
+    assert density.shape == (5, 4, 7)
+    assert np.array_equal(density.numbers, [1, 1])
+    assert np.isclose(density.voxel_volume, 0.125)
+
+    chunks = list(density.chunks(n_planes=2))
+    assert [start for start, _ in chunks] == [0, 2, 4]
+    assert [chunk.shape[0] for _, chunk in chunks] == [2, 2, 1]
+    assert np.allclose(density.load(), grid, atol=1.e-5)
+
+    assert np.isclose(density.integrate(n_planes=2), np.sum(grid) * 0.125, rtol=1.e-5)
+    for axis in range(3):
+        other = tuple(i for i in range(3) if i != axis)
+        assert np.allclose(density.planar_average(axis, n_planes=2), grid.mean(axis=other), atol=1.e-5)
+
+
+def test_cube_memmap(tmp_path, grid):
+    density = VolumetricData(write_cube(Path(tmp_path, "density.cube"), grid))
+    data = density.memmap()
+    assert np.allclose(data, grid, atol=1.e-5)
+    assert isinstance(density.memmap(), np.memmap)
+
+
+def test_cube_memmap_unwritable(tmp_path, grid, monkeypatch):
+    def replace(src, dst):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(oct_volumetric.os, "replace", replace)
+    density = VolumetricData(write_cube(Path(tmp_path, "density.cube"), grid))
+    assert np.allclose(density.memmap(), grid, atol=1.e-5)
+    assert [f.name for f in tmp_path.iterdir()] == ["density.cube"]
+
+
+def test_cube_memmap_invalid_value(tmp_path, grid):
+    file = write_cube(Path(tmp_path, "density.cube"), grid)
+    file.write_text(file.read_text().replace("E", "*", 1))
+    with pytest.raises(ValueError):
+        VolumetricData(file).memmap()
+    assert [f.name for f in tmp_path.iterdir()] == ["density.cube"]
+
+
+def test_xsf(tmp_path, grid):
+    density = VolumetricData(write_xsf(Path(tmp_path, "density.xsf"), grid))
+    assert density.shape == (5, 4, 7)
+    assert density.stream_axis == 2
+    assert np.array_equal(density.numbers, [14])
+    assert np.allclose(density.load(), grid)
+
+    # Periodic images of the origin are excluded
+    unique = grid[:-1, :-1, :-1]
+    voxel_volume = (2.0 / 4) * (2.0 / 3) * (2.0 / 6)
+    assert np.isclose(density.integrate(n_planes=3), np.sum(unique) * voxel_volume)
+    assert np.allclose(density.planar_average(axis=0, n_planes=3), unique.mean(axis=(1, 2)))
+    assert np.allclose(density.planar_average(axis=2, n_planes=3), unique.mean(axis=(0, 1)))
+
+
+def test_density_difference(tmp_path, grid):
+    a = VolumetricData(write_cube(Path(tmp_path, "a.cube"), grid))
+    b = VolumetricData(write_cube(Path(tmp_path, "b.cube"), grid + 0.01))
+    difference = density_difference(a, b, n_planes=3)
+    assert np.isclose(difference["max_abs_difference"], 0.01, atol=1.e-5)
+    assert np.isclose(difference["integrated_difference"], 0.01 * grid.size * 0.125, rtol=1.e-3)
+
+
+def test_truncated_file(tmp_path, grid):
+    file = write_cube(Path(tmp_path, "density.cube"), grid)
+    file.write_text(file.read_text()[:-200])
+    with pytest.raises(ValueError):
+        VolumetricData(file).load()
+
+
+def test_invalid_value(tmp_path, grid):
+    file = write_cube(Path(tmp_path, "density.cube"), grid)
+    lines = file.read_text().splitlines(keepends=True)
+    lines[10] = lines[10].replace("E", "*", 1)
+    file.write_text("".join(lines))
+    with pytest.raises(ValueError):
+        VolumetricData(file).load()
@@ -0,0 +1,50 @@
+import re
+
+from src.octopus_workflows.parallel_tuning import ParallelTuner, apply_layouts, parallel_layouts
+from tests.test_oct_profiling import write_ranks
+
+
+def test_parallel_layouts():
+    layouts = parallel_layouts(4)
+    assert [(layout['ntasks_per_node'], layout['cpus_per_task']) for layout in layouts] == [(1, 4), (2, 2), (2, 2), (4, 1), (4, 1), (4, 1)]
+    assert all(layout['ParKPoints'] == 1 for layout in layouts)
+    assert all(layout['ParStates'] * layout['ParDomains'] == layout['ntasks_per_node'] for layout in layouts)
+
+    # K-point parallelisation must divide the number of k-points
+    layouts = parallel_layouts(72, nodes=2, n_ranks=[4], n_kpoints=4)
+    assert {layout['ParKPoints'] for layout in layouts} == {1, 2, 4}
+    assert all(layout['ParKPoints'] * layout['ParStates'] * layout['ParDomains'] == 8 for layout in layouts)
+
+
+def test_parallel_tuner(tmp_path):
+    layouts = parallel_layouts(4, n_ranks=[2, 4], constraints=[lambda opt: opt['ParDomains'] == 1])
+    representatives = {'small': {'system': ['benzene']}, 'large': {'system': ['NiO']}}
+    tuner = ParallelTuner(representatives, {'MaximumIter': 200}, layouts, max_iterations=3,
+                          slurm_settings={'nodes': 1, 'ntasks_per_node': 1})
+
+    jobs = tuner.jobs()
+    assert list(jobs) == ['small_mpi2_omp2_k1_d1_s2', 'small_mpi4_omp1_k1_d1_s4',
+                          'large_mpi2_omp2_k1_d1_s2', 'large_mpi4_omp1_k1_d1_s4']
+    job = jobs['large_mpi4_omp1_k1_d1_s4']
+    assert job.directory == 'large_mpi4_omp1_k1_d1_s4'
+    assert 'MaximumIter = 3' in job.inp and 'ParStates = 4' in job.inp
+    assert re.search(r'--ntasks-per-node\s+4\n', job.slurm) and re.search(r'--cpus-per-task\s+1\n', job.slurm)
+
+    # Per-SCF-cycle times: 4 ranks is fastest for the large system only
+    for job_id, scf_time in [('small_mpi2_omp2_k1_d1_s2', 5.0), ('small_mpi4_omp1_k1_d1_s4', 6.0),
+                             ('large_mpi2_omp2_k1_d1_s2', 20.0), ('large_mpi4_omp1_k1_d1_s4', 12.0)]:
+        write_ranks(tmp_path / job_id, [(scf_time, 1.0), (scf_time - 1.0, 1.0)])
+
+    best = tuner.best_layouts(tmp_path)
+    assert best['small']['ntasks_per_node'] == 2
+    assert best['large']['ntasks_per_node'] == 4
+
+    # Write back into the production sweep
+    matrix = {'system': ['benzene', 'NiO', 'methane'], 'Mixing': [0.3]}
+    size_class = {'benzene': 'small', 'methane': 'small', 'NiO': 'large'}
+    production = apply_layouts(matrix, {'MaximumIter': 200}, 'system', size_class.get, best)
+    assert list(production) == ['benzene_0.3', 'NiO_0.3', 'methane_0.3']
+    assert 'ParStates = 4' in production['NiO_0.3'].inp
+    assert 'ParStates = 2' in production['methane_0.3'].inp
+    assert 'MaximumIter = 200' in production['methane_0.3'].inp
+    assert re.search(r'--cpus-per-task\s+2\n', production['benzene_0.3'].slurm)
@@ -0,0 +1,92 @@
+import datetime
+import json
+from pathlib import Path
+
+from src.octopus_workflows.components import slurm_submission_script
+from src.octopus_workflows.recovery import (
+    JobRecovery,
+    format_slurm_time,
+    parse_slurm_time,
+    set_input_options,
+    termination_reason,
+)
+from src.octopus_workflows.simple_oct_workflow import OctopusJob
+
+convergence = """#  iter           energy             energy_diff          abs_dens        rel_dens        abs_ev          rel_ev
+      1       -3.10000000E+01      3.1E+01      1.0E+00      1.0E-01      1.0E+00      1.0E-01
+      2       -3.20000000E+01      1.0E+00      1.0E-01      1.0E-02      1.0E-01      1.0E-02
+"""
+
+
+def test_slurm_time():
+    assert parse_slurm_time('1-04:00:00') == datetime.timedelta(days=1, hours=4)
+    assert parse_slurm_time('04:30:00') == datetime.timedelta(hours=4, minutes=30)
+    assert parse_slurm_time('30') == datetime.timedelta(minutes=30)
+    assert parse_slurm_time('2-12') == datetime.timedelta(days=2, hours=12)
+    assert format_slurm_time(datetime.timedelta(hours=25, seconds=1)) == '1-01:01:00'
+
+
+def test_set_input_options():
+    inp = "CalculationMode = gs\nmaximumiter = 200\n"
+    assert set_input_options(inp, {'MaximumIter': 10, 'FromScratch': 'no'}) == \
+           "FromScratch = no\nCalculationMode = gs\nMaximumIter = 10\n"
+
+
+def write_job(root, name, slurm_out: str, restart=True) -> OctopusJob:
+    slurm = slurm_submission_script('', {'nodes': 1, 'time': datetime.timedelta(hours=2)})
+    job = OctopusJob(name, 'CalculationMode = gs\nMaximumIter = 10\n', slurm, 'hash', {})
+    job.write(root)
+    Path(root, name, 'slurm-100.out').write_text(slurm_out)
+    Path(root, name, 'static').mkdir()
+    Path(root, name, 'static/convergence').write_text(convergence)
+    if restart:
+        Path(root, name, 'restart/gs').mkdir(parents=True)
+        Path(root, name, 'restart/gs/density.obf').write_text('')
+    return job
+
+
+def test_recover_sweep(tmp_path):
+    timeout = "slurmstepd: error: *** JOB 100 ON n01 CANCELLED AT 2024-01-01T00:00:00 DUE TO TIME LIMIT ***\n"
+    jobs = {'timeout': write_job(tmp_path, 'timeout', timeout),
+            'no_restart': write_job(tmp_path, 'no_restart', timeout, restart=False),
+            'ok': write_job(tmp_path, 'ok', 'Calculation ended\n')}
+
+    submitted = []
+
+    def submit(directory) -> str:
+        submitted.append(Path(directory).name)
+        return str(100 + len(submitted))
+
+    recovery = JobRecovery(max_retries=1, max_time=datetime.timedelta(hours=6), submit=submit)
+    report = recovery.recover_sweep(tmp_path, jobs)
+    assert report['ok']['status'] == 'ok'
+    assert report['no_restart']['status'] == 'no_restart'
+    # 2 of 10 iterations in 2 hours: 8 remaining need 8 hours x 1.5, capped at 6
+    assert report['timeout'] == {'status': 'resubmitted', 'reason': 'walltime', 'max_iter': 8,
+                                 'time': '0-06:00:00', 'job_id': '101'}
+    assert submitted == ['timeout']
+
+    inp = Path(tmp_path, 'timeout/inp').read_text()
+    assert 'MaximumIter = 8' in inp and 'FromScratch = no' in inp
+    assert '#SBATCH --time                0-06:00:00' in Path(tmp_path, 'timeout/slurm.sh').read_text()
+    assert jobs['timeout'].inp == inp
+
+    # New run has not started
+    assert recovery.recover(Path(tmp_path, 'timeout'))['status'] == 'pending'
+
+    # Times out again, but the retry budget is used
+    Path(tmp_path, 'timeout/slurm-101.out').write_text(timeout)
+    assert recovery.recover(Path(tmp_path, 'timeout'))['status'] == 'budget_exhausted'
+    record = json.loads(Path(tmp_path, 'timeout/recovery.json').read_text())
+    assert record['attempts'] == [{'reason': 'walltime', 'iterations': 2, 'job_id': '101'}]
+
+
+def test_termination_reason(tmp_path):
+    assert termination_reason(tmp_path) is None
+    Path(tmp_path, 'slurm-1.out').write_text('slurmstepd: error: *** JOB 1 ON n01 CANCELLED AT 2024 DUE TO NODE FAILURE ***\n')
+    assert termination_reason(tmp_path) == 'node_failure'
+    # Latest run only
+    Path(tmp_path, 'slurm-2.out').write_text('slurmstepd: error: *** JOB 2 ON n01 CANCELLED AT 2024 DUE TO PREEMPTION ***\n')
+    assert termination_reason(tmp_path) == 'preempted'
+    Path(tmp_path, 'slurm-3.out').write_text('Segmentation fault\n')
+    assert termination_reason(tmp_path) is None
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from src.octopus_workflows.scaling import (
+    scaling_roots,
+    scaling_table,
+    strong_scaling_jobs,
+    weak_scaling_jobs,
+    weak_supercells,
+)
+from tests.test_oct_profiling import write_ranks
+
+
+def test_weak_supercells():
+    assert weak_supercells([1, 1, 1], [1, 2, 4, 8, 12]) == [[1, 1, 1], [2, 1, 1], [2, 2, 1], [2, 2, 2], [3, 2, 2]]
+    assert weak_supercells([2, 2, 1], [2, 4]) == [[2, 2, 1], [2, 2, 2]]
+    with pytest.raises(ValueError):
+        weak_supercells([1, 1, 1], [2, 3])
+
+
+def test_scaling_jobs():
+    jobs = strong_scaling_jobs({'system': ['Si']}, {'CalculationMode': 'gs'}, [1, 2, 4])
+    assert list(jobs) == ['Si_strong_n1', 'Si_strong_n2', 'Si_strong_n4']
+    assert '--nodes               4' in jobs['Si_strong_n4'].slurm
+    # Renamed jobs submit under their own name
+    assert '--job-name            oct_Si_strong_n4\n' in jobs['Si_strong_n4'].slurm
+    assert len({job.hash for job in jobs.values()}) == 1
+
+    jobs = weak_scaling_jobs({'name': 'Si', 'crystalstructure': 'diamond', 'a': 5.43}, [1, 1, 1],
+                             {'CalculationMode': 'gs'}, [1, 2, 4])
+    assert list(jobs) == ['Si_weak_n1', 'Si_weak_n2', 'Si_weak_n4']
+    n_atoms = [job.inp.split('%ReducedCoordinates\n')[1].count('"Si"') for job in jobs.values()]
+    assert n_atoms == [2, 4, 8]
+    assert 'oct_Si_weak_n2' in jobs['Si_weak_n2'].slurm
+    assert '--nodes               2' in jobs['Si_weak_n2'].slurm
+    assert len({job.hash for job in jobs.values()}) == 3
+
+
+def test_weak_scaling_file_rules():
+    rule = lambda inp: {'Si.UPF': 'pseudos/Si.UPF'} if '"Si"' in inp else {}
+    jobs = weak_scaling_jobs({'name': 'Si', 'crystalstructure': 'diamond', 'a': 5.43}, [1, 1, 1],
+                             {'CalculationMode': 'gs'}, [1, 2], file_rules=[rule], validate_files=False)
+    assert jobs['Si_weak_n2'].depends_on == {'Si.UPF': {'source': 'pseudos/Si.UPF', 'dest': 'Si_weak_n2/Si.UPF'}}
+
+
+def test_scaling_table(tmp_path):
+    jobs = strong_scaling_jobs({'system': ['Si']}, {}, [1, 2, 4])
+    roots = scaling_roots(tmp_path, jobs)
+    # COMPLETE_RUN is scf_time + 2
+    for root, scf_time in zip(roots[:2], [98.0, 48.0]):
+        write_ranks(root, [(scf_time, 1.0)])
+
+    table = scaling_table(roots, [1, 2, 4])
+    assert np.allclose(table['speedup'][:2], [1.0, 2.0])
+    assert np.allclose(table['efficiency'][:2], [1.0, 1.0])
+    assert np.isnan(table['time'][2])
+
+    table = scaling_table(roots, [1, 2, 4], mode='weak')
+    assert np.allclose(table['efficiency'][:2], [1.0, 2.0])
+    assert np.allclose(table['speedup'][:2], [1.0, 4.0])
@@ -0,0 +1,119 @@
+import subprocess
+import sys
+
+import pytest
+
+from src.octopus_workflows.sharding import (
+    assign_shards,
+    merge_manifests,
+    shard_jobs,
+    shard_manifest,
+    stable_hash,
+)
+from src.octopus_workflows.simple_oct_workflow import ground_state_calculation
+from src.octopus_workflows.warm_start import warm_start_calculation
+
+matrix = {
+    "system": ["Si", "NiO", "TiO2"],
+    "Mixing": [0.1, 0.2, 0.3, 0.4],
+    "ExtraStates": [0, 2, 4],
+}
+
+
+def test_stable_hash_across_processes():
+    # Unlike hash(), which is salted per process
+    code = (
+        "from src.octopus_workflows.sharding import stable_hash; "
+        "print(stable_hash('Si_0.1'))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    assert int(output) == stable_hash("Si_0.1")
+
+
+def test_shards_partition_sweep():
+    full = ground_state_calculation(matrix, {"CalculationMode": "gs"})
+    shards = [
+        ground_state_calculation(
+            matrix, {"CalculationMode": "gs"}, shard_index=i, num_shards=3
+        )
+        for i in range(3)
+    ]
+
+    assert sorted(id for shard in shards for id in shard) == sorted(full)
+    for shard in shards:
+        assert shard and list(shard) == [id for id in full if id in shard]
+        assert all(
+            shard[id].inp == full[id].inp and shard[id].hash == full[id].hash
+            for id in shard
+        )
+
+    index = merge_manifests(
+        [shard_manifest(shard, i, 3) for i, shard in enumerate(shards)]
+    )
+    assert set(index) == set(full)
+    assert index["Si_0.1_0"] == {
+        "directory": "Si_0.1_0",
+        "hash": full["Si_0.1_0"].hash,
+        "shard": assign_shards(["Si_0.1_0"], 3)[0],
+    }
+
+
+def test_cost_balanced_shards():
+    costs = {"Si": 1.0, "NiO": 10.0, "TiO2": 4.0}
+
+    def cost(opt):
+        return costs[opt["system"]] * (1 + opt["ExtraStates"])
+
+    shards = [
+        ground_state_calculation(
+            matrix, {}, shard_index=i, num_shards=4, shard_cost=cost
+        )
+        for i in range(4)
+    ]
+    loads = [
+        sum(
+            costs[id.split("_")[0]] * (1 + int(id.split("_")[-1]))
+            for id in shard
+        )
+        for shard in shards
+    ]
+    assert sum(len(shard) for shard in shards) == 36
+    assert max(loads) - min(loads) <= max(costs.values())
+
+
+def test_shard_jobs_keeps_chains():
+    jobs = warm_start_calculation(matrix, {}, "system")
+    shards = [shard_jobs(jobs, i, 2) for i in range(2)]
+    assert sum(len(shard) for shard in shards) == len(jobs)
+    for shard in shards:
+        assert all(dep in shard for job in shard.values() for dep in job.after)
+
+
+def test_merge_manifests_validates():
+    jobs = ground_state_calculation({"Mixing": [0.1, 0.2]}, {})
+    manifest = shard_manifest(jobs, 0, 2, results={"0.1": "converged"})
+    assert manifest["jobs"]["0.1"]["result"] == "converged"
+
+    with pytest.raises(
+        ValueError, match="Missing manifests of shards \\[1\\]"
+    ):
+        merge_manifests([manifest])
+    assert set(merge_manifests([manifest], complete=False)) == {"0.1", "0.2"}
+    with pytest.raises(ValueError, match="Job 0.1 is in shards 0 and 1"):
+        merge_manifests([manifest, shard_manifest(jobs, 1, 2)])
+    with pytest.raises(ValueError):
+        shard_manifest(jobs, 2, 2)
+
+    # Every job of the sweep is in exactly one manifest
+    manifests = [shard_manifest(jobs, 0, 1)]
+    index = merge_manifests(manifests, job_ids=["0.1", "0.2"])
+    assert set(index) == {"0.1", "0.2"}
+    with pytest.raises(ValueError, match="missing from the manifests"):
+        merge_manifests(manifests, job_ids=["0.1", "0.2", "0.3"])
+    with pytest.raises(ValueError, match="not in the sweep: \\['0.2'\\]"):
+        merge_manifests(manifests, job_ids=["0.1"])
@@ -0,0 +1,84 @@
+from pathlib import Path
+
+import pytest
+
+from src.octopus_workflows import simple_oct_workflow
+from src.octopus_workflows.simple_oct_workflow import OctopusJob, ground_state_calculation
+
+
+def test_octopus_job_renders_on_access(tmp_path):
+    calls = []
+
+    def render():
+        calls.append(1)
+        return "CalculationMode = gs\n"
+
+    job = OctopusJob("job", render, "#!/bin/sh\n", "hash", {})
+    assert not hasattr(job, "__dict__")
+    assert calls == []
+
+    assert job.inp == "CalculationMode = gs\n"
+    assert job.inp == "CalculationMode = gs\n"
+    assert len(calls) == 1
+
+    job.write(tmp_path)
+    assert Path(tmp_path, "job", "inp").read_text() == "CalculationMode = gs\n"
+    assert Path(tmp_path, "job", "slurm.sh").read_text() == "#!/bin/sh\n"
+    assert len(calls) == 1
+
+    job.inp = "CalculationMode = td\n"
+    assert job.inp == "CalculationMode = td\n"
+
+
+def test_render_cache_bounded(monkeypatch):
+    monkeypatch.setattr(simple_oct_workflow, "render_cache_size", 2)
+    jobs = [OctopusJob(str(i), lambda i=i: f"Mixing = {i}\n", "", "", {}) for i in range(5)]
+    assert [job.inp for job in jobs] == [f"Mixing = {i}\n" for i in range(5)]
+    assert len(simple_oct_workflow._render_cache) <= 2
+
+
+def test_ground_state_calculation_shares_options():
+    calls = []
+
+    def structure(name):
+        calls.append(name)
+        return {"Coordinates": [[f'"{name}"', 0.0, 0.0, 0.0]]}
+
+    static_options = {"CalculationMode": "gs"}
+    matrix = {"^system": ["H", "He"], "Mixing": [0.1, 0.2, 0.3]}
+    jobs = ground_state_calculation(matrix, static_options, meta_value_ops={"^system": structure})
+
+    # Each structure is substituted once, and shared by its jobs
+    assert calls == ["H", "He"]
+    assert list(jobs) == ["H_0.1", "H_0.2", "H_0.3", "He_0.1", "He_0.2", "He_0.3"]
+    layers = [job._inp.args[0] for job in jobs.values()]
+    assert all(layer[1] is layers[0][1] for layer in layers)
+    assert layers[0][2] is layers[2][2]
+
+    # Changes to the caller's options do not alter the jobs
+    static_options["CalculationMode"] = "td"
+    assert jobs["He_0.2"].inp == 'Mixing = 0.2\nCalculationMode = gs\n%Coordinates\n"He" | 0.0 | 0.0 | 0.0 \n%\n'
+    assert "#SBATCH --job-name            oct_He_0.2" in jobs["He_0.2"].slurm
+
+
+def test_ground_state_calculation_hashes_in_chunks(monkeypatch):
+    monkeypatch.setattr(simple_oct_workflow, "_chunk_size", 2)
+    jobs = ground_state_calculation({"Mixing": [0.1, 0.2, 0.3, 0.4, 0.5]}, {})
+    assert len({job.hash for job in jobs.values()}) == 5
+
+
+@pytest.fixture(autouse=True)
+def clear_render_cache():
+    yield
+    simple_oct_workflow._render_cache.clear()
+
+
+def test_rename():
+    jobs = ground_state_calculation({'Mixing': [0.1]}, {}, slurm_settings={'nodes': 1})
+    job = jobs['0.1']
+    job.rename('mixing_0.1')
+    assert '--job-name            oct_mixing_0.1\n' in job.slurm
+
+    job.slurm = job.slurm
+    job.rename('renamed')
+    assert '--job-name            oct_renamed\n' in job.slurm
@@ -0,0 +1,62 @@
+import datetime
+
+import pytest
+import simple_slurm
+
+from src.octopus_workflows.slurm_templates import render_script, render_scripts, sbatch_directives
+
+
+def simple_slurm_script(oct_root, options) -> str:
+    """Script as built with simple_slurm, before templates."""
+    modules = "module load gcc/11 openmpi/4 cuda/11.4 openmpi_gpu/4"
+    vars = f'export PATH="{oct_root}/bin:${{PATH}}" \n'
+    vars += "export OMP_NUM_THREADS=${SLURM_CPUS_PER_TASK}\n"
+    vars += "export OMP_PLACES=cores"
+    srun = "cd ${SLURM_SUBMIT_DIR}\nsrun octopus > std.out"
+    return "\n".join([str(simple_slurm.Slurm(**options)), modules, vars, srun])
+
+
+@pytest.mark.parametrize('options', [
+    {},
+    {'nodes': 1},
+    {'time': '1-04:00:00', 'nodes': 2, 'job_name': 'oct_Si', 'c': 4, 'ntasks_per_node': 4,
+     'partition': 'gpu', 'gres': 'gpu:2', 'dependency': {'afterok': 1}, 'array': range(3, 15)},
+    {'exclusive': True, 'requeue': False, 'nodes': 1},
+    {'--job_name': 'a', '-c': 2, 'time': datetime.timedelta(hours=30)},
+    {'time': '10:00', 'exclusive': ''},
+])
+def test_default_matches_simple_slurm(options):
+    assert render_script('/opt/octopus', options) == simple_slurm_script('/opt/octopus', options)
+
+
+def test_render_scripts():
+    options = {'nodes': 2, 'cpus_per_task': 8}
+    scripts = render_scripts('/opt/octopus', options, ['Si', 'NiO'])
+    assert scripts == [simple_slurm_script('/opt/octopus', {**options, 'job_name': f'oct_{id}'})
+                       for id in ['Si', 'NiO']]
+
+
+def test_sbatch_directives():
+    assert sbatch_directives({'time': '1:00', 'c': 2, 'exclusive': False, 'job-name': 'a'}) == \
+           {'cpus_per_task': '2', 'job_name': 'a', 'time': '1:00'}
+    with pytest.raises(KeyError):
+        sbatch_directives({'nodez': 1})
+
+
+def test_profiles(tmp_path):
+    gpu = render_script('/opt/octopus', {'nodes': 1}, 'ada_gpu')
+    assert 'export OMP_PLACES=cores\nexport OMP_PROC_BIND=close\n' in gpu
+    assert gpu.endswith('srun --gpu-bind=closest octopus > std.out')
+
+    generic = render_script('/opt/octopus', {'nodes': 1}, 'generic', modules=['gcc/12', 'openmpi/4'])
+    assert '#SBATCH --nodes               1\n\nmodule load gcc/12\nmodule load openmpi/4\nexport PATH' in generic
+
+    # Site profile from a file, extending a bundled profile
+    site = tmp_path / 'site.j2'
+    site.write_text('{% extends "generic.j2" %}\n{% block run %}\ncd ${SLURM_SUBMIT_DIR}\n'
+                    'srun --cpu-bind=cores octopus > std.out\n{%- endblock %}\n')
+    script = render_script('/opt/octopus', {'nodes': 1}, str(site))
+    assert script.endswith('export OMP_PLACES=cores\ncd ${SLURM_SUBMIT_DIR}\nsrun --cpu-bind=cores octopus > std.out')
+
+    with pytest.raises(ValueError):
+        render_script('/opt/octopus', {}, 'unknown_site')
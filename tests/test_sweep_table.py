@@ -0,0 +1,62 @@
+from src.octopus_workflows.simple_oct_workflow import OctopusJob, ground_state_calculation
+from src.octopus_workflows.sweep_table import SweepTable, main
+from src.octopus_workflows.warm_start import warm_start_calculation
+from workflows.kerker_comparison.settings import file_to_oct_dict, find_pseudopotential, fixed_options
+
+from tests.test_job_writer import assert_same_trees
+
+structures = "data/benchmark_structures"
+
+
+def sweep_jobs():
+    matrix = {'^system_files': [f'{structures}/TiO2', f'{structures}/Si'], 'Mixing': [0.1, 0.2, 0.3],
+              'ExtraStates': [0, 4]}
+    return ground_state_calculation(matrix, fixed_options,
+                                    meta_value_ops={'^system_files': file_to_oct_dict},
+                                    file_rules=[find_pseudopotential],
+                                    slurm_settings={'nodes': 1, 'time': '1:00:00'})
+
+
+def assert_same_jobs(table, jobs):
+    assert table.job_ids == list(jobs)
+    for job_id, job in jobs.items():
+        restored = table.job(job_id)
+        assert table.inp(job_id) == restored.inp == job.inp
+        assert table.slurm(job_id) == restored.slurm == job.slurm
+        assert restored.hash == job.hash and restored.depends_on == job.depends_on and restored.after == job.after
+
+
+def test_sweep_table_round_trip(tmp_path):
+    jobs = sweep_jobs()
+    table = SweepTable.from_jobs(jobs)
+    assert_same_jobs(table, jobs)
+
+    # Fixed options, and one structure per system, are stored once
+    assert len(table.layers) == 3
+    assert [column['key'] for column in table.columns] == ['Mixing', 'ExtraStates']
+    assert table.columns[0]['values'] == ['Mixing = 0.1\n', 'Mixing = 0.2\n', 'Mixing = 0.3\n']
+    assert len(table.slurm_parts) == 1
+
+    for name in ['sweep.json', 'sweep.json.gz']:
+        table.save(tmp_path / name)
+        assert_same_jobs(SweepTable.load(tmp_path / name), jobs)
+
+
+def test_sweep_table_mixed_jobs():
+    jobs = warm_start_calculation({'system': ['Si', 'NiO'], 'Mixing': [0.1, 0.2]}, {'MaximumIter': 50}, 'system')
+    jobs['custom'] = OctopusJob('custom', 'CalculationMode = td\n', '#!/bin/sh\n', 'abc', {})
+    assert_same_jobs(SweepTable.from_jobs(jobs), jobs)
+
+
+def test_sweep_table_write(tmp_path):
+    jobs = sweep_jobs()
+    for job in jobs.values():
+        job.write(root=tmp_path / 'tree')
+
+    SweepTable.from_jobs(jobs).save(tmp_path / 'sweep.json')
+    assert main(['materialise', str(tmp_path / 'sweep.json'), '--root', str(tmp_path / 'materialised')]) == 0
+    assert_same_trees(tmp_path / 'tree', tmp_path / 'materialised')
+
+    # A single job, as at job start
+    main(['materialise', str(tmp_path / 'sweep.json'), 'Si_0.2_4', '--root', str(tmp_path / 'one')])
+    assert [p.name for p in (tmp_path / 'one').iterdir()] == ['Si_0.2_4']
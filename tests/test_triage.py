@@ -0,0 +1,64 @@
+from pathlib import Path
+
+from src.octopus_workflows import triage
+from src.octopus_workflows.triage import FailureMatcher, triage_summary, triage_sweep
+
+
+def write_job(root, name, logs: dict):
+    Path(root, name).mkdir()
+    Path(root, name, 'inp').write_text('CalculationMode = gs\n')
+    for file, contents in logs.items():
+        Path(root, name, file).write_text(contents)
+
+
+def test_failure_matcher(tmp_path, monkeypatch):
+    matcher = FailureMatcher(tail_bytes=200)
+    file = Path(tmp_path, 'std.out')
+
+    # Only the tail is scanned
+    file.write_text('Parser error: early\n' + 'x' * 1000 + '\nSCF *not* converged!\nCUDA error: an illegal memory access\n')
+    assert matcher.scan(file) == {'cuda_error': 'CUDA error: an illegal memory access',
+                                  'scf_not_converged': 'SCF *not* converged!'}
+
+    # Memory-mapped large files give the same result
+    monkeypatch.setattr(triage, '_mmap_size', 10)
+    assert list(matcher.scan(file)) == ['cuda_error', 'scf_not_converged']
+
+    # Extensible rule set
+    matcher = FailureMatcher({**triage.failure_rules, 'mpi_abort': rb'MPI_ABORT was invoked'})
+    file.write_text('MPI_ABORT was invoked on rank 3\n')
+    assert matcher.scan(file) == {'mpi_abort': 'MPI_ABORT was invoked on rank 3'}
+
+
+def test_triage_sweep(tmp_path, monkeypatch):
+    write_job(tmp_path, 'walltime', {'slurm-1.out': 'slurmstepd: error: *** JOB 1 ON n1 CANCELLED AT 2024 DUE TO TIME LIMIT ***\n',
+                                     'std.out': 'SCF *not* converged!\n'})
+    write_job(tmp_path, 'oom', {'slurm-2.out': 'slurmstepd: error: Detected 1 oom-kill event(s) in StepId=2.0\n'})
+    write_job(tmp_path, 'pseudo', {'std.out': "** FATAL ERROR **\n** Pseudopotential file 'Ti.UPF' not found\n"})
+    write_job(tmp_path, 'parse', {'std.out': "Parser error: syntax error, unexpected '='\n"})
+    write_job(tmp_path, 'ok', {'std.out': 'SCF converged in 12 iterations\n'})
+
+    table = triage_sweep(tmp_path)
+    assert table['job'] == ['ok', 'oom', 'parse', 'pseudo', 'walltime']
+    assert table['category'] == [None, 'oom', 'parse_error', 'missing_pseudopotential', 'walltime']
+    assert table['categories'][4] == ['walltime', 'scf_not_converged']
+    assert table['file'][4] == 'walltime/slurm-1.out'
+    assert triage_summary(table)['oom'] == ['oom']
+
+    # Cached results are re-used for unchanged files
+    scanned = []
+    scan = FailureMatcher.scan
+    monkeypatch.setattr(FailureMatcher, 'scan', lambda self, file: scanned.append(file) or scan(self, file))
+    Path(tmp_path, 'ok/std.out').write_text('SCF converged in 12 iterations\nCUDA error: out of memory\n')
+    table = triage_sweep(tmp_path)
+    assert scanned == [Path(tmp_path, 'ok/std.out')]
+    assert table['category'][0] == 'oom'
+
+
+def test_triage_cache_in_root(tmp_path):
+    for sweep in ['sweep_a', 'sweep_b']:
+        Path(tmp_path, sweep).mkdir()
+        write_job(Path(tmp_path, sweep), 'oom', {'std.out': 'CUDA error: out of memory\n'})
+        triage_sweep(Path(tmp_path, sweep))
+        assert len(list(Path(tmp_path, sweep).glob('.logs.triage.*.json'))) == 1
+    assert not [f for f in tmp_path.iterdir() if f.is_file()]
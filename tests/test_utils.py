@@ -0,0 +1,84 @@
+import sys
+
+import pytest
+
+from src.octopus_workflows.utils import cartesian_product, expand_matrix, lazy_import
+
+
+def test_cartesian_product():
+    matrix = {'Eigensolver': ['rmmdiis', 'chebyshev_filter'], 'Mixing': [0.1, 0.3]}
+    assert cartesian_product(matrix) == [{'Eigensolver': 'rmmdiis', 'Mixing': 0.1},
+                                         {'Eigensolver': 'rmmdiis', 'Mixing': 0.3},
+                                         {'Eigensolver': 'chebyshev_filter', 'Mixing': 0.1},
+                                         {'Eigensolver': 'chebyshev_filter', 'Mixing': 0.3}]
+
+
+def test_expand_matrix_zipped_axes():
+    matrix = {('supercell', 'KPointsGrid'): [([1, 1, 1], [[4, 4, 4]]), ([2, 2, 2], [[2, 2, 2]])],
+              'Mixing': [0.1, 0.3]}
+    options, n_pruned = expand_matrix(matrix)
+    assert n_pruned == 0
+    assert options == [{'supercell': [1, 1, 1], 'KPointsGrid': [[4, 4, 4]], 'Mixing': 0.1},
+                       {'supercell': [1, 1, 1], 'KPointsGrid': [[4, 4, 4]], 'Mixing': 0.3},
+                       {'supercell': [2, 2, 2], 'KPointsGrid': [[2, 2, 2]], 'Mixing': 0.1},
+                       {'supercell': [2, 2, 2], 'KPointsGrid': [[2, 2, 2]], 'Mixing': 0.3}]
+
+    with pytest.raises(ValueError):
+        expand_matrix({('a', 'b'): [(1, 2), (3,)]})
+
+
+def test_expand_matrix_constraints():
+    matrix = {'MixingScheme': ['linear', 'broyden'],
+              'MixingKerker': ['yes', 'no'],
+              'MixingKerkerFactor': [0.5, 1.0, 2.0],
+              'Mixing': [0.1, 0.3]}
+    calls = []
+
+    def no_linear(opt) -> bool:
+        calls.append(dict(opt))
+        return opt['MixingScheme'] != 'linear'
+
+    # Factor is redundant without Kerker
+    def redundant_factor(opt) -> bool:
+        return opt['MixingKerker'] == 'yes' or opt['MixingKerkerFactor'] == 1.0
+
+    options, n_pruned = expand_matrix(matrix, [no_linear, redundant_factor])
+    assert len(options) == 6 + 2
+    assert n_pruned == 24 - 8
+    assert all(opt['MixingScheme'] == 'broyden' for opt in options)
+    assert {'MixingScheme': 'broyden', 'MixingKerker': 'no', 'MixingKerkerFactor': 1.0, 'Mixing': 0.3} in options
+
+    # Evaluated once per value of the first axis: pruned branches are never expanded
+    assert calls == [{'MixingScheme': 'linear'}, {'MixingScheme': 'broyden'}]
+
+
+def test_expand_matrix_unknown_key():
+    with pytest.raises(ValueError, match='Misspelt'):
+        expand_matrix({'Mixing': [0.1]}, [lambda opt: opt['Misspelt'] > 0])
+
+
+def test_expand_matrix_static_options():
+    matrix = {'MixingScheme': ['linear', 'broyden'], 'Mixing': [0.1, 0.3]}
+    static = {'MixingKerker': 'yes', 'Mixing': 0.5}
+
+    def no_linear_kerker(opt) -> bool:
+        return not (opt['MixingScheme'] == 'linear' and opt['MixingKerker'] == 'yes')
+
+    options, n_pruned = expand_matrix(matrix, [no_linear_kerker, lambda opt: opt['Mixing'] < 0.2], static)
+    assert options == [{'MixingScheme': 'broyden', 'Mixing': 0.1}]
+    assert n_pruned == 3
+
+
+def test_lazy_import():
+    assert lazy_import('json') is sys.modules['json']
+
+    sys.modules.pop('colorsys', None)
+    colorsys = lazy_import('colorsys')
+    assert sys.modules['colorsys'] is colorsys
+    # Executed on first attribute access
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+
+    with pytest.raises(ValueError):
+        lazy_import('scipy.linalg')
+    with pytest.raises(ModuleNotFoundError):
+        lazy_import('not_a_module')
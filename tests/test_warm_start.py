@@ -0,0 +1,73 @@
+from pathlib import Path
+
+import pytest
+
+from src.octopus_workflows.simple_oct_workflow import OctopusJob
+from src.octopus_workflows.warm_start import _copy_on_start, submission_script, warm_start_calculation
+
+
+def test_warm_start_calculation(tmp_path):
+    matrix = {'system': ['Si', 'NiO'], 'Mixing': [0.1, 0.2, 0.3]}
+    jobs = warm_start_calculation(matrix, {'RestartWrite': 'No', 'MaximumIter': 200}, 'system')
+
+    assert list(jobs) == ['Si_0.1', 'Si_0.2', 'Si_0.3', 'NiO_0.1', 'NiO_0.2', 'NiO_0.3']
+    assert 'RestartWrite = yes' in jobs['Si_0.1'].inp
+    assert jobs['Si_0.1'].after == []
+
+    sibling = jobs['NiO_0.3']
+    assert 'RestartWrite = no' in sibling.inp and 'FromScratch = no' in sibling.inp
+    assert sibling.after == ['NiO_0.1']
+    assert sibling.depends_on == {'restart/gs': {'source': 'NiO_0.1/restart/gs',
+                                                 'dest': 'NiO_0.3/restart/gs',
+                                                 'after': 'NiO_0.1'}}
+    assert 'cp -r ../NiO_0.1/restart/gs restart/gs\nsrun octopus' in sibling.slurm
+
+    # Restart data are copied at run time, not when writing
+    for job in jobs.values():
+        job.write(root=tmp_path)
+    assert not Path(tmp_path, 'NiO_0.3/restart').exists()
+
+    script = submission_script(jobs)
+    lines = script.splitlines()
+    assert lines[2] == 'job_0=$(cd Si_0.1 && sbatch --parsable slurm.sh)'
+    assert 'job_5=$(cd NiO_0.3 && sbatch --parsable --dependency=afterok:${job_3} slurm.sh)' in lines
+    # References are submitted before their siblings
+    assert lines.index('job_3=$(cd NiO_0.1 && sbatch --parsable slurm.sh)') < lines.index(
+        'job_4=$(cd NiO_0.2 && sbatch --parsable --dependency=afterok:${job_3} slurm.sh)')
+
+
+def test_copy_on_start_requires_submit_dir():
+    depends_on = {'restart/gs': {'source': 'Si_0.1/restart/gs', 'dest': 'Si_0.2/restart/gs', 'after': 'Si_0.1'}}
+    job = OctopusJob('Si_0.2', 'Mixing = 0.2\n', '#!/bin/sh\ncd $SLURM_SUBMIT_DIR\nsrun octopus\n', '', depends_on)
+    _copy_on_start(job)
+    with pytest.raises(ValueError, match='Si_0.2'):
+        job.slurm
+
+
+def test_copy_on_start_lazy_relative():
+    depends_on = {'restart/gs': {'source': 'a/Si_0.1/restart/gs', 'dest': 'b/Si_0.2/restart/gs', 'after': 'Si_0.1'}}
+    rendered = []
+    job = OctopusJob('b/Si_0.2', 'Mixing = 0.2\n',
+                     lambda: rendered.append(1) or '#!/bin/sh\ncd ${SLURM_SUBMIT_DIR}\nsrun octopus\n', '', depends_on)
+    _copy_on_start(job)
+    assert rendered == []
+    assert 'cp -r ../../a/Si_0.1/restart/gs restart/gs\nsrun octopus' in job.slurm
+
+
+def test_warm_start_block_values():
+    matrix = {'system': ['Si', 'NiO'], 'KPointsGrid': [[[2, 2, 2]], [[4, 4, 4]]]}
+    jobs = warm_start_calculation(matrix, {}, 'system')
+    assert list(jobs) == ['Si_[[2, 2, 2]]', 'Si_[[4, 4, 4]]', 'NiO_[[2, 2, 2]]', 'NiO_[[4, 4, 4]]']
+    assert jobs['NiO_[[4, 4, 4]]'].after == ['NiO_[[2, 2, 2]]']
+    assert 'RestartWrite = yes' in jobs['NiO_[[2, 2, 2]]'].inp
+
+
+def test_warm_start_sharded():
+    matrix = {'system': ['Si', 'NiO', 'Cu', 'Al'], 'Mixing': [0.1, 0.2]}
+    full = warm_start_calculation(matrix, {}, 'system')
+    shards = [warm_start_calculation(matrix, {}, 'system', shard_index=i, num_shards=2) for i in range(2)]
+    assert sorted(id for shard in shards for id in shard) == sorted(full)
+    # Siblings are in the shard of their reference
+    for shard in shards:
+        assert all(dep in shard for job in shard.values() for dep in job.after)
+        assert [id for id in full if id in shard] == list(shard)
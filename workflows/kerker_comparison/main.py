@@ -11,6 +11,7 @@ from pathlib import Path
 from typing import Dict
 
 from octopus_workflows.simple_oct_workflow import ground_state_calculation, OctopusJob
+from octopus_workflows.job_writer import write_jobs
 
 from settings import fixed_options, matrix, meta_value_ops, file_rules, kerker_options
 
@@ -73,10 +74,8 @@ if __name__ == '__main__':
 
     # Jobs with no preconditioning
     jobs: Dict[str, OctopusJob] = no_kerker_jobs()
-    for job in jobs.values():
-        job.write(root='jobs/kerker_comparison/no_preconditioning', exist_ok=True)
+    write_jobs(jobs, root='jobs/kerker_comparison/no_preconditioning', exist_ok=True)
 
     # Jobs with preconditioning
     jobs: Dict[str, OctopusJob] = kerker_jobs()
-    for job in jobs.values():
-        job.write(root='jobs/kerker_comparison/preconditioning', exist_ok=True)
+    write_jobs(jobs, root='jobs/kerker_comparison/preconditioning', exist_ok=True)
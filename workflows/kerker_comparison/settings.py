@@ -4,6 +4,7 @@ Configuration file in python rather than YAML or TOML, much like the NOX package
 """
 import re
 
+from octopus_workflows.file_dependencies import FileRule
 from octopus_workflows.oct_parse import parse_oct_input
 
 
@@ -74,4 +75,5 @@ def find_pseudopotential(input_string: str) -> dict:
     return {f: location[f] for f in files}
 
 
-file_rules = [find_pseudopotential]
+# Pseudopotential files are only given in the Species block
+file_rules = [FileRule(find_pseudopotential, keys=['Species'])]